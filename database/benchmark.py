@@ -0,0 +1,421 @@
+"""
+	Benchmark harness of the MCP server tools and of populate_db.insert_df_to_db.
+
+	For every scale (number of transactions) it provisions the 00_init.sql schema in a dedicated database
+	(BENCHMARK_DB_NAME, default mcp_benchmark, created on the server of the DB_* variables), loads synthetic
+	customers / articles / transactions / article embeddings, then times each tool `--repeat` times.
+
+	python benchmark.py --env .env --scales 10000,100000,1000000 --output results/$(git rev-parse --short HEAD).json
+	python benchmark.py --env .env --scales 10000 --compare results/previous.json
+
+	The output is a JSON document (one entry per scale and case: p50 / p99 latency, throughput, errors and the
+	time spent per phase as recorded by gradio_mcp/metrics), `--compare` prints the p50 / p99 ratios to a previous run.
+"""
+import os
+import sys
+import json
+import time
+import contextlib
+import argparse
+import platform
+import contextvars
+import subprocess
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+import psycopg2
+from dotenv import load_dotenv
+
+DATABASE_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(DATABASE_DIR), "gradio_mcp"))
+
+RESULT_FORMAT_VERSION = 1
+DEFAULT_SCALES = (10_000, 100_000, 1_000_000, 10_000_000)
+# synthetic dimensions relative to the number of transactions
+CUSTOMERS_PER_TRANSACTION = 0.1
+ARTICLES_PER_TRANSACTION = 0.02
+MIN_CUSTOMERS = 1000
+MIN_ARTICLES = 500
+# transactions are generated and inserted by chunks to bound the memory at 10M rows
+GENERATE_CHUNK_SIZE = 1_000_000
+
+PRODUCT_TYPES = [
+	"Trousers", "Dress", "Sweater", "T-shirt", "Top", "Blouse", "Jacket", "Shorts", "Shirt", "Vest top",
+	"Underwear bottom", "Skirt", "Hoodie", "Bra", "Socks", "Leggings/Tights", "Sneakers", "Cardigan", "Hat/beanie", "Coat"
+]
+PRODUCT_GROUPS = ["Garment Upper body", "Garment Lower body", "Garment Full body", "Underwear", "Accessories", "Shoes"]
+COLOURS = ["Black", "White", "Dark Blue", "Grey", "Beige", "Light Pink", "Red", "Dark Green"]
+CLUB_STATUSES = ["ACTIVE", "PRE-CREATE", "LEFT CLUB"]
+NEWS_FREQUENCIES = ["NONE", "Regularly", "Monthly"]
+
+
+# ---------------------------------------------------------------- provisioning
+
+def server_config():
+	"""Connection settings of the MCP server (DB_HOST, DB_PORT, DB_NAME, DB_USER, DB_PASSWORD)"""
+	from database_connector import resolve_db_config
+	return dict(resolve_db_config())
+
+def create_database(config, name):
+	"""Create the benchmark database next to the configured one, the configured database is never modified"""
+	conn = psycopg2.connect(**config)
+	conn.autocommit = True
+	try:
+		with conn.cursor() as cur:
+			cur.execute("SELECT 1 FROM pg_database WHERE datname = %s", (name,))
+			if cur.fetchone() is None:
+				cur.execute(f'CREATE DATABASE "{name}"')
+				print(f"Created database {name}", file=sys.stderr)
+	finally:
+		conn.close()
+	return {**config, "database": name}
+
+def provision_schema(conn, embedding_dim):
+	"""
+		Run 00_init.sql (drops and recreates the tables) and create the article_embeddings table.
+		Returns True when the embeddings are pgvector vectors, False when the extension is missing (real[])
+	"""
+	with conn.cursor() as cur:
+		try:
+			cur.execute("CREATE EXTENSION IF NOT EXISTS vector")
+			has_vector = True
+		except psycopg2.Error as e:
+			print(f"pgvector not available, embeddings are stored as real[]: {str(e).strip()}", file=sys.stderr)
+			conn.rollback()
+			has_vector = False
+		cur.execute("DROP TABLE IF EXISTS article_embeddings, bench_product_type_age")
+		with open(os.path.join(DATABASE_DIR, "00_init.sql")) as f:
+			cur.execute(f.read())
+		column_type = f"vector({embedding_dim})" if has_vector else "real[]"
+		cur.execute(f"""
+			CREATE TABLE article_embeddings (
+				article_id TEXT PRIMARY KEY REFERENCES articles(article_id),
+				embedding {column_type}
+			)
+		""")
+	conn.commit()
+	return has_vector
+
+def build_analysis_tables(conn):
+	"""groups | measurement table of the ANOVA / Tukey cases, as create_table_from_query would build it"""
+	with conn.cursor() as cur:
+		cur.execute("""
+			CREATE TABLE bench_product_type_age AS
+			SELECT a.product_type_name, c.age
+			FROM transactions t
+			JOIN articles a ON a.article_id = t.article_id
+			JOIN customers c ON c.customer_id = t.customer_id
+		""")
+		cur.execute("ANALYZE customers, articles, transactions, article_embeddings, bench_product_type_age")
+	conn.commit()
+
+
+# ---------------------------------------------------------------- synthetic data
+
+def generate_customers(n, rng):
+	ages = rng.normal(36, 12, n).clip(16, 95).round().astype(int)
+	return pd.DataFrame({
+		"customer_id": [f"c{i:09d}" for i in range(n)],
+		"fn": np.where(rng.random(n) < 0.35, 1.0, np.nan),
+		"active": rng.random(n) < 0.34,
+		"club_member_status": rng.choice(CLUB_STATUSES, n, p=[0.93, 0.06, 0.01]),
+		"fashion_news_frequency": rng.choice(NEWS_FREQUENCIES, n, p=[0.64, 0.35, 0.01]),
+		"age": ages,
+		"postal_code": [f"p{code:06d}" for code in rng.integers(0, max(n // 3, 1), n)]
+	})
+
+def generate_articles(n, rng):
+	type_index = rng.integers(0, len(PRODUCT_TYPES), n)
+	colour_index = rng.integers(0, len(COLOURS), n)
+	return pd.DataFrame({
+		"article_id": [f"{i:010d}" for i in range(n)],
+		"product_code": [f"{i // 3:07d}" for i in range(n)],
+		"prod_name": [f"{PRODUCT_TYPES[t]} {i}" for i, t in enumerate(type_index)],
+		"product_type_no": type_index + 250,
+		"product_type_name": np.array(PRODUCT_TYPES)[type_index],
+		"product_group_name": np.array(PRODUCT_GROUPS)[type_index % len(PRODUCT_GROUPS)],
+		"colour_group_code": colour_index,
+		"colour_group_name": np.array(COLOURS)[colour_index],
+		"detail_desc": [f"synthetic {PRODUCT_TYPES[t].lower()} article" for t in type_index]
+	})
+
+def generate_transactions(n, customer_ids, articles, rng, start_date="2018-09-20", days=730):
+	"""Popularity skewed (Zipf like) article choice, the price depends on the product type"""
+	article_weights = 1.0 / np.arange(1, len(articles) + 1) ** 0.8
+	article_index = rng.choice(len(articles), n, p=article_weights / article_weights.sum())
+	return pd.DataFrame({
+		"transaction_date": (pd.Timestamp(start_date) + pd.to_timedelta(rng.integers(0, days, n), unit="D")).strftime("%Y-%m-%d"),
+		"customer_id": customer_ids[rng.integers(0, len(customer_ids), n)],
+		"article_id": articles["article_id"].to_numpy()[article_index],
+		"price": (rng.lognormal(-3.6, 0.5, n) * (1 + articles["product_type_no"].to_numpy()[article_index] % 7 / 10)).round(6),
+		"sales_channel_id": rng.choice([1, 2], n, p=[0.3, 0.7])
+	})
+
+def generate_embeddings(articles, dim, rng, has_vector=True):
+	"""One gaussian cluster per product type, so the clustering case finds real clusters"""
+	centers = rng.normal(0, 1, (len(PRODUCT_TYPES), dim)).astype(np.float32)
+	type_index = articles["product_type_no"].to_numpy() - 250
+	vectors = centers[type_index] + rng.normal(0, 0.35, (len(articles), dim)).astype(np.float32)
+	# text input of a pgvector vector, or of a real[] array
+	opening, closing = ("[", "]") if has_vector else ("{", "}")
+	text = [opening + ",".join(f"{value:.5f}" for value in row) + closing for row in vectors]
+	return pd.DataFrame({"article_id": articles["article_id"], "embedding": text})
+
+def load_table(conn, table_name, df, loads, scale):
+	"""insert_df_to_db one DataFrame, its throughput is added to `loads`"""
+	from populate_db import insert_df_to_db
+	start = time.perf_counter()
+	inserted, skipped = insert_df_to_db(df, conn, table_name, verbose=False)
+	seconds = time.perf_counter() - start
+	entry = next((l for l in loads if l["scale"] == scale and l["table"] == table_name), None)
+	if entry is None:
+		entry = {"scale": scale, "table": table_name, "rows": 0, "skipped": 0, "seconds": 0.0}
+		loads.append(entry)
+	entry["rows"] += inserted
+	entry["skipped"] += skipped
+	entry["seconds"] += seconds
+	entry["rows_per_s"] = round(entry["rows"] / entry["seconds"], 1) if entry["seconds"] else None
+
+def populate(conn, scale, embedding_dim, has_vector, seed, loads):
+	"""Generate and load the synthetic data of one scale, returns the row counts"""
+	rng = np.random.default_rng(seed)
+	n_customers = max(MIN_CUSTOMERS, int(scale * CUSTOMERS_PER_TRANSACTION))
+	n_articles = max(MIN_ARTICLES, int(scale * ARTICLES_PER_TRANSACTION))
+	customers = generate_customers(n_customers, rng)
+	articles = generate_articles(n_articles, rng)
+	load_table(conn, "customers", customers, loads, scale)
+	load_table(conn, "articles", articles, loads, scale)
+	load_table(conn, "article_embeddings", generate_embeddings(articles, embedding_dim, rng, has_vector), loads, scale)
+
+	customer_ids = customers["customer_id"].to_numpy()
+	del customers
+	for start in range(0, scale, GENERATE_CHUNK_SIZE):
+		chunk = generate_transactions(min(GENERATE_CHUNK_SIZE, scale - start), customer_ids, articles, rng)
+		load_table(conn, "transactions", chunk, loads, scale)
+	return {"customers": n_customers, "articles": n_articles, "transactions": scale}
+
+
+# ---------------------------------------------------------------- measurements
+
+def is_error(result):
+	# the tools report their failures as strings
+	if isinstance(result, str):
+		return result.startswith("❌") or "fail to run" in result
+	return isinstance(result, dict) and "error" in result
+
+def latency_stats(durations, wall_time):
+	durations = np.asarray(durations) * 1000
+	return {
+		"p50_ms": round(float(np.percentile(durations, 50)), 3),
+		"p99_ms": round(float(np.percentile(durations, 99)), 3),
+		"mean_ms": round(float(durations.mean()), 3),
+		"min_ms": round(float(durations.min()), 3),
+		"max_ms": round(float(durations.max()), 3),
+		"throughput_per_s": round(len(durations) / wall_time, 3) if wall_time else None
+	}
+
+def measure(name, function, repeat, warmup, concurrency=1):
+	"""
+		Time `repeat` calls of `function()` after `warmup` untimed ones, `concurrency` calls in flight.
+		The calls run with metrics.current_tool set to `name`, the phases they record are returned with the latencies.
+	"""
+	import metrics
+	token = metrics.current_tool.set(name)
+	try:
+		first = None
+		for _ in range(warmup):
+			first = function()
+		metrics.registry.reset()
+
+		def timed():
+			start = time.perf_counter()
+			result = function()
+			return time.perf_counter() - start, result
+
+		wall_start = time.perf_counter()
+		if concurrency > 1:
+			# every call runs in a copy of this context, which holds the tool name
+			contexts = [contextvars.copy_context() for _ in range(repeat)]
+			with ThreadPoolExecutor(max_workers=concurrency) as pool:
+				outcomes = list(pool.map(lambda context: context.run(timed), contexts))
+		else:
+			outcomes = [timed() for _ in range(repeat)]
+		wall_time = time.perf_counter() - wall_start
+		phases = {row[1]: {"count": row[2], "total_s": row[3], "avg_s": row[4]} for row in metrics.registry.phase_summary() if row[0] == name}
+	finally:
+		metrics.current_tool.reset(token)
+
+	errors = [result for _, result in outcomes if is_error(result)]
+	entry = {
+		"case": name,
+		"repeat": repeat,
+		"concurrency": concurrency,
+		**latency_stats([seconds for seconds, _ in outcomes], wall_time),
+		"errors": len(errors),
+		"phases": phases
+	}
+	if errors or is_error(first):
+		entry["first_error"] = str((errors or [first])[0])[:500]
+	return entry
+
+def benchmark_cases(db, has_vector, clustering_rows):
+	"""(name, function, repeat factor) of the measured tools, called with caches bypassed"""
+	import var_stats
+
+	def catalog_discovery():
+		# the metadata cache would answer everything after the first call
+		db.metadata_cache.invalidate()
+		return [
+			db.list_schemas(),
+			db.list_tables_in_schema("public"),
+			db.list_columns_in_table("public", "transactions")
+		]
+
+	centroid_query = """
+		SELECT a.product_type_name, e.embedding
+		FROM article_embeddings e JOIN articles a ON a.article_id = e.article_id
+	"""
+	return [
+		("catalog_discovery", catalog_discovery, 1.0),
+		("read_only_query_sample", lambda: db.read_only_query("SELECT * FROM transactions LIMIT 1000", use_cache=False), 1.0),
+		("read_only_query_aggregate", lambda: db.read_only_query(
+			"SELECT sales_channel_id, count(*), avg(price) FROM transactions GROUP BY sales_channel_id", use_cache=False), 1.0),
+		("anova", lambda: var_stats.anova(db, "bench_product_type_age"), 1.0),
+		("tukey_test", lambda: var_stats.tukey_test(db, "bench_product_type_age"), 1.0),
+		("embedding_clustering", lambda: var_stats.embedding_clustering(
+			db, f"SELECT article_id, embedding FROM article_embeddings ORDER BY article_id LIMIT {clustering_rows}", use_cache=False), 0.2),
+		("vector_centroid", lambda: var_stats.vector_centroid(db, centroid_query, grouped=True, method="auto" if has_vector else "client"), 1.0),
+	]
+
+def run_scale(config, scale, args, loads):
+	"""Provision, populate and benchmark one scale, returns the result entries"""
+	from database_connector import DatabaseInterface
+	conn = psycopg2.connect(**config)
+	try:
+		print(f"[{scale}] provisioning schema", file=sys.stderr)
+		has_vector = provision_schema(conn, args.embedding_dim)
+		print(f"[{scale}] loading synthetic data", file=sys.stderr)
+		rows = populate(conn, scale, args.embedding_dim, has_vector, args.seed, loads)
+		build_analysis_tables(conn)
+	finally:
+		conn.close()
+
+	db = DatabaseInterface(config)
+	results = []
+	try:
+		for name, function, factor in benchmark_cases(db, has_vector, args.clustering_rows):
+			if args.cases and name not in args.cases:
+				continue
+			repeat = max(1, int(args.repeat * factor))
+			print(f"[{scale}] {name} x{repeat}", file=sys.stderr)
+			entry = measure(name, function, repeat, args.warmup, args.concurrency)
+			results.append({"scale": scale, "rows": rows, "pgvector": has_vector, **entry})
+			print(f"    p50 {entry['p50_ms']} ms, p99 {entry['p99_ms']} ms, {entry['throughput_per_s']}/s, errors {entry['errors']}", file=sys.stderr)
+	finally:
+		db.close()
+	return results
+
+def run_metadata(config, args):
+	try:
+		commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=DATABASE_DIR, capture_output=True, text=True).stdout.strip() or None
+	except OSError:
+		commit = None
+	conn = psycopg2.connect(**config)
+	try:
+		with conn.cursor() as cur:
+			cur.execute("SHOW server_version")
+			server_version = cur.fetchone()[0]
+	finally:
+		conn.close()
+	return {
+		"format_version": RESULT_FORMAT_VERSION,
+		"label": args.label,
+		"started_at": datetime.now(timezone.utc).isoformat(),
+		"git_commit": commit,
+		"python": platform.python_version(),
+		"platform": platform.platform(),
+		"cpu_count": os.cpu_count(),
+		"postgres": server_version,
+		"settings": {
+			"repeat": args.repeat,
+			"warmup": args.warmup,
+			"concurrency": args.concurrency,
+			"embedding_dim": args.embedding_dim,
+			"clustering_rows": args.clustering_rows,
+			"seed": args.seed
+		}
+	}
+
+
+# ---------------------------------------------------------------- comparison
+
+def compare(previous, current):
+	"""Print the p50 / p99 ratios (current / previous) of the cases present in both runs to stderr"""
+	before = {(r["scale"], r["case"]): r for r in previous["results"]}
+	print(f"{'scale':>10} {'case':<28} {'p50 ms':>12} {'ratio':>7} {'p99 ms':>12} {'ratio':>7}", file=sys.stderr)
+	for r in current["results"]:
+		old = before.get((r["scale"], r["case"]))
+		if old is None:
+			continue
+		p50_ratio = r["p50_ms"] / old["p50_ms"] if old["p50_ms"] else float("nan")
+		p99_ratio = r["p99_ms"] / old["p99_ms"] if old["p99_ms"] else float("nan")
+		print(f"{r['scale']:>10} {r['case']:<28} {r['p50_ms']:>12.3f} {p50_ratio:>7.2f} {r['p99_ms']:>12.3f} {p99_ratio:>7.2f}", file=sys.stderr)
+	old_loads = {(l["scale"], l["table"]): l for l in previous.get("loads", [])}
+	for l in current.get("loads", []):
+		old = old_loads.get((l["scale"], l["table"]))
+		if old and old.get("rows_per_s") and l.get("rows_per_s"):
+			print(f"{l['scale']:>10} insert_df_to_db:{l['table']:<12} {l['rows_per_s']:>12.0f} rows/s {l['rows_per_s'] / old['rows_per_s']:>7.2f}", file=sys.stderr)
+
+
+def parse_args(argv=None):
+	parser = argparse.ArgumentParser(description="Benchmark the MCP server tools on synthetic H&M like data")
+	parser.add_argument("--env", default=".env", help="dotenv file with the DB_* connection variables")
+	parser.add_argument("--database", default="",
+		help="database created and overwritten by the benchmark, never the configured DB_NAME (default: BENCHMARK_DB_NAME or mcp_benchmark)")
+	parser.add_argument("--scales", default="10000,100000", help=f"comma separated numbers of transactions, e.g. {','.join(map(str, DEFAULT_SCALES))}")
+	parser.add_argument("--cases", default="", help="comma separated subset of the cases to run (default: all)")
+	parser.add_argument("--repeat", type=int, default=20, help="timed calls per case (embedding_clustering runs a fifth of them)")
+	parser.add_argument("--warmup", type=int, default=2, help="untimed calls before each case")
+	parser.add_argument("--concurrency", type=int, default=1, help="calls in flight per case")
+	parser.add_argument("--embedding-dim", type=int, default=64)
+	parser.add_argument("--clustering-rows", type=int, default=2000, help="embeddings given to embedding_clustering")
+	parser.add_argument("--seed", type=int, default=42)
+	parser.add_argument("--label", default="", help="free text stored with the results")
+	parser.add_argument("--output", default="", help="JSON file to write (default: stdout)")
+	parser.add_argument("--compare", default="", help="previous JSON result to compare with")
+	args = parser.parse_args(argv)
+	args.scales = [int(scale) for scale in args.scales.split(",") if scale.strip()]
+	args.cases = {case.strip() for case in args.cases.split(",") if case.strip()}
+	return args
+
+def main(argv=None):
+	args = parse_args(argv)
+	load_dotenv(args.env)
+	# resolved after load_dotenv so that BENCHMARK_DB_NAME can come from the dotenv file
+	args.database = args.database or os.getenv("BENCHMARK_DB_NAME", "mcp_benchmark")
+	config = server_config()
+	if args.database == config["database"]:
+		raise SystemExit(f"The benchmark drops and recreates its tables, use a database other than {args.database}")
+	config = create_database(config, args.database)
+
+	report = {**run_metadata(config, args), "loads": [], "results": []}
+	# stdout only gets the JSON report: progress, and whatever the tools print, goes to stderr
+	with contextlib.redirect_stdout(sys.stderr):
+		for scale in args.scales:
+			report["results"].extend(run_scale(config, scale, args, report["loads"]))
+
+	output = json.dumps(report, indent=2, default=str)
+	if args.output:
+		os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+		with open(args.output, "w") as f:
+			f.write(output)
+		print(f"Results written to {args.output}", file=sys.stderr)
+	else:
+		print(output)
+	if args.compare:
+		with open(args.compare) as f:
+			compare(json.load(f), report)
+
+if __name__ == "__main__":
+	main()
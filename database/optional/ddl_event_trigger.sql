@@ -0,0 +1,15 @@
+-- ddl_event_trigger.sql
+-- Optional: notify the MCP server of DDL made outside of it so its metadata cache is invalidated
+-- Requires a superuser. Start the server with DB_DDL_NOTIFY_CHANNEL=mcp_ddl to listen for it
+
+CREATE OR REPLACE FUNCTION notify_mcp_ddl() RETURNS event_trigger AS $$
+BEGIN
+    PERFORM pg_notify('mcp_ddl', tg_tag);
+END;
+$$ LANGUAGE plpgsql;
+
+DROP EVENT TRIGGER IF EXISTS mcp_ddl_command_end;
+CREATE EVENT TRIGGER mcp_ddl_command_end ON ddl_command_end EXECUTE FUNCTION notify_mcp_ddl();
+
+DROP EVENT TRIGGER IF EXISTS mcp_sql_drop;
+CREATE EVENT TRIGGER mcp_sql_drop ON sql_drop EXECUTE FUNCTION notify_mcp_ddl();
@@ -1,10 +1,15 @@
 import os
+import io
 from dotenv import load_dotenv
 import psycopg2
 import pandas as pd
 import numpy as np
 import time
 import sys
+import threading
+from queue import Queue
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
 # Load environment variables from .env file
 env_file = '.env' if len(sys.argv) == 1 else sys.argv[1]
 print(env_file)
@@ -16,6 +21,7 @@ DB_USER = os.getenv("POSTGRES_USER")
 DB_PASSWORD = os.getenv("POSTGRES_PASSWORD")
 DB_HOST = os.getenv("DB_HOST")
 DB_PORT = os.getenv("DB_PORT", 5432)
+LOAD_WORKERS = int(os.getenv("LOAD_WORKERS", 4))
 
 # Connect to the PostgreSQL database
 def connect_to_db():
@@ -43,11 +49,59 @@ def get_table_columns(conn, table_name):
 	cursor.close()
 	return columns
 
-def load_customers(path):
-	df = pd.read_csv(path)
+# Explicit dtypes: pandas does no type inference and every chunk gets the same types
+CUSTOMERS_DTYPES = {
+	'customer_id': 'string',
+	'FN': 'float64',
+	'Active': 'float64',
+	'club_member_status': 'string',
+	'fashion_news_frequency': 'string',
+	'age': 'float64',
+	'postal_code': 'string'
+}
+
+ARTICLES_DTYPES = {
+	'article_id': 'Int64',
+	'product_code': 'Int64',
+	'prod_name': 'string',
+	'product_type_no': 'Int64',
+	'product_type_name': 'string',
+	'product_group_name': 'string',
+	'graphical_appearance_no': 'Int64',
+	'graphical_appearance_name': 'string',
+	'colour_group_code': 'Int64',
+	'colour_group_name': 'string',
+	'perceived_colour_value_id': 'Int64',
+	'perceived_colour_value_name': 'string',
+	'perceived_colour_master_id': 'Int64',
+	'perceived_colour_master_name': 'string',
+	'department_no': 'Int64',
+	'department_name': 'string',
+	'index_code': 'string',
+	'index_name': 'string',
+	'index_group_no': 'Int64',
+	'index_group_name': 'string',
+	'section_no': 'Int64',
+	'section_name': 'string',
+	'garment_group_no': 'Int64',
+	'garment_group_name': 'string',
+	'detail_desc': 'string'
+}
+
+# t_dat is kept as the 'YYYY-MM-DD' text of the file, COPY parses it as a DATE
+TRANSACTIONS_DTYPES = {
+	't_dat': 'string',
+	'customer_id': 'string',
+	'article_id': 'Int64',
+	'price': 'float64',
+	'sales_channel_id': 'Int64'
+}
+
+CSV_CHUNK_SIZE = 100000
 
+def transform_customers(df):
 	# Convert Active: 1.0 => True, NaN => False
-	df['active'] = df['Active'].apply(lambda x: True if x == 1.0 else False)
+	df['active'] = df['Active'] == 1.0
 	df.drop(columns=['Active'], inplace=True)
 
 	# Rename FN to fn (optional - if your schema uses lowercase)
@@ -58,15 +112,21 @@ def load_customers(path):
 
 	return df
 
+def transform_articles(df):
+	return df
 
+def transform_transactions(df):
+	df.rename(columns={'t_dat': 'transaction_date'}, inplace=True)
+	return df
+
+def load_customers(path):
+	return transform_customers(pd.read_csv(path, dtype=CUSTOMERS_DTYPES))
 
 def load_articles(path):
-	return pd.read_csv(path)
+	return transform_articles(pd.read_csv(path, dtype=ARTICLES_DTYPES))
 
 def load_transactions(path):
-	df = pd.read_csv(path, parse_dates=['t_dat'])
-	df.rename(columns={'t_dat': 'transaction_date'}, inplace=True)
-	return df
+	return transform_transactions(pd.read_csv(path, dtype=TRANSACTIONS_DTYPES))
 
 def no_duplicate_in(df, var):
 	return len(df[df[var].duplicated(keep=False)]) == 0
@@ -78,7 +138,86 @@ def check_columns_in_df(df, columns):
 		return False
 	return True
 
-def insert_df_to_db(df, conn, table_name, batch_size=1000):
+def get_table_column_types(conn, table_name):
+	cursor = conn.cursor()
+	cursor.execute(
+		"SELECT column_name, data_type FROM information_schema.columns WHERE table_name = %s;",
+		(table_name,)
+	)
+	column_types = dict(cursor.fetchall())
+	cursor.close()
+	return column_types
+
+def get_foreign_keys(conn, table_name):
+	"""[(column, referenced_table, referenced_column)] of the single column foreign keys of a table"""
+	cursor = conn.cursor()
+	cursor.execute(
+		"""
+		SELECT kcu.column_name, ccu.table_name, ccu.column_name
+		FROM information_schema.table_constraints tc
+		JOIN information_schema.key_column_usage kcu
+			ON tc.constraint_name = kcu.constraint_name AND tc.table_schema = kcu.table_schema
+		JOIN information_schema.constraint_column_usage ccu
+			ON tc.constraint_name = ccu.constraint_name AND tc.table_schema = ccu.table_schema
+		WHERE tc.constraint_type = 'FOREIGN KEY' AND tc.table_name = %s;
+		""",
+		(table_name,)
+	)
+	foreign_keys = cursor.fetchall()
+	cursor.close()
+	return foreign_keys
+
+INTEGER_TYPES = ('smallint', 'integer', 'bigint')
+
+def prepare_df_for_copy(df, column_types):
+	"""COPY parses text: integer columns read as float by pandas (because of NaN) must not be written as 1.0"""
+	for col in df.columns:
+		if column_types.get(col) in INTEGER_TYPES and pd.api.types.is_float_dtype(df[col]):
+			df[col] = df[col].round().astype('Int64')
+	return df
+
+def df_to_csv_buffer(df):
+	"""Serialize a chunk to an in-memory CSV buffer for COPY, NaN becomes an empty (NULL) field"""
+	buffer = io.StringIO()
+	df.to_csv(buffer, index=False, header=False)
+	buffer.seek(0)
+	return buffer
+
+def copy_buffer(cursor, table_name, columns, buffer):
+	cursor.copy_expert(f"COPY {table_name} ({columns}) FROM STDIN WITH (FORMAT csv)", buffer)
+
+def insert_via_staging(conn, table_name, columns, buffer, foreign_keys):
+	"""
+		Fallback for a chunk that violates a constraint: COPY it into a temporary staging table,
+		then insert only the rows whose foreign keys exist, skipping duplicates with ON CONFLICT DO NOTHING
+	"""
+	staging_table = f"{table_name}_staging"
+	cursor = conn.cursor()
+	cursor.execute(f"CREATE TEMP TABLE IF NOT EXISTS {staging_table} (LIKE {table_name} INCLUDING DEFAULTS)")
+	cursor.execute(f"TRUNCATE {staging_table}")
+	buffer.seek(0)
+	copy_buffer(cursor, staging_table, columns, buffer)
+
+	conditions = [
+		f"(s.{column} IS NULL OR EXISTS (SELECT 1 FROM {ref_table} r WHERE r.{ref_column} = s.{column}))"
+		for column, ref_table, ref_column in foreign_keys
+		if column in columns.split(', ')
+	]
+	where_clause = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+	select_columns = ', '.join(f"s.{col}" for col in columns.split(', '))
+	cursor.execute(
+		f"INSERT INTO {table_name} ({columns}) SELECT {select_columns} FROM {staging_table} s {where_clause} ON CONFLICT DO NOTHING"
+	)
+	inserted = cursor.rowcount
+	cursor.execute(f"TRUNCATE {staging_table}")
+	cursor.close()
+	return inserted
+
+def insert_df_to_db(df, conn, table_name, batch_size=50000, verbose=True):
+	"""
+		Load a DataFrame with COPY FROM STDIN, one chunk of `batch_size` rows per COPY.
+		Returns (inserted_rows, skipped_rows)
+	"""
 	cursor = conn.cursor()
 	table_columns = get_table_columns(conn, table_name)
 
@@ -88,11 +227,11 @@ def insert_df_to_db(df, conn, table_name, batch_size=1000):
 	if df_filtered.empty:
 		print("No matching columns found or dataframe is empty")
 		cursor.close()
-		return
+		return 0, 0
 
+	df_filtered = prepare_df_for_copy(df_filtered.copy(), get_table_column_types(conn, table_name))
+	foreign_keys = None
 	columns = ', '.join(df_filtered.columns)
-	placeholders = ', '.join(['%s'] * len(df_filtered.columns))
-	insert_sql = f"INSERT INTO {table_name} ({columns}) VALUES ({placeholders})"
 
 	total_rows = len(df_filtered)
 	inserted_rows = 0
@@ -100,81 +239,359 @@ def insert_df_to_db(df, conn, table_name, batch_size=1000):
 	start_time = time.time()
 	last_progress_time = start_time
 
-	# Convert dataframe to list of tuples for batch processing
-	data_tuples = [tuple(row) for row in df_filtered.values]
-	
-	# Process in batches
-	for i in range(0, len(data_tuples), batch_size):
-		batch = data_tuples[i:i + batch_size]
+	# Process in chunks, each COPY is its own transaction
+	for i in range(0, total_rows, batch_size):
+		chunk = df_filtered.iloc[i:i + batch_size]
+		buffer = df_to_csv_buffer(chunk)
 		
 		try:
-			cursor.executemany(insert_sql, batch)
-			inserted_rows += len(batch)
+			copy_buffer(cursor, table_name, columns, buffer)
+			conn.commit()
+			inserted_rows += len(chunk)
 			
 		except psycopg2.IntegrityError as e:
-			# If batch fails due to integrity error, try individual inserts for this batch
-			print(f"Batch insert failed, trying individual inserts for batch starting at row {i}: {e}")
+			# Load the chunk again through a staging table that filters the offending rows
+			print(f"COPY failed, loading chunk starting at row {i} through a staging table: {str(e).strip()}")
 			conn.rollback()
-			
-			for j, row_data in enumerate(batch):
-				try:
-					cursor.execute(insert_sql, row_data)
-					inserted_rows += 1
-				except psycopg2.IntegrityError as row_e:
-					print(f"Skipping row {i + j} due to IntegrityError: {row_e}")
-					skipped_rows += 1
-					conn.rollback()
-					continue
-				except Exception as row_e:
-					print(f"Error inserting row {i + j}: {row_e}")
-					skipped_rows += 1
-					conn.rollback()
-					continue
+			try:
+				if foreign_keys is None:
+					foreign_keys = get_foreign_keys(conn, table_name)
+				inserted = insert_via_staging(conn, table_name, columns, buffer, foreign_keys)
+				conn.commit()
+				inserted_rows += inserted
+				skipped_rows += len(chunk) - inserted
+			except Exception as staging_e:
+				print(f"Error with chunk starting at row {i}: {staging_e}")
+				conn.rollback()
+				skipped_rows += len(chunk)
 					
 		except Exception as e:
-			print(f"Error with batch starting at row {i}: {e}")
+			print(f"Error with chunk starting at row {i}: {e}")
 			conn.rollback()
-			skipped_rows += len(batch)
+			skipped_rows += len(chunk)
 			continue
 
 		# Show progress every 5 seconds
 		current_time = time.time()
-		if current_time - last_progress_time >= 5:
-			progress = ((i + len(batch)) / total_rows) * 100
+		if verbose and current_time - last_progress_time >= 5:
+			progress = ((i + len(chunk)) / total_rows) * 100
 			elapsed = current_time - start_time
 			rate = inserted_rows / elapsed if elapsed > 0 else 0
 			print(f"Progress: {progress:.2f}% ({inserted_rows}/{total_rows} inserted, {skipped_rows} skipped) - {rate:.0f} rows/sec")
 			last_progress_time = current_time
 
-	conn.commit()
 	cursor.close()
 	
 	final_time = time.time() - start_time
 	final_rate = inserted_rows / final_time if final_time > 0 else 0
-	print(f"Complete: {inserted_rows}/{total_rows} rows inserted, {skipped_rows} skipped in {final_time:.2f}s ({final_rate:.0f} rows/sec)")
+	if verbose:
+		print(f"Complete: {inserted_rows}/{total_rows} rows inserted, {skipped_rows} skipped in {final_time:.2f}s ({final_rate:.0f} rows/sec)")
+	return inserted_rows, skipped_rows
 
-if __name__ == "__main__":
+def read_csv_chunks(path, dtype, transform, chunksize=CSV_CHUNK_SIZE, prefetch=2):
+	"""
+		Parse and transform the CSV in a background thread, yielding chunks through a bounded queue
+		so that parsing the next chunks overlaps with writing the current one to the database.
+		At most `prefetch` parsed chunks wait in memory.
+	"""
+	queue = Queue(maxsize=prefetch)
+	done = object()
+
+	def producer():
+		try:
+			for chunk in pd.read_csv(path, dtype=dtype, chunksize=chunksize):
+				queue.put(transform(chunk))
+		except Exception as e:
+			queue.put(e)
+		finally:
+			queue.put(done)
+
+	threading.Thread(target=producer, daemon=True).start()
+	while True:
+		item = queue.get()
+		if item is done:
+			return
+		if isinstance(item, Exception):
+			raise item
+		yield item
+
+def stream_csv_to_db(path, conn, table_name, dtype, transform, chunksize=CSV_CHUNK_SIZE):
+	"""Load a CSV chunk by chunk, peak memory is bounded by the chunk size instead of the file size"""
+	expected_columns = get_table_columns(conn, table_name)
+	inserted_rows = 0
+	skipped_rows = 0
+	start_time = time.time()
+	last_progress_time = start_time
+
+	print(f"Starting to stream {path} into {table_name} ({chunksize} rows per chunk)...")
+	for chunk_number, chunk in enumerate(read_csv_chunks(path, dtype, transform, chunksize)):
+		if chunk_number == 0:
+			assert check_columns_in_df(chunk, expected_columns), f"DataFrame columns do not match for table {table_name}"
+		inserted, skipped = insert_df_to_db(chunk, conn, table_name, batch_size=len(chunk), verbose=False)
+		inserted_rows += inserted
+		skipped_rows += skipped
+
+		# Show progress every 5 seconds
+		current_time = time.time()
+		if current_time - last_progress_time >= 5:
+			elapsed = current_time - start_time
+			rate = inserted_rows / elapsed if elapsed > 0 else 0
+			print(f"Progress: chunk {chunk_number + 1} ({inserted_rows} inserted, {skipped_rows} skipped) - {rate:.0f} rows/sec")
+			last_progress_time = current_time
+
+	final_time = time.time() - start_time
+	final_rate = inserted_rows / final_time if final_time > 0 else 0
+	print(f"Complete: {inserted_rows}/{inserted_rows + skipped_rows} rows inserted, {skipped_rows} skipped in {final_time:.2f}s ({final_rate:.0f} rows/sec)")
+	return inserted_rows, skipped_rows
+
+def parallel_stream_csv_to_db(path, table_name, dtype, transform, workers=LOAD_WORKERS, chunksize=CSV_CHUNK_SIZE):
+	"""
+		Same as stream_csv_to_db, but the chunks are COPYed by `workers` threads, each on its own connection.
+		A single thread parses the CSV, the bounded queue keeps at most 2 chunks per worker in memory.
+	"""
+	chunks = Queue(maxsize=workers * 2)
+	done = object()
+	totals = {"inserted": 0, "skipped": 0}
+	lock = threading.Lock()
+	errors = []
+
+	def worker():
+		conn = None
+		try:
+			# connect_to_db exits on failure: the SystemExit is recorded below like any other error
+			conn = connect_to_db()
+			while True:
+				chunk = chunks.get()
+				if chunk is done:
+					return
+				inserted, skipped = insert_df_to_db(chunk, conn, table_name, batch_size=len(chunk), verbose=False)
+				with lock:
+					totals["inserted"] += inserted
+					totals["skipped"] += skipped
+		except BaseException as e:
+			errors.append(e)
+			# keep draining so the reader is never blocked on a full queue
+			while chunks.get() is not done:
+				pass
+		finally:
+			if conn is not None:
+				conn.close()
+
+	conn = connect_to_db()
+	expected_columns = get_table_columns(conn, table_name)
+	conn.close()
+
+	start_time = time.time()
+	print(f"Starting to stream {path} into {table_name} with {workers} connections ({chunksize} rows per chunk)...")
+	threads = [threading.Thread(target=worker, daemon=True) for _ in range(workers)]
+	for thread in threads:
+		thread.start()
 	try:
-		customers_df = load_customers('./customers_filtered.csv')
-		articles_df = load_articles('./articles_filtered.csv')
-		transactions_df = load_transactions('./transaction_sample_3.csv')
+		for chunk_number, chunk in enumerate(read_csv_chunks(path, dtype, transform, chunksize)):
+			if chunk_number == 0:
+				assert check_columns_in_df(chunk, expected_columns), f"DataFrame columns do not match for table {table_name}"
+			chunks.put(chunk)
+	finally:
+		for _ in threads:
+			chunks.put(done)
+		for thread in threads:
+			thread.join()
+	if errors:
+		raise errors[0]
+
+	inserted_rows, skipped_rows = totals["inserted"], totals["skipped"]
+	final_time = time.time() - start_time
+	final_rate = inserted_rows / final_time if final_time > 0 else 0
+	print(f"Complete: {inserted_rows}/{inserted_rows + skipped_rows} rows inserted into {table_name}, {skipped_rows} skipped in {final_time:.2f}s ({final_rate:.0f} rows/sec)")
+	return inserted_rows, skipped_rows
 
+def get_secondary_indexes(conn, table_name):
+	"""[(index_name, CREATE INDEX statement)] of the indexes that do not back a constraint (primary key, unique...)"""
+	cursor = conn.cursor()
+	cursor.execute(
+		"""
+		SELECT i.relname, pg_get_indexdef(ix.indexrelid)
+		FROM pg_index ix
+		JOIN pg_class i ON i.oid = ix.indexrelid
+		WHERE ix.indrelid = %s::regclass
+			AND NOT EXISTS (SELECT 1 FROM pg_constraint c WHERE c.conindid = ix.indexrelid);
+		""",
+		(table_name,)
+	)
+	indexes = cursor.fetchall()
+	cursor.close()
+	return indexes
+
+def get_foreign_key_constraints(conn, table_name):
+	"""[(constraint_name, constraint definition)] of the foreign keys of a table"""
+	cursor = conn.cursor()
+	cursor.execute(
+		"SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint WHERE conrelid = %s::regclass AND contype = 'f';",
+		(table_name,)
+	)
+	constraints = cursor.fetchall()
+	cursor.close()
+	return constraints
+
+class LoadOrchestrator:
+	"""
+		Bulk load of the demo tables:
+		1) the secondary indexes and foreign keys of `deferred_tables` are dropped, rows are loaded without maintaining them
+		2) tables without dependencies between them are loaded concurrently (customers and articles),
+		   then the fact tables are loaded on `workers` connections
+		3) rows whose foreign keys do not exist are deleted (the row by row load skipped them),
+		   indexes are rebuilt in parallel and the foreign keys are added back and validated
+		Each phase is timed, see report()
+	"""
+
+	def __init__(self, workers=LOAD_WORKERS, chunksize=CSV_CHUNK_SIZE, deferred_tables=("transactions",)):
+		self.workers = workers
+		self.chunksize = chunksize
+		self.deferred_tables = deferred_tables
+		self.timings = []
+		self.results = {}
+		self.deferred_indexes = []
+		self.deferred_foreign_keys = []
+
+	@contextmanager
+	def phase(self, name):
+		print(f"--- {name}")
+		start_time = time.time()
+		try:
+			yield
+		finally:
+			self.timings.append((name, time.time() - start_time))
+
+	def run_in_parallel(self, tasks):
+		"""Run each (callable, args) in its own thread and re-raise the first error"""
+		if not tasks:
+			return []
+		with ThreadPoolExecutor(max_workers=len(tasks)) as executor:
+			futures = [executor.submit(function, *args) for function, args in tasks]
+			return [future.result() for future in futures]
+
+	def execute(self, sql):
+		conn = connect_to_db()
+		try:
+			cursor = conn.cursor()
+			cursor.execute(sql)
+			cursor.close()
+		finally:
+			conn.close()
+
+	def defer_constraints(self):
+		conn = connect_to_db()
+		cursor = conn.cursor()
+		for table_name in self.deferred_tables:
+			foreign_keys = get_foreign_key_constraints(conn, table_name)
+			self.deferred_foreign_keys += [(table_name, name, definition, get_foreign_keys(conn, table_name)) for name, definition in foreign_keys]
+			for name, _ in foreign_keys:
+				cursor.execute(f"ALTER TABLE {table_name} DROP CONSTRAINT {name}")
+			indexes = get_secondary_indexes(conn, table_name)
+			self.deferred_indexes += indexes
+			for name, _ in indexes:
+				cursor.execute(f"DROP INDEX {name}")
+			print(f"{table_name}: deferred {len(indexes)} indexes and {len(foreign_keys)} foreign keys")
+		cursor.close()
+		conn.close()
+
+	def delete_orphans(self):
+		"""Without the foreign keys, COPY accepted rows that reference missing customers / articles"""
+		conn = connect_to_db()
+		cursor = conn.cursor()
+		seen = set()
+		for table_name, _, _, foreign_keys in self.deferred_foreign_keys:
+			for column, ref_table, ref_column in foreign_keys:
+				if (table_name, column) in seen:
+					continue
+				seen.add((table_name, column))
+				cursor.execute(
+					f"DELETE FROM {table_name} t WHERE t.{column} IS NOT NULL "
+					f"AND NOT EXISTS (SELECT 1 FROM {ref_table} r WHERE r.{ref_column} = t.{column})"
+				)
+				if cursor.rowcount:
+					print(f"{table_name}: deleted {cursor.rowcount} rows with an unknown {column}")
+					inserted, skipped = self.results.get(table_name, (0, 0))
+					self.results[table_name] = (inserted - cursor.rowcount, skipped + cursor.rowcount)
+		cursor.close()
+		conn.close()
+
+	def restore_indexes(self):
+		# CREATE INDEX takes a SHARE lock, builds on the same table do not block each other
+		self.run_in_parallel([(self.execute, (definition,)) for _, definition in self.deferred_indexes])
+		self.deferred_indexes = []
+
+	def restore_foreign_keys(self):
+		# NOT VALID is instant, VALIDATE checks the existing rows; validations of one table lock each other, so they run in turn
+		for table_name, name, definition, _ in self.deferred_foreign_keys:
+			self.execute(f"ALTER TABLE {table_name} ADD CONSTRAINT {name} {definition} NOT VALID")
+			self.execute(f"ALTER TABLE {table_name} VALIDATE CONSTRAINT {name}")
+		self.deferred_foreign_keys = []
+
+	def load(self, table_name, path, dtype, transform, workers=1):
+		if workers > 1:
+			result = parallel_stream_csv_to_db(path, table_name, dtype, transform, workers, self.chunksize)
+		else:
+			conn = connect_to_db()
+			try:
+				result = stream_csv_to_db(path, conn, table_name, dtype, transform, self.chunksize)
+			finally:
+				conn.close()
+		self.results[table_name] = result
+		return result
+
+	def run(self, dimensions, facts):
+		"""`dimensions` and `facts` are lists of (table_name, path, dtype, transform), facts reference the dimensions"""
+		start_time = time.time()
+		with self.phase("defer indexes and foreign keys"):
+			self.defer_constraints()
+		try:
+			with self.phase(f"load {', '.join(table for table, *_ in dimensions)} concurrently"):
+				self.run_in_parallel([(self.load, args) for args in dimensions])
+			for table_name, path, dtype, transform in facts:
+				with self.phase(f"load {table_name} on {self.workers} connections"):
+					self.load(table_name, path, dtype, transform, self.workers)
+			if self.deferred_foreign_keys:
+				with self.phase("delete rows with unknown foreign keys"):
+					self.delete_orphans()
+		finally:
+			# indexes and foreign keys are restored even when the load failed
+			with self.phase(f"rebuild {len(self.deferred_indexes)} indexes in parallel"):
+				self.restore_indexes()
+			with self.phase("restore and validate foreign keys"):
+				self.restore_foreign_keys()
+			with self.phase("analyze"):
+				self.execute("ANALYZE " + ", ".join(table for table, *_ in dimensions + facts))
+			self.timings.append(("total", time.time() - start_time))
+		return self.results
+
+	def report(self):
+		print("Load summary:")
+		for table_name, (inserted, skipped) in self.results.items():
+			print(f"  {table_name}: {inserted} rows inserted, {skipped} skipped")
+		for name, seconds in self.timings:
+			print(f"  {name}: {seconds:.2f}s")
+
+if __name__ == "__main__":
+	try:
 		# assert no_duplicate_in(customers_df, 'customer_id'), "Duplicate customer_id detected"
 		# assert no_duplicate_in(articles_df, 'article_id'), "Duplicate article_id detected"
 
-		connection = connect_to_db()
-
-		for df, table in [
-			(customers_df, "customers"),
-			(articles_df, "articles"),
-			(transactions_df, "transactions")
-		]:
-			expected_columns = get_table_columns(connection, table)
-			assert check_columns_in_df(df, expected_columns), f"DataFrame columns do not match for table {table}"
-			print(f"Starting to insert into {table} ({len(df)} rows)...")
-			insert_df_to_db(df, connection, table)
+		orchestrator = LoadOrchestrator()
+		try:
+			orchestrator.run(
+				dimensions=[
+					("customers", './customers_filtered.csv', CUSTOMERS_DTYPES, transform_customers),
+					("articles", './articles_filtered.csv', ARTICLES_DTYPES, transform_articles)
+				],
+				facts=[
+					("transactions", './transaction_sample_3.csv', TRANSACTIONS_DTYPES, transform_transactions)
+				]
+			)
+		finally:
+			orchestrator.report()
 
 		print("DONE")
 
 	except Exception as e:
-		print(f"Migration failed: {e}")
+		print(f"Migration failed: {e}")
\ No newline at end of file
@@ -0,0 +1,210 @@
+import os
+import asyncio
+import threading
+import multiprocessing
+from multiprocessing import shared_memory
+from concurrent.futures import ProcessPoolExecutor, Future, TimeoutError as FutureTimeout
+from typing import Dict, Any, Callable, Optional, Tuple
+import numpy as np
+
+
+class AnalysisRejected(RuntimeError):
+	"""Raised when the executor already holds its maximum number of running and queued jobs"""
+
+
+class AnalysisTimeout(TimeoutError):
+	"""Raised when a job runs for longer than its timeout, the job is cancelled"""
+
+
+# (shared memory name, shape, dtype) of an array handed to a worker
+SharedArray = Tuple[str, Tuple[int, ...], str]
+
+
+def _share(array: np.ndarray) -> Tuple[shared_memory.SharedMemory, SharedArray]:
+	array = np.ascontiguousarray(array)
+	shm = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+	np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf)[...] = array
+	return shm, (shm.name, array.shape, array.dtype.str)
+
+
+def _attach(name: str) -> shared_memory.SharedMemory:
+	"""Open a segment created by the parent, which owns it and unlinks it"""
+	try:
+		return shared_memory.SharedMemory(name=name, track=False)
+	except TypeError:
+		# python < 3.13: workers share the resource tracker of the parent, registering again is harmless
+		return shared_memory.SharedMemory(name=name)
+
+
+def _run_job(function: Callable, shared: Dict[str, SharedArray], kwargs: Dict[str, Any]):
+	"""
+		Worker side: attach the shared arrays as read only numpy views and call `function(**arrays, **kwargs)`.
+		The job must not return the views themselves (copy what it keeps), they are invalid once detached.
+	"""
+	segments, arrays = [], {}
+	try:
+		for name, (shm_name, shape, dtype) in shared.items():
+			shm = _attach(shm_name)
+			segments.append(shm)
+			view = np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf)
+			view.flags.writeable = False
+			arrays[name] = view
+		return function(**arrays, **kwargs)
+	finally:
+		arrays.clear()
+		for shm in segments:
+			try:
+				shm.close()
+			except BufferError:
+				# a view is still referenced, the mapping goes away with the worker
+				pass
+
+
+class AnalysisExecutor:
+	"""
+		Runs the CPU bound var_stats computations in a bounded ProcessPoolExecutor, away from the Gradio workers.
+		- arrays are copied once into shared memory and attached by the worker, they are not pickled
+		- at most `max_workers + max_queue` jobs are accepted, more raise AnalysisRejected
+		- a job running for longer than `timeout` seconds, or whose caller is cancelled (MCP client gone),
+		  is cancelled: a queued job is simply dropped, a running one can only be stopped by terminating
+		  the worker processes, the pool is then recreated and the other running jobs fail
+		Settings default to the ANALYSIS_* environment variables.
+	"""
+
+	def __init__(self, max_workers: Optional[int] = None, max_queue: Optional[int] = None,
+			timeout: Optional[float] = None, start_method: Optional[str] = None):
+		self.max_workers = max_workers or int(os.getenv('ANALYSIS_WORKERS', max(1, (os.cpu_count() or 2) // 2)))
+		self.max_queue = max_queue if max_queue is not None else int(os.getenv('ANALYSIS_MAX_QUEUE', 8))
+		self.timeout = timeout or float(os.getenv('ANALYSIS_TIMEOUT', 600))
+		# forkserver / spawn: forking the threaded server process is unsafe
+		self.start_method = start_method or os.getenv('ANALYSIS_START_METHOD', 'forkserver')
+		self._lock = threading.Lock()
+		self._executor = None
+		self._active = 0
+		self._counters = {"submitted": 0, "completed": 0, "failed": 0, "rejected": 0, "timeouts": 0, "cancelled": 0, "restarts": 0}
+
+	def _pool(self) -> ProcessPoolExecutor:
+		if self._executor is None:
+			self._executor = ProcessPoolExecutor(
+				max_workers=self.max_workers,
+				mp_context=multiprocessing.get_context(self.start_method)
+			)
+		return self._executor
+
+	def submit(self, function: Callable, arrays: Optional[Dict[str, np.ndarray]] = None, **kwargs) -> Future:
+		"""Queue `function(**arrays, **kwargs)`, `function` must be importable (module level) from the worker"""
+		with self._lock:
+			if self._active >= self.max_workers + self.max_queue:
+				self._counters["rejected"] += 1
+				raise AnalysisRejected(
+					f"the analysis queue is full ({self._active} jobs for {self.max_workers} workers), retry later"
+				)
+			self._active += 1
+			self._counters["submitted"] += 1
+
+		segments, shared = [], {}
+		try:
+			for name, array in (arrays or {}).items():
+				shm, shared[name] = _share(array)
+				segments.append(shm)
+			with self._lock:
+				future = self._pool().submit(_run_job, function, shared, kwargs)
+		except BaseException:
+			self._release(segments)
+			raise
+		future.add_done_callback(lambda f: self._done(f, segments))
+		return future
+
+	def _release(self, segments):
+		with self._lock:
+			self._active -= 1
+		for shm in segments:
+			shm.close()
+			shm.unlink()
+
+	def _done(self, future: Future, segments):
+		self._release(segments)
+		with self._lock:
+			if future.cancelled():
+				self._counters["cancelled"] += 1
+			elif future.exception() is not None:
+				self._counters["failed"] += 1
+			else:
+				self._counters["completed"] += 1
+
+	def cancel(self, future: Future):
+		"""Cancel a job, terminating the workers when it is already running"""
+		if future.cancel() or future.done():
+			return
+		with self._lock:
+			executor, self._executor = self._executor, None
+			self._counters["restarts"] += 1
+		if executor is None:
+			return
+		# ProcessPoolExecutor cannot stop a single task, its processes are terminated
+		processes = list((getattr(executor, "_processes", None) or {}).values())
+		executor.shutdown(wait=False, cancel_futures=True)
+		for process in processes:
+			process.terminate()
+
+	def run(self, function: Callable, arrays: Optional[Dict[str, np.ndarray]] = None, timeout: Optional[float] = None, **kwargs):
+		"""Blocking call for sync callers"""
+		future = self.submit(function, arrays, **kwargs)
+		timeout = timeout or self.timeout
+		try:
+			return future.result(timeout)
+		except FutureTimeout:
+			self._timed_out(future, timeout)
+		except BaseException:
+			self.cancel(future)
+			raise
+
+	async def run_async(self, function: Callable, arrays: Optional[Dict[str, np.ndarray]] = None, timeout: Optional[float] = None, **kwargs):
+		"""Awaitable call: when the awaiting task is cancelled (client disconnected) the job is cancelled too"""
+		future = self.submit(function, arrays, **kwargs)
+		timeout = timeout or self.timeout
+		wrapped = asyncio.wrap_future(future)
+		try:
+			return await asyncio.wait_for(asyncio.shield(wrapped), timeout)
+		except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+			# nobody awaits the job anymore, its outcome (often BrokenProcessPool) is dropped
+			wrapped.add_done_callback(lambda f: f.cancelled() or f.exception())
+			if isinstance(e, asyncio.CancelledError):
+				self.cancel(future)
+				raise
+			self._timed_out(future, timeout)
+
+	def _timed_out(self, future: Future, timeout: float):
+		with self._lock:
+			self._counters["timeouts"] += 1
+		self.cancel(future)
+		raise AnalysisTimeout(f"the analysis did not finish within {timeout}s and was cancelled")
+
+	def shutdown(self):
+		with self._lock:
+			executor, self._executor = self._executor, None
+		if executor is not None:
+			executor.shutdown(wait=False, cancel_futures=True)
+
+	def stats(self) -> Dict[str, Any]:
+		with self._lock:
+			return {
+				"max_workers": self.max_workers,
+				"max_queue": self.max_queue,
+				"timeout": self.timeout,
+				"active": self._active,
+				**self._counters,
+			}
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor() -> AnalysisExecutor:
+	"""The process wide executor, created on first use"""
+	global _executor
+	with _executor_lock:
+		if _executor is None:
+			_executor = AnalysisExecutor()
+		return _executor
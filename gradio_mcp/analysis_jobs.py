@@ -0,0 +1,144 @@
+import os
+import time
+import asyncio
+import secrets
+from typing import Dict, Any, Callable, Awaitable, Optional
+from cachetools import TTLCache
+from metrics import registry, current_tool
+
+JOB_STATES = ("queued", "running", "succeeded", "failed", "cancelled")
+
+
+class JobRejected(RuntimeError):
+	"""Raised when too many jobs are already queued or running"""
+
+
+class Job:
+	def __init__(self, tool: str, args: Dict[str, Any]):
+		self.id = secrets.token_urlsafe(12)
+		self.tool = tool
+		self.args = args
+		self.status = "queued"
+		self.phase = None
+		self.rows_fetched = None
+		self.created_at = time.time()
+		self.started_at = None
+		self.finished_at = None
+		self.result = None
+		self.error = None
+		self.task: Optional[asyncio.Task] = None
+
+	def progress(self, phase: str, rows: Optional[int] = None):
+		"""Progress callback given to the analysis, it may be called from a thread"""
+		self.phase = phase
+		if rows is not None:
+			self.rows_fetched = rows
+
+	@property
+	def done(self) -> bool:
+		return self.status in ("succeeded", "failed", "cancelled")
+
+	def status_dict(self) -> Dict[str, Any]:
+		now = self.finished_at or time.time()
+		return {
+			"job_id": self.id,
+			"tool": self.tool,
+			"status": self.status,
+			"phase": self.phase,
+			"rows_fetched": self.rows_fetched,
+			"queued_seconds": round((self.started_at or now) - self.created_at, 3),
+			"running_seconds": round(now - self.started_at, 3) if self.started_at else None,
+			"error": self.error,
+		}
+
+
+class JobManager:
+	"""
+		Background analyses for the MCP tools: a job is an asyncio task of the server event loop,
+		at most `max_running` of them run at once (the others wait in "queued"), `max_pending` bounds
+		queued + running jobs. Finished jobs are kept `result_ttl` seconds, at most `max_finished` of them.
+		Settings default to the JOBS_* environment variables.
+	"""
+
+	def __init__(self, max_running: Optional[int] = None, max_pending: Optional[int] = None,
+			max_finished: Optional[int] = None, result_ttl: Optional[float] = None):
+		self.max_running = max_running or int(os.getenv('JOBS_MAX_RUNNING', 4))
+		self.max_pending = max_pending or int(os.getenv('JOBS_MAX_PENDING', 32))
+		self.max_finished = max_finished or int(os.getenv('JOBS_MAX_FINISHED', 128))
+		self.result_ttl = result_ttl or float(os.getenv('JOBS_RESULT_TTL', 1800))
+		self._tools: Dict[str, Callable[..., Awaitable[Any]]] = {}
+		self._active: Dict[str, Job] = {}
+		self._finished = TTLCache(maxsize=self.max_finished, ttl=self.result_ttl)
+		self._semaphore = None
+
+	def register(self, tool: str, function: Callable[..., Awaitable[Any]]):
+		"""`function(progress=callback, **args)` is awaited when a job of `tool` runs"""
+		self._tools[tool] = function
+
+	def tools(self):
+		return sorted(self._tools)
+
+	def submit(self, tool: str, args: Dict[str, Any]) -> Job:
+		"""Start a job from the running event loop and return it immediately"""
+		if tool not in self._tools:
+			raise ValueError(f"Unknown analysis '{tool}', available analyses: {self.tools()}")
+		if len(self._active) >= self.max_pending:
+			raise JobRejected(f"{len(self._active)} analyses are already queued or running, retry later")
+		if self._semaphore is None:
+			# created lazily, inside the event loop the jobs run on
+			self._semaphore = asyncio.Semaphore(self.max_running)
+		job = Job(tool, args)
+		self._active[job.id] = job
+		job.task = asyncio.create_task(self._run(job))
+		return job
+
+	async def _run(self, job: Job):
+		# the task runs in its own copy of the context, its phases are labelled with the job tool
+		current_tool.set(f"job:{job.tool}")
+		try:
+			async with self._semaphore:
+				job.status = "running"
+				job.started_at = time.time()
+				result = await self._tools[job.tool](progress=job.progress, **job.args)
+			# the analyses report their errors as strings instead of raising
+			if isinstance(result, str):
+				job.status, job.error = "failed", result
+			else:
+				job.status, job.result = "succeeded", result
+		except asyncio.CancelledError:
+			job.status = "cancelled"
+		except Exception as e:
+			job.status, job.error = "failed", f"{type(e).__name__}: {e}"
+		finally:
+			job.finished_at = time.time()
+			registry.inc("jobs_total", tool=job.tool, status=job.status)
+			if job.started_at:
+				registry.observe("job_duration_seconds", job.finished_at - job.started_at, tool=job.tool)
+			job.phase = "done"
+			job.task = None
+			self._active.pop(job.id, None)
+			self._finished[job.id] = job
+
+	def get(self, job_id: str) -> Optional[Job]:
+		job = self._active.get(job_id)
+		if job is None:
+			job = self._finished.get(job_id)
+		return job
+
+	def cancel(self, job_id: str) -> bool:
+		"""Cancel a queued or running job, its process pool work is cancelled with it"""
+		job = self._active.get(job_id)
+		if job is None or job.task is None:
+			return False
+		job.task.cancel()
+		return True
+
+	def stats(self) -> Dict[str, Any]:
+		self._finished.expire()
+		statuses = [job.status for job in self._active.values()] + [job.status for job in self._finished.values()]
+		return {
+			"max_running": self.max_running,
+			"max_pending": self.max_pending,
+			"result_ttl": self.result_ttl,
+			**{state: statuses.count(state) for state in JOB_STATES},
+		}
@@ -1,17 +1,28 @@
 import gradio as gr
 from database_connector import DatabaseInterface
+from async_database_connector import AsyncDatabaseInterface
 from server_instruct import server_instruct
+from query_guard import budget_for
+from sampling import TableSample
 import var_stats
+from analysis_executor import get_executor
+from analysis_jobs import JobManager, JobRejected
+from metrics import registry, instrument_tool, start_metrics_server, TOOL_SUMMARY_COLUMNS, PHASE_SUMMARY_COLUMNS
+import pandas as pd
+import asyncio
+import os
+import json
 
 # Global state for database connection
+# db_interface (sync) is kept for var_stats, the MCP tools await db_interface_async
+# the CPU bound var_stats work runs in the process pool of analysis_executor
 db_interface = None
+db_interface_async = None
 db_connection_status = "❌ Not Connected"
 
-from database_connector import DatabaseInterface
-
-def setup_database_connection(host: str, port: str, database: str, user: str, password: str):
+async def setup_database_connection(host: str, port: str, database: str, user: str, password: str):
 	"""Setup database connection with user-provided configuration"""
-	global db_interface, db_connection_status
+	global db_interface, db_interface_async, db_connection_status
 	
 	if not all([host.strip(), port.strip(), database.strip(), user.strip(), password.strip()]):
 		db_connection_status = "❌ All fields are required"
@@ -26,13 +37,29 @@ def setup_database_connection(host: str, port: str, database: str, user: str, pa
 			'password': password.strip()
 		}
 		
-		# Test connection
+		# Test connection (the pool opens its first connections on creation)
 		test_interface = DatabaseInterface(db_config)
-		test_connection = test_interface.get_db_connection()
-		test_connection.close()
+		with test_interface.connection():
+			pass
+		# both interfaces share their caches so DDL on one invalidates the other
+		test_interface_async = AsyncDatabaseInterface(
+			db_config,
+			metadata_cache=test_interface.metadata_cache,
+			result_cache=test_interface.result_cache
+		)
+		try:
+			await test_interface_async.open()
+		except Exception:
+			test_interface.close()
+			raise
 		
-		# If successful, set global interface
-		db_interface = test_interface
+		# If successful, set global interfaces and release the previous pools
+		previous_interface, previous_interface_async = db_interface, db_interface_async
+		db_interface, db_interface_async = test_interface, test_interface_async
+		if previous_interface is not None:
+			previous_interface.close()
+		if previous_interface_async is not None:
+			await previous_interface_async.close()
 		db_connection_status = f"✅ Connected to {database} at {host}:{port}"
 		return db_connection_status, True
 		
@@ -43,7 +70,8 @@ def setup_database_connection(host: str, port: str, database: str, user: str, pa
 		db_connection_status = f"❌ Connection failed: {str(e)}"
 		return db_connection_status, False
 
-def handle_connection(host: str, port: int, database, user, password):
+@instrument_tool
+async def handle_connection(host: str, port: int, database, user, password):
 	"""
 		this function allow you to connect to the Database using the provided credentials:
 		the paramters are the following:
@@ -55,38 +83,107 @@ def handle_connection(host: str, port: int, database, user, password):
 			password (str): the password
 	
 	"""
-	status, success = setup_database_connection(host, port, database, user, password)
+	status, success = await setup_database_connection(host, port, database, user, password)
 	return status
 
 def get_connection_status():
 	"""Get current database connection status"""
 	return db_connection_status
 
+def get_pool_stats():
+	"""### `get_pool_stats()`
+	-> connection pool usage: connections in use, idle, checkouts and wait time (seconds)
+	"""
+	connected, status = check_db_connection()
+	if not connected:
+		return status
+	return {
+		"sync_pool": db_interface.pool_stats(),
+		"async_pool": db_interface_async.pool_stats(),
+		"analysis_executor": get_executor().stats(),
+		"jobs": jobs.stats()
+	}
+
+def get_cache_stats():
+	"""### `get_cache_stats()`
+	-> entries, hits, misses and invalidations of the server caches
+	"""
+	connected, status = check_db_connection()
+	if not connected:
+		return status
+	return {**db_interface.cache_stats(), "projections": var_stats.projection_cache.stats()}
+
+def _numeric_gauges(name, stats, **labels):
+	return [(f"{name}_{key}", labels, value) for key, value in stats.items() if isinstance(value, (int, float))]
+
+def runtime_gauges():
+	"""Pool, executor and job statistics exported as gauges on /metrics (pool wait time included)"""
+	gauges = _numeric_gauges("analysis_executor", get_executor().stats()) + _numeric_gauges("jobs", jobs.stats())
+	if db_interface is not None:
+		gauges += _numeric_gauges("pool", db_interface.pool_stats(), pool="sync")
+		gauges += _numeric_gauges("pool", db_interface_async.pool_stats(), pool="async")
+		gauges += _numeric_gauges("projection_cache", var_stats.projection_cache.stats())
+	return gauges
+
+registry.add_collector(runtime_gauges)
+
+def get_performance_stats():
+	"""### `get_performance_stats()`
+	-> latency of each tool since the server started: calls, errors, rows fetched, avg / p95 / max seconds,
+	and the time spent per phase (connect, execute, fetch, decode, compute, serialize)
+	"""
+	return {
+		"tools": [dict(zip(TOOL_SUMMARY_COLUMNS, row)) for row in registry.tool_summary()],
+		"phases": [dict(zip(PHASE_SUMMARY_COLUMNS, row)) for row in registry.phase_summary()]
+	}
+
+def performance_tables():
+	"""Performance tab: per tool and per phase tables and the raw Prometheus metrics"""
+	return (
+		pd.DataFrame(registry.tool_summary(), columns=TOOL_SUMMARY_COLUMNS),
+		pd.DataFrame(registry.phase_summary(), columns=PHASE_SUMMARY_COLUMNS),
+		registry.render()
+	)
+
+def reset_performance_metrics():
+	registry.reset()
+	return performance_tables()
+
 def check_db_connection():
 	"""Check if database is connected before operations"""
 	if db_interface is None:
 		return False, "❌ Please configure database connection first"
 	return True, "✅ Database connected"
 
-def get_db_infos():
+def session_id(request: gr.Request = None) -> str:
+	"""Scratch session of the caller: the MCP session (mcp-session-id header), or the browser session of the UI"""
+	if request is None:
+		return "default"
+	headers = getattr(request, "headers", None) or {}
+	return headers.get("mcp-session-id") or getattr(request, "session_hash", None) or "default"
+
+@instrument_tool
+async def get_db_infos():
 	"""### `get_db_infos()`
 	-> database name and description
 	"""
 	connected, status = check_db_connection()
 	if not connected:
 		return status
-	return db_interface.list_database_info()
+	return await db_interface_async.list_database_info()
 
-def get_schemas():
+@instrument_tool
+async def get_schemas():
 	"""### `get_schemas()`
 	-> list availables schemas in the database
 	"""
 	connected, status = check_db_connection()
 	if not connected:
 		return status
-	return db_interface.list_schemas()
+	return await db_interface_async.list_schemas()
 
-def get_list_of_tables_in_schema(schema:str):
+@instrument_tool
+async def get_list_of_tables_in_schema(schema:str):
 	"""### `get_list_of_tables_in_schema(schema_name: str)`
 	Args:
 		schema (str): the schema you want to discover tables for.
@@ -94,18 +191,20 @@ def get_list_of_tables_in_schema(schema:str):
 	connected, status = check_db_connection()
 	if not connected:
 		return status
-	return db_interface.list_tables_in_schema(schema)
+	return await db_interface_async.list_tables_in_schema(schema)
 
-def get_availables_extensions():
+@instrument_tool
+async def get_availables_extensions():
 	"""
 	### `get_availables_extensions()`
 	"""
 	connected, status = check_db_connection()
 	if not connected:
 		return status
-	return db_interface.list_extensions()
+	return await db_interface_async.list_extensions()
 
-def get_list_of_column_in_table(schema, table):
+@instrument_tool
+async def get_list_of_column_in_table(schema, table):
 	"""### `get_list_of_column_in_table(schema_name: str, table_name: str)`
 		Args:
 			schema (str): the schema you want to discover tables for.
@@ -114,37 +213,190 @@ def get_list_of_column_in_table(schema, table):
 	connected, status = check_db_connection()
 	if not connected:
 		return status
-	return db_interface.list_columns_in_table(schema, table)
+	return await db_interface_async.list_columns_in_table(schema, table)
 
-def run_read_only_query(query: str):
-	"""### `run_read_only_query(query: str)`
+@instrument_tool
+async def run_read_only_query(query: str, use_cache: bool = False, sample: str = "", sample_method: str = "system",
+		sample_seed: str = "", request: gr.Request = None):
+	"""### `run_read_only_query(query: str, use_cache: bool = False, sample: str = "", sample_method: str = "system", sample_seed: str = "")`
 		Args:
 			query (str): read-only query that will be executed
+			use_cache (bool): default = False, serve the result from the query cache when the same query ran recently
+			sample (str): default = "" (exact), approximate the result on a sample of the largest table the query scans
+				(transactions or customers), joined tables and subqueries are read entirely:
+				a rate ("0.01" or "1%") or a number of rows to read from it ("50000"). Sub-second on the largest tables,
+				use it to explore and iterate, then run the exact query before concluding
+			sample_method (str): "system" (default, samples whole pages: fastest) or "bernoulli" (samples rows: more accurate)
+			sample_seed (str): default = "" (random), give back the returned seed to read the same sample again
 		You will get the raw result following this pattern
 		[(row_1_col_a, ..., row_1_col_b), (row_2_col_a, ..., row_2_col_b), ...]
+		With use_cache the result is wrapped with its cache status and age:
+		{"rows": [...], "from_cache": True, "age_seconds": 12.3}
+		Results longer than the row budget are cut: {"rows": [...], "truncated": True, "max_rows": 10000, "hint": "..."}
+		Queries exceeding the execution budget return a structured error you should act on:
+		{"error": "query_rejected" | "statement_timeout", "reason": "...", "hints": ["add a LIMIT", ...]}
+		With a sample the result is wrapped with the sample rate, seed and scale factor of the sampled table and confidence bounds:
+		{"rows": [...], "sample": {"method": "system", "seed": 42, "tables": {"transactions": {"rate": 0.01, "scale_factor": 100.0, ...}},
+		 "unsampled_tables": ["customers"], "exact": False, "warnings": []},
+		 "confidence": {"level": 0.95, "table_count_relative_error": {...}, "hint": "how to scale and bound your aggregates"}}
 		Or the sql error message if the query you wrote is not valid 
 	"""
 	connected, status = check_db_connection()
 	if not connected:
 		return status
-	return db_interface.read_only_query(query)
+	try:
+		table_sample = TableSample.parse(sample, sample_method, sample_seed)
+	except ValueError as e:
+		return f"❌ {str(e)}"
+	# reading scratch tables keeps the session alive
+	db_interface_async.scratch_sessions.touch(session_id(request))
+	# when not asked for, the server default (QUERY_CACHE_ENABLED) applies
+	return await db_interface_async.read_only_query(
+		query,
+		use_cache=use_cache or None,
+		budget=budget_for("read_only_query"),
+		sample=table_sample
+	)
+
+@instrument_tool
+async def run_read_only_queries(queries: str, parallel: bool = False):
+	"""### `run_read_only_queries(queries: str, parallel: bool = False)`
+		Run several small read-only queries in one call (counts, distincts, samples of several tables...),
+		cheaper than calling run_read_only_query for each of them.
+		Args:
+			queries (str): JSON array of SQL queries, e.g. ["SELECT count(*) FROM customers", "SELECT count(*) FROM articles"]
+			parallel (bool): default = False, all the queries see the same snapshot of the database.
+				With True each query runs on its own connection: faster for several slow queries, without a shared snapshot
+		You will get a dict following this pattern, results are keyed by the index of their query:
+		{"mode": "pipeline", "snapshot": "repeatable_read", "elapsed_ms": 12.5, "errors": 0,
+		 "results": {0: {"rows": [...], "row_count": 1, "elapsed_ms": 3.1}, 1: {"error": "query_failed", "reason": "..."}}}
+		A failing query does not prevent the others from running.
+	"""
+	connected, status = check_db_connection()
+	if not connected:
+		return status
+	return await db_interface_async.read_only_queries(queries, budget=budget_for("read_only_queries"), parallel=parallel)
+
+@instrument_tool
+async def run_read_only_query_stream(query: str, continuation_token: str = ""):
+	"""### `run_read_only_query_stream(query: str, continuation_token: str = "")`
+		Use it instead of `run_read_only_query` when the result may be large: rows are returned page by page.
+		Args:
+			query (str): read-only query that will be executed (ignored when continuation_token is given)
+			continuation_token (str): token returned by the previous call to get the next page, empty for the first page
+		Each page is capped in rows and bytes. You will get a dict following this pattern
+		{"columns": [...], "rows": [(...), ...], "page": 1, "rows_sent": 500, "truncated_by": "rows", "continuation_token": "..."}
+		continuation_token is None once the last page has been returned.
+		Or the sql error message if the query you wrote is not valid
+	"""
+	connected, status = check_db_connection()
+	if not connected:
+		return status
+	if continuation_token.strip():
+		return await db_interface_async.read_only_query_page(continuation_token=continuation_token.strip())
+	return await db_interface_async.read_only_query_page(query, budget=budget_for("read_only_query_stream"))
+
+@instrument_tool
+async def run_read_only_query_encoded(query: str, output_format: str = "columnar_json"):
+	"""### `run_read_only_query_encoded(query: str, output_format: str = "columnar_json")`
+		Column oriented version of run_read_only_query, more compact for wide or large results.
+		Args:
+			query (str): read-only query that will be executed
+			output_format (str): "columnar_json" (default), "arrow" (Arrow IPC stream) or "parquet"
+		columnar_json returns {"columns": [{"name": ..., "type": ...}], "row_count": n, "data": [[column 0 values], [column 1 values], ...]}
+		arrow and parquet return {"format": ..., "encoding": "base64", "row_count": n, "columns": [...], "data": "<base64>"}
+		NUMERIC columns are floats and dates ISO strings in columnar_json, they keep their types in arrow / parquet.
+	"""
+	connected, status = check_db_connection()
+	if not connected:
+		return status
+	return await db_interface_async.read_only_query_encoded(
+		query,
+		output_format=output_format.strip() or "columnar_json",
+		budget=budget_for("read_only_query_encoded")
+	)
 
-def create_table_from_query(table_name: str, source_query: str):
+@instrument_tool
+async def close_query_stream(continuation_token: str):
+	"""### `close_query_stream(continuation_token: str)`
+		Release a query stream you will not read until the end.
+		Args:
+			continuation_token (str): the token returned by run_read_only_query_stream
+	"""
+	connected, status = check_db_connection()
+	if not connected:
+		return status
+	return await db_interface_async.close_stream(continuation_token.strip())
+
+@instrument_tool
+async def create_table_from_query(table_name: str, source_query: str, request: gr.Request = None):
 	"""### `create_table_from_query(table_name: str, source_query: str)`
 	this function is a tool for you to create intermediary table based on query on the database.
 	this allow you to deepen your analysis for intricated request from the user.
+	The table is created in your own scratch schema: use the schema qualified name it returns (mcp_scratch_xxx.table_name)
+	in your next queries. Scratch tables are dropped automatically after a while or when your session ends,
+	use materialize_table for tables that must be kept.
 
 	Args:
-		table_name (str): the name of the table you want to create (must not overlap with existing tables)
+		table_name (str): the name of the table you want to create, without schema
 		source_query (str): the SQL query that will be used to create the new table on like this: CREATE TABLE {table_name} AS {source_query}"
 
 	"""
 	connected, status = check_db_connection()
 	if not connected:
 		return status
-	return db_interface.create_table_from_query(table_name, source_query)
+	return await db_interface_async.create_table_from_query(
+		table_name,
+		source_query,
+		budget=budget_for("create_table_from_query"),
+		session_id=session_id(request)
+	)
+
+@instrument_tool
+async def materialize_table(table_name: str, source_query: str = "", index_columns: str = "", force_rebuild: bool = False):
+	"""### `materialize_table(table_name: str, source_query: str = "", index_columns: str = "", force_rebuild: bool = False)`
+		Managed version of create_table_from_query for analysis tables you will query several times or refresh later.
+		The source query is recorded, the table is indexed on index_columns and refreshed instead of rebuilt when called again:
+		when source_query reads transactions row by row (no GROUP BY, DISTINCT, aggregate or LIMIT), only the rows of the
+		transactions newer than the last refresh (transaction_date) are appended.
+		Args:
+			table_name (str): the name of the managed table
+			source_query (str): the SELECT query the table is built from, empty to refresh an existing managed table
+			index_columns (str): comma separated columns to index, e.g. "customer_id, article_id"
+			force_rebuild (bool): default = False, rebuild the table from scratch instead of refreshing it
+		You will get a dict following this pattern
+		{"table_name": ..., "action": "created" | "rebuilt" | "incremental" | "up_to_date", "rows": 1200, "rows_added": 30,
+		 "watermark": "2020-09-22", "incremental": true, "incremental_reason": null, "elapsed_ms": 850.2}
+		The table is UNLOGGED: it is fast to build but emptied if the database crashes, the next refresh rebuilds it.
+	"""
+	connected, status = check_db_connection()
+	if not connected:
+		return status
+	return await db_interface_async.materialize_table(
+		table_name,
+		source_query,
+		index_columns,
+		unlogged=os.getenv('MATERIALIZE_UNLOGGED', 'true').lower() in ('1', 'true', 'yes'),
+		budget=budget_for("materialize_table"),
+		force_rebuild=force_rebuild
+	)
+
+@instrument_tool
+async def list_materialized_tables():
+	"""### `list_materialized_tables()`
+		The managed tables created with materialize_table: source query, indexed columns, row count,
+		transaction_date watermark and last refresh, to reuse them instead of building a new table.
+	"""
+	connected, status = check_db_connection()
+	if not connected:
+		return status
+	try:
+		return await db_interface_async.list_materializations()
+	except Exception as e:
+		return f"❌ Error listing materialized tables: {str(e)}"
 
-def drop_table(table_name: str):
+@instrument_tool
+async def drop_table(table_name: str, request: gr.Request = None):
 	"""### `drop_table(table_name: str)`
 		this function is to drop intermediary tables when user ask you to do or if you created a temporary table only to support further analysis 
 		and the analysis is done
@@ -154,14 +406,51 @@ def drop_table(table_name: str):
 	connected, status = check_db_connection()
 	if not connected:
 		return status
-	return db_interface.drop_table(table_name)
+	return await db_interface_async.drop_table(table_name, session_id=session_id(request))
+
+@instrument_tool
+async def list_scratch_tables(request: gr.Request = None):
+	"""### `list_scratch_tables()`
+		The tables you created with create_table_from_query in your scratch schema, with their size and expiry,
+		and the space left in your scratch quota.
+		You will get a dict following this pattern
+		{"schema": "mcp_scratch_xxx", "tables": [{"table_name": ..., "row_count": ..., "bytes": ..., "expires_at": ...}],
+		 "bytes_used": 81920, "max_bytes": 1073741824, "table_ttl": 86400.0, "session_ttl": 7200.0}
+	"""
+	connected, status = check_db_connection()
+	if not connected:
+		return status
+	try:
+		return await db_interface_async.list_scratch_tables(session_id(request))
+	except Exception as e:
+		return f"❌ Error listing scratch tables: {str(e)}"
+
+@instrument_tool
+async def end_scratch_session(request: gr.Request = None):
+	"""### `end_scratch_session()`
+		Drop your scratch schema and every table you created with create_table_from_query, once your analysis is over.
+	"""
+	connected, status = check_db_connection()
+	if not connected:
+		return status
+	return await db_interface_async.end_scratch_session(session_id(request))
 
-def do_annova(table_name, min_sample_size=0):
+async def end_ui_session(request: gr.Request):
+	"""UI only: the scratch tables of a browser session are dropped when its tab is closed"""
+	if db_interface_async is not None:
+		await db_interface_async.end_scratch_session(session_id(request))
+
+@instrument_tool
+async def do_annova(table_name, min_sample_size=0, sample="", sample_method="system", sample_seed=""):
 	'''
 		this function runs the annova on the dataset and render the associated F_score and p_value
 		Args:
 			table_name (str): the name of the table on which you want to run the ANOVA
 			min_sample_size (int): default = 0, is used to exclude categories that does not have enough measurement.
+			sample (str): default = "" (all rows), run the test on a TABLESAMPLE of the table: a rate ("0.05", "5%")
+				or a number of rows ("100000"), min_sample_size then applies to the sampled rows
+			sample_method (str): "system" (default, fastest) or "bernoulli" (more accurate)
+			sample_seed (str): default = "" (random), give back the returned seed to test the same sample again
 		the selected table MUST have the following signature:
 
 		groups | measurement
@@ -183,10 +472,16 @@ def do_annova(table_name, min_sample_size=0):
 			"F-statistic": round(f_stat, 3),
 			"p-value": round(p_value, 3)
 		}
+		with a sample, the dict also has "sample" (rate, seed, sampled_rows) and "confidence" (95% bounds of each group mean)
 	'''
-	return var_stats.anova(db_interface, table_name=table_name, min_sample_size=int(min_sample_size))
+	try:
+		table_sample = TableSample.parse(sample, sample_method, sample_seed)
+	except ValueError as e:
+		return f"❌ {str(e)}"
+	return await var_stats.anova_async(db_interface, table_name=table_name, min_sample_size=int(min_sample_size), sample=table_sample)
 
-def do_tukey_test(table_name, min_sample_size=0):
+@instrument_tool
+async def do_tukey_test(table_name, min_sample_size=0, sample="", sample_method="system", sample_seed=""):
 	'''
 		this function runs a Tukey's HSD (Honestly Significant Difference) test — a post-hoc analysis following ANOVA. 
 		It tells you which specific pairs of groups differ significantly in their means
@@ -211,17 +506,40 @@ def do_tukey_test(table_name, min_sample_size=0):
 		the return result is the raw dataframe that correspond to the pair wize categorie that reject the hypothesis of non statistically difference between two group
 		the signature of the dataframe is the following:
 		group1 | group2 | meandiff p-adj | lower | upper | reject (only true)
-	
+
+		sample (str): default = "" (all rows), run the test on a TABLESAMPLE of the table: a rate ("0.05", "5%")
+			or a number of rows ("100000"), min_sample_size then applies to the sampled rows
+		sample_method (str): "system" (default, fastest) or "bernoulli" (more accurate)
+		sample_seed (str): default = "" (random), give back the returned seed to test the same sample again
+		with a sample, the result is {"pairs": [rows of the dataframe], "sample": {...}, "confidence": {...}}
 	'''
-	return var_stats.tukey_test(db_interface, table_name=table_name, min_sample_size=int(min_sample_size))
+	try:
+		table_sample = TableSample.parse(sample, sample_method, sample_seed)
+	except ValueError as e:
+		return f"❌ {str(e)}"
+	return await var_stats.tukey_test_async(
+		db_interface,
+		table_name=table_name,
+		executor=get_executor(),
+		min_sample_size=int(min_sample_size),
+		sample=table_sample
+	)
 
-def do_tsne_embedding(query):
+@instrument_tool
+async def do_tsne_embedding(query, projection_method="auto"):
 	"""
 
 		this tool allow to run a TSNE dimensionality reduction algorythme and a clustering (HDBSCAN) on top of that.
 
 		the input query, is a sql query that MUST return a table with at least the item id and the corresponding embeddding.
-		FOR COMPUTATIONAL PURPOSE, THE QUERY YOU SEND MUST NOT RETURN A TABLE GREATER THAN 500 OUTPUT ROWS
+		Up to 500 rows an exact TSNE is run. Above, the embeddings are reduced with PCA and projected with a multi-threaded
+		Barnes-Hut TSNE; above 10000 rows TSNE runs on a random sample and the other rows are placed from their nearest
+		sampled neighbours, so tens of thousands of rows are fine.
+		Calls returning the same rows reuse the cached projection and clusters, pass the returned
+		"fingerprint" to do_embedding_assign to place new items in the same projection.
+		Args:
+			query (str): the sql query returning id | embedding
+			projection_method (str): "auto" (default), "exact" or "fast"
 		exemple:
 		result = db_connection.read_only_query(query)
 		result shape:
@@ -234,13 +552,36 @@ def do_tsne_embedding(query):
 				"ids": ids,
 				"x_axis": tsne_projection_x_list,
 				"y_axis": tsne_projection_y_list,
-				"labels": labels
+				"labels": labels,
+				"projection": {"method", "input_rows", "sample_size", "timings"}
 			}
 	"""
 
-	return var_stats.embedding_clustering(db_interface, query)
+	return await var_stats.embedding_clustering_async(db_interface, query, executor=get_executor(), projection_method=projection_method)
+
+@instrument_tool
+def do_embedding_assign(fingerprint, query):
+	"""
+		this tool places new items in a projection computed by do_tsne_embedding and predicts their cluster,
+		it answers in milliseconds because TSNE and HDBSCAN are not run again.
+		Args:
+			fingerprint (str): the "fingerprint" of the "projection" entry returned by do_tsne_embedding
+			query (str): a sql query that MUST return id | embedding for the new items (same embedding column as the projection)
+
+		the return is a dictionnary that has the following format:
+
+			return {
+				"ids": ids,
+				"x_axis": projected x of the new items,
+				"y_axis": projected y of the new items,
+				"labels": predicted cluster (-1: noise),
+				"probabilities": strength of the cluster membership
+			}
+	"""
+	return var_stats.embedding_assign(db_interface, fingerprint, query)
 
-def do_vector_centroid(query):
+@instrument_tool
+def do_vector_centroid(query, grouped=False, method="auto"):
 	"""
 		this tool allow you to compute the centroid of a list of embedding vectors
 		the input query, is a sql query that MUST return a table with only 1 column, the embeddings.
@@ -251,8 +592,92 @@ def do_vector_centroid(query):
 		 [0.3, 0.5 ...]
 
 		the return value is the computed centroid vector, that you can use to work with.
+
+		Args:
+			query (str): the sql query returning the embeddings
+			grouped (bool): default = False, when True the query MUST return 2 columns, group | embedding,
+				and one centroid per group is returned: {"method": ..., "groups": [{"group", "count", "centroid"}]}
+			method (str): "auto" (default) computes the centroids inside Postgres with avg(vector) when possible,
+				"sql" forces it, "client" streams the embeddings and averages them on the server
+	"""
+	return var_stats.vector_centroid(db_interface, query, grouped=grouped, method=method)
+
+# Background analyses: start_analysis returns a job id right away, the client polls the job
+jobs = JobManager()
+jobs.register("annova", lambda progress, table_name, min_sample_size=0, sample="", sample_method="system", sample_seed="": var_stats.anova_async(
+	db_interface, table_name=table_name, min_sample_size=int(min_sample_size), progress=progress,
+	sample=TableSample.parse(sample, sample_method, sample_seed)))
+jobs.register("tukey_test", lambda progress, table_name, min_sample_size=0, sample="", sample_method="system", sample_seed="": var_stats.tukey_test_async(
+	db_interface, table_name=table_name, executor=get_executor(), min_sample_size=int(min_sample_size), progress=progress,
+	sample=TableSample.parse(sample, sample_method, sample_seed)))
+jobs.register("tsne_embedding", lambda progress, query, projection_method="auto": var_stats.embedding_clustering_async(
+	db_interface, query, executor=get_executor(), projection_method=projection_method, progress=progress))
+jobs.register("embedding_assign", lambda progress, fingerprint, query: asyncio.to_thread(
+	var_stats.embedding_assign, db_interface, fingerprint, query))
+jobs.register("vector_centroid", lambda progress, query, grouped=False, method="auto": asyncio.to_thread(
+	var_stats.vector_centroid, db_interface, query, grouped=grouped, method=method))
+
+@instrument_tool
+async def start_analysis(tool, args="{}"):
+	"""
+		this tool starts a long running analysis in the background and returns its job id immediately,
+		use it instead of the do_* tools when the table or the query is large, and to run several analyses at once.
+		Args:
+			tool (str): "annova", "tukey_test", "tsne_embedding", "embedding_assign" or "vector_centroid"
+			args (str): JSON object with the arguments of the matching do_* tool, e.g.
+				{"table_name": "product_type_age", "min_sample_size": 30} or {"query": "SELECT article_id, embedding FROM ..."}
+		the return is the job status: {"job_id", "tool", "status", "phase", "rows_fetched", ...}
+		then poll get_job_status(job_id) and read get_job_result(job_id) once the status is "succeeded"
 	"""
-	return var_stats.vector_centroid(db_interface, query)
+	connected, status = check_db_connection()
+	if not connected:
+		return status
+	try:
+		arguments = json.loads(args) if args and args.strip() else {}
+		if not isinstance(arguments, dict):
+			return "❌ args must be a JSON object"
+		return jobs.submit(tool, arguments).status_dict()
+	except (ValueError, JobRejected) as e:
+		return f"❌ {str(e)}"
+
+@instrument_tool
+def get_job_status(job_id):
+	"""
+		status of a job started with start_analysis: queued, running, succeeded, failed or cancelled,
+		with the current phase (fetch, compute) and the number of rows fetched so far
+		Args:
+			job_id (str): the job id returned by start_analysis
+	"""
+	job = jobs.get(job_id.strip())
+	if job is None:
+		return "❌ Unknown or expired job id"
+	return job.status_dict()
+
+@instrument_tool
+def get_job_result(job_id):
+	"""
+		result of a finished job, in the same format as the matching do_* tool.
+		results are kept for a limited time (30 minutes by default), the job status is returned while it is not finished
+		Args:
+			job_id (str): the job id returned by start_analysis
+	"""
+	job = jobs.get(job_id.strip())
+	if job is None:
+		return "❌ Unknown or expired job id"
+	if job.status != "succeeded":
+		return job.status_dict()
+	return job.result
+
+@instrument_tool
+def cancel_job(job_id):
+	"""
+		cancel a queued or running job, its computation is stopped
+		Args:
+			job_id (str): the job id returned by start_analysis
+	"""
+	if not jobs.cancel(job_id.strip()):
+		return "❌ Unknown, expired or already finished job id"
+	return "✅ Job cancelled"
 
 def get_mcp_server_instructions():
 	"""
@@ -286,6 +711,10 @@ with gr.Blocks(title="Database Configuration") as tab1:
 			
 		with gr.Column(scale=1):
 			connection_status = gr.Textbox(label="🔌 Connection Status", value=db_connection_status, interactive=False)
+			pool_stats_btn = gr.Button("📊 Connection Pool Stats", variant="secondary")
+			pool_stats_output = gr.Textbox(label="📊 Connection Pool", lines=5)
+			cache_stats_btn = gr.Button("🗃️ Cache Stats", variant="secondary")
+			cache_stats_output = gr.Textbox(label="🗃️ Caches", lines=5)
 			gr.Markdown("### ℹ️ Instructions")
 			gr.Markdown("""
 			1. **Fill in your database credentials**
@@ -301,6 +730,8 @@ with gr.Blocks(title="Database Configuration") as tab1:
 		inputs=[host_input, port_input, database_input, user_input, password_input],
 		outputs=connection_status
 	)
+	pool_stats_btn.click(get_pool_stats, outputs=pool_stats_output)
+	cache_stats_btn.click(get_cache_stats, outputs=cache_stats_output)
 
 # TAB 2: Database Operations
 with gr.Blocks(title="Database Operations") as tab2:
@@ -341,11 +772,47 @@ with gr.Blocks(title="Database Operations") as tab2:
 		with gr.Column(scale=1):
 			gr.Markdown("### 🔍 SQL Query")
 			query_input = gr.Textbox(label="SQL Query", lines=3, placeholder="SELECT * FROM customers LIMIT 10")
+			query_cache_input = gr.Checkbox(label="Use query cache", value=False)
+			with gr.Row():
+				query_sample_input = gr.Textbox(label="Sample", placeholder="empty: exact, 1% or 50000 rows")
+				query_sample_method_input = gr.Dropdown(["system", "bernoulli"], value="system", label="Sample method")
+				query_sample_seed_input = gr.Textbox(label="Sample seed", placeholder="random")
 			query_btn = gr.Button("Execute Query", variant="primary")
 
 		with gr.Column(scale=2):
 			query_output = gr.Textbox(label="🔍 Query Results", lines=8)
 
+	with gr.Row():
+		with gr.Column(scale=1):
+			gr.Markdown("### 📚 Batch of SQL Queries")
+			batch_queries_input = gr.Textbox(label="SQL Queries (JSON array)", lines=3, placeholder='["SELECT count(*) FROM customers", "SELECT count(*) FROM articles"]')
+			batch_parallel_input = gr.Checkbox(label="Run in parallel (no shared snapshot)", value=False)
+			batch_query_btn = gr.Button("Execute Queries", variant="primary")
+
+		with gr.Column(scale=2):
+			batch_query_output = gr.Textbox(label="📚 Batch Results", lines=8)
+
+	with gr.Row():
+		with gr.Column(scale=1):
+			gr.Markdown("### 🧱 Columnar SQL Query")
+			encoded_query_input = gr.Textbox(label="SQL Query", lines=3, placeholder="SELECT * FROM transactions LIMIT 1000")
+			encoded_format_input = gr.Dropdown(label="Output Format", choices=["columnar_json", "arrow", "parquet"], value="columnar_json")
+			encoded_query_btn = gr.Button("Execute Query", variant="primary")
+
+		with gr.Column(scale=2):
+			encoded_query_output = gr.Textbox(label="🧱 Encoded Results", lines=8)
+
+	with gr.Row():
+		with gr.Column(scale=1):
+			gr.Markdown("### 📜 Paginated SQL Query")
+			stream_query_input = gr.Textbox(label="SQL Query", lines=3, placeholder="SELECT * FROM transactions")
+			stream_token_input = gr.Textbox(label="Continuation Token", placeholder="empty for the first page")
+			stream_query_btn = gr.Button("Get Page", variant="primary")
+			close_stream_btn = gr.Button("Close Stream", variant="secondary")
+
+		with gr.Column(scale=2):
+			stream_query_output = gr.Textbox(label="📜 Query Page", lines=8)
+
 	with gr.Row():
 		with gr.Column(scale=1):
 			gr.Markdown("### 🔍 Create Table")
@@ -356,11 +823,26 @@ with gr.Blocks(title="Database Operations") as tab2:
 		with gr.Column(scale=2):
 			table_status = gr.Textbox(label="table status")
 
+	with gr.Row():
+		with gr.Column(scale=1):
+			gr.Markdown("### 🧱 Materialize Table")
+			materialize_name_input = gr.Textbox(label="Table Name", placeholder="customer_purchases")
+			materialize_query_input = gr.Textbox(label="Source Query", lines=3, placeholder="empty to refresh an existing managed table")
+			materialize_index_input = gr.Textbox(label="Index Columns", placeholder="customer_id, article_id")
+			materialize_rebuild_input = gr.Checkbox(label="Force rebuild", value=False)
+			materialize_btn = gr.Button("Materialize / Refresh", variant="primary")
+			list_materialized_btn = gr.Button("List Materialized Tables", variant="secondary")
+
+		with gr.Column(scale=2):
+			materialize_output = gr.Textbox(label="materialization status", lines=8)
+
 	with gr.Row():
 		with gr.Column(scale=1):
 			gr.Markdown("### 🔍 Drop Table")
 			drop_table_name_input = gr.Textbox(label="Table Name", placeholder="table")
 			drop_table_btn = gr.Button("Drop Table", variant="primary")
+			list_scratch_btn = gr.Button("List Scratch Tables", variant="secondary")
+			end_scratch_btn = gr.Button("Drop Scratch Schema", variant="secondary")
 			
 		with gr.Column(scale=2):
 			drop_table_status = gr.Textbox(label="drop table status")
@@ -371,9 +853,25 @@ with gr.Blocks(title="Database Operations") as tab2:
 	get_extension_btn.click(get_availables_extensions, outputs=db_extensions)
 	table_in_schema_btn.click(get_list_of_tables_in_schema, inputs=table_in_schema_input, outputs=table_in_schema)
 	column_btn.click(get_list_of_column_in_table, inputs=[schema_input, table_input], outputs=column_output)
-	query_btn.click(run_read_only_query, inputs=query_input, outputs=query_output)
+	query_btn.click(
+		run_read_only_query,
+		inputs=[query_input, query_cache_input, query_sample_input, query_sample_method_input, query_sample_seed_input],
+		outputs=query_output
+	)
+	batch_query_btn.click(run_read_only_queries, inputs=[batch_queries_input, batch_parallel_input], outputs=batch_query_output)
+	encoded_query_btn.click(run_read_only_query_encoded, inputs=[encoded_query_input, encoded_format_input], outputs=encoded_query_output)
+	stream_query_btn.click(run_read_only_query_stream, inputs=[stream_query_input, stream_token_input], outputs=stream_query_output)
+	close_stream_btn.click(close_query_stream, inputs=stream_token_input, outputs=stream_query_output)
 	create_table_from_query_btn.click(create_table_from_query, inputs=[table_name_input, source_query_input], outputs=table_status)
+	materialize_btn.click(
+		materialize_table,
+		inputs=[materialize_name_input, materialize_query_input, materialize_index_input, materialize_rebuild_input],
+		outputs=materialize_output
+	)
+	list_materialized_btn.click(list_materialized_tables, outputs=materialize_output)
 	drop_table_btn.click(drop_table, inputs=drop_table_name_input, outputs=drop_table_status)
+	list_scratch_btn.click(list_scratch_tables, outputs=drop_table_status)
+	end_scratch_btn.click(end_scratch_session, outputs=drop_table_status)
 
 # TAB 3: Some more "fancy", Statistics
 with gr.Blocks(title="Statistical Analysis") as tab3:
@@ -385,19 +883,29 @@ with gr.Blocks(title="Statistical Analysis") as tab3:
 			gr.Markdown("### enter a dict that comply with the annova function")
 			annova_input = gr.Textbox(label="annova")
 			annova_min_sample_input = gr.Textbox(label="min sample size for annova")
+			annova_sample_input = gr.Textbox(label="sample for annova", placeholder="empty: all rows, 5% or 100000 rows")
 			annova_btn = gr.Button("run annova")
 
 			gr.Markdown("### enter a table that comply for tukey function")
 			tukey_input = gr.Textbox(label="tukey")
 			tukey_min_sample_input = gr.Textbox(label="min sample size for tukey")
+			tukey_sample_input = gr.Textbox(label="sample for tukey", placeholder="empty: all rows, 5% or 100000 rows")
 			tukey_btn = gr.Button("run tukey")
 
 			gr.Markdown("### Enter a query that comply with the requested embedding format")
 			tsne_cluster_input = gr.Textbox(label="embedding_table")
+			tsne_method_input = gr.Dropdown(label="Projection method", choices=["auto", "exact", "fast"], value="auto")
 			tsne_cluster_btn = gr.Button("run TSNE")
 
+			gr.Markdown("### Place new embeddings in a computed projection")
+			assign_fingerprint_input = gr.Textbox(label="projection fingerprint")
+			assign_query_input = gr.Textbox(label="new_embeddings_query")
+			assign_btn = gr.Button("assign to clusters")
+
 			gr.Markdown("### Enter a query that comply with the requested embedding centroid format")
 			vector_centroid_input = gr.Textbox(label="embedding_table_for_vector")
+			vector_centroid_grouped_input = gr.Checkbox(label="One centroid per group (group | embedding)", value=False)
+			vector_centroid_method_input = gr.Dropdown(label="Method", choices=["auto", "sql", "client"], value="auto")
 			vector_centroid_btn = gr.Button("Compute centroid")
 
 
@@ -405,13 +913,52 @@ with gr.Blocks(title="Statistical Analysis") as tab3:
 			annova_output = gr.Textbox(label="annova output")
 			tukey_output = gr.Textbox(label="tukey output")
 			tsne_output = gr.Textbox(label="tsne_clustering output")
+			assign_output = gr.Textbox(label="cluster assignment output")
 			vector_centroid_output = gr.Textbox(label="Centroid")
 	
 	# Database operations
-	annova_btn.click(do_annova, inputs=[annova_input, annova_min_sample_input], outputs=annova_output)
-	tukey_btn.click(do_tukey_test, inputs=[tukey_input, tukey_min_sample_input], outputs=tukey_output)
-	tsne_cluster_btn.click(do_tsne_embedding, inputs=tsne_cluster_input, outputs=tsne_output)
-	vector_centroid_btn.click(do_vector_centroid, inputs=vector_centroid_input, outputs=vector_centroid_output)
+	annova_btn.click(do_annova, inputs=[annova_input, annova_min_sample_input, annova_sample_input], outputs=annova_output)
+	tukey_btn.click(do_tukey_test, inputs=[tukey_input, tukey_min_sample_input, tukey_sample_input], outputs=tukey_output)
+	tsne_cluster_btn.click(do_tsne_embedding, inputs=[tsne_cluster_input, tsne_method_input], outputs=tsne_output)
+	assign_btn.click(do_embedding_assign, inputs=[assign_fingerprint_input, assign_query_input], outputs=assign_output)
+	vector_centroid_btn.click(do_vector_centroid, inputs=[vector_centroid_input, vector_centroid_grouped_input, vector_centroid_method_input], outputs=vector_centroid_output)
+
+	with gr.Row():
+		with gr.Column(scale=1):
+			gr.Markdown("### ⏳ Background analyses")
+			job_tool_input = gr.Dropdown(label="Analysis", choices=jobs.tools(), value="tsne_embedding")
+			job_args_input = gr.Textbox(label="Arguments (JSON)", lines=3, placeholder='{"query": "SELECT article_id, embedding FROM ..."}')
+			job_id_input = gr.Textbox(label="Job id")
+			with gr.Row():
+				start_job_btn = gr.Button("Start", variant="primary")
+				job_status_btn = gr.Button("Status")
+				job_result_btn = gr.Button("Result")
+				cancel_job_btn = gr.Button("Cancel", variant="secondary")
+
+		with gr.Column(scale=2):
+			job_output = gr.Textbox(label="⏳ Job", lines=8)
+
+	start_job_btn.click(start_analysis, inputs=[job_tool_input, job_args_input], outputs=job_output)
+	job_status_btn.click(get_job_status, inputs=job_id_input, outputs=job_output)
+	job_result_btn.click(get_job_result, inputs=job_id_input, outputs=job_output)
+	cancel_job_btn.click(cancel_job, inputs=job_id_input, outputs=job_output)
+
+with gr.Blocks(title="Performance") as tab5:
+	gr.Markdown("# 📈 Performance")
+	gr.Markdown("*Latency per tool and per phase since the server started, also scraped by Prometheus on `/metrics` (METRICS_PORT)*")
+	with gr.Row():
+		performance_btn = gr.Button("🔄 Refresh", variant="primary")
+		performance_reset_btn = gr.Button("Reset", variant="secondary")
+	tool_metrics_output = gr.Dataframe(label="Tools (slowest first)", headers=list(TOOL_SUMMARY_COLUMNS), interactive=False)
+	phase_metrics_output = gr.Dataframe(label="Phases", headers=list(PHASE_SUMMARY_COLUMNS), interactive=False)
+	raw_metrics_output = gr.Textbox(label="Prometheus metrics", lines=15)
+
+	# UI only, agents use get_performance_stats
+	performance_btn.click(performance_tables, outputs=[tool_metrics_output, phase_metrics_output, raw_metrics_output], show_api=False)
+	performance_reset_btn.click(reset_performance_metrics, outputs=[tool_metrics_output, phase_metrics_output, raw_metrics_output], show_api=False)
+	performance_stats_btn = gr.Button("📊 Performance stats (JSON)", variant="secondary")
+	performance_stats_output = gr.Textbox(label="📊 Performance stats", lines=8)
+	performance_stats_btn.click(get_performance_stats, outputs=performance_stats_output)
 
 with gr.Blocks(title="MCP guidelines") as tab4:
 	gr.Markdown("### 📚 Server Documentation & guidelines")
@@ -426,15 +973,19 @@ with gr.Blocks(title="Application Guide") as tab0:
 
 # Create the TabbedInterface
 interface = gr.TabbedInterface(
-	[tab0, tab1, tab2, tab3, tab4], 
-	tab_names=["Welcome","🔌 Database Setup", "🗄️ Database Operations", "📊 Statistical Analysis", "📊 MCP client guidelines"],
+	[tab0, tab1, tab2, tab3, tab5, tab4], 
+	tab_names=["Welcome","🔌 Database Setup", "🗄️ Database Operations", "📊 Statistical Analysis", "📈 Performance", "📊 MCP client guidelines"],
 	title="Postgres Database Analytics MCP Server",
 	theme=gr.themes.Soft()
 )
+interface.unload(end_ui_session)
 
 # Launch the app
 if __name__ == "__main__":
 	print("🚀 Starting Database Analytics MCP Server...")
 	print(f"🌐 Dashboard: http://localhost:7860")
+	metrics_server = start_metrics_server()
+	if metrics_server is not None:
+		print(f"📈 Metrics: http://localhost:{metrics_server.server_address[1]}/metrics")
 	
 	interface.launch(server_name="0.0.0.0", server_port=8000, mcp_server=True)
\ No newline at end of file
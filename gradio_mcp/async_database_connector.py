@@ -0,0 +1,993 @@
+import os
+import time
+import asyncio
+import secrets
+from typing import Dict, Any, List, Optional
+from contextlib import asynccontextmanager
+import psycopg
+from psycopg.types.json import Jsonb
+from psycopg_pool import AsyncConnectionPool
+from metadata_cache import MetadataCache
+from query_registry import queries
+from result_cache import ResultCache, cached_response
+from result_encoding import ColumnarEncoder, encoded_response
+from query_guard import QueryBudget, QueryRejected, is_cursor_query, is_protected_table, timeout_error, truncated_response
+from result_streams import PageBudget, AsyncResultStream, AsyncResultStreams
+from metrics import phase, record_phase, record_rows
+from query_batch import BATCH_TRANSACTION, parse_queries, fetch_limit, elapsed_ms, query_result, query_error, batch_response
+from materializations import (
+	CATALOG_TABLE,
+	CATALOG_DDL,
+	CATALOG_COLUMNS,
+	SOURCE_RELATION,
+	WATERMARK_QUERY,
+	NEW_ROWS_QUERY,
+	TABLE_CHANGES_QUERY,
+	validate_identifier,
+	parse_index_columns,
+	incremental_source,
+	plan_relations,
+	appended_rows,
+	watermark_literal,
+	row_count,
+	catalog_entry,
+)
+from scratch_schemas import (
+	SCHEMA_PREFIX as SCRATCH_SCHEMA_PREFIX,
+	TABLES_CATALOG as SCRATCH_TABLES_CATALOG,
+	SESSIONS_CATALOG as SCRATCH_SESSIONS_CATALOG,
+	CATALOG_DDL as SCRATCH_CATALOG_DDL,
+	TABLE_COLUMNS as SCRATCH_TABLE_COLUMNS,
+	SCHEMA_BYTES_QUERY,
+	TOUCH_SESSION_QUERY,
+	EXPIRED_TABLES_QUERY,
+	ENDED_SESSIONS_QUERY,
+	ScratchPolicy,
+	ScratchSessions,
+	schema_for,
+	split_table_name,
+	is_scratch_schema,
+	quota_error,
+	table_entry as scratch_table_entry,
+)
+from sampling import TableSample, ESTIMATED_ROWS_QUERY, referenced_tables, sample_query, sampled_response
+from database_connector import (
+	resolve_db_config,
+	resolve_pool_config,
+	new_metadata_cache,
+	new_result_cache,
+	db_target,
+	LIST_SCHEMA,
+	LIST_DATABASE_INFOS,
+	TABLE_IN_SCHEMA,
+	COLUMN_IN_TABLE,
+	EXTENSIONS_IN_TABLE,
+)
+
+
+class AsyncDatabaseInterface:
+	"""
+		asyncio version of `DatabaseInterface` built on psycopg 3 and psycopg_pool.
+		The MCP tools of app.py await it so that one process can keep many queries in flight
+		without holding a Gradio worker thread per request.
+		It must be opened with `await interface.open()` from the running event loop.
+
+		When `ddl_channel` (or DB_DDL_NOTIFY_CHANNEL) is set, a dedicated connection LISTENs on it
+		and clears the metadata cache on every notification, see database/optional/ddl_event_trigger.sql
+	"""
+
+	def __init__(self, db_config: Optional[Dict[str, Any]] = None, pool_config: Optional[Dict[str, Any]] = None,
+			metadata_cache: Optional[MetadataCache] = None, result_cache: Optional[ResultCache] = None,
+			ddl_channel: Optional[str] = None):
+		self.db_config = resolve_db_config(db_config)
+		self.target = db_target(self.db_config)
+		self.metadata_cache = metadata_cache or new_metadata_cache()
+		self.result_cache = result_cache or new_result_cache()
+		self.use_result_cache = os.getenv('QUERY_CACHE_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+		self.ddl_channel = ddl_channel or os.getenv('DB_DDL_NOTIFY_CHANNEL')
+		self._ddl_listener = None
+		self.scratch_policy = ScratchPolicy()
+		self.scratch_sessions = ScratchSessions()
+		self._scratch_reaper = None
+		self.streams = AsyncResultStreams()
+		self.stream_batch_size = int(os.getenv('QUERY_STREAM_BATCH_SIZE', 200))
+		pool_config = resolve_pool_config(pool_config)
+
+		# psycopg 3 only knows the libpq keyword `dbname`
+		self.conninfo_kwargs = dict(self.db_config)
+		self.conninfo_kwargs['dbname'] = self.conninfo_kwargs.pop('database')
+
+		self.pool = AsyncConnectionPool(
+			kwargs=self.conninfo_kwargs,
+			min_size=pool_config['min_size'],
+			max_size=pool_config['max_size'],
+			max_lifetime=pool_config['max_lifetime'],
+			timeout=pool_config['timeout'],
+			check=AsyncConnectionPool.check_connection,
+			open=False
+		)
+
+	async def open(self):
+		"""Open the pool and wait for its first connections, raise ConnectionError on failure"""
+		try:
+			await self.pool.open(wait=True, timeout=self.pool.timeout)
+		except Exception as e:
+			await self.pool.close()
+			raise ConnectionError(f"Failed to connect to database: {str(e)}")
+		if self.ddl_channel:
+			self._ddl_listener = asyncio.create_task(self._listen_for_ddl())
+		if self.scratch_policy.reap_interval:
+			self._scratch_reaper = asyncio.create_task(self._reap_scratch_periodically())
+
+	async def close(self):
+		"""Close every pooled connection, used when the interface is replaced"""
+		if self._ddl_listener is not None:
+			self._ddl_listener.cancel()
+			self._ddl_listener = None
+		if self._scratch_reaper is not None:
+			self._scratch_reaper.cancel()
+			self._scratch_reaper = None
+		await self.streams.close_all()
+		await self.pool.close()
+
+	async def _listen_for_ddl(self):
+		"""Invalidate the metadata cache when DDL made outside the server is notified"""
+		while True:
+			try:
+				conn = await psycopg.AsyncConnection.connect(autocommit=True, **self.conninfo_kwargs)
+				async with conn:
+					await conn.execute(f'LISTEN "{self.ddl_channel}"')
+					# anything may have changed while we were not listening
+					self.metadata_cache.invalidate(self.target)
+					self.result_cache.invalidate(self.target)
+					async for _ in conn.notifies():
+						self.metadata_cache.invalidate(self.target)
+						self.result_cache.invalidate(self.target)
+			except asyncio.CancelledError:
+				raise
+			except Exception as e:
+				print(f"❌ DDL listener on '{self.ddl_channel}' failed, retrying in 5s: {str(e)}")
+				await asyncio.sleep(5)
+
+	@asynccontextmanager
+	async def connection(self):
+		"""Check a connection out of the pool, it is given back to the pool on exit"""
+		start = time.perf_counter()
+		async with self.pool.connection() as conn:
+			# pool wait time, and connection time when the pool had to open one
+			record_phase("connect", time.perf_counter() - start)
+			yield conn
+
+	def pool_stats(self) -> Dict[str, Any]:
+		"""Pool usage counters as reported by psycopg_pool (pool_size, pool_available, requests_wait_ms...)"""
+		return self.pool.get_stats()
+
+	def cache_stats(self) -> Dict[str, Any]:
+		"""Hit/miss counters of the metadata and query result caches"""
+		return {"metadata": self.metadata_cache.stats(), "results": self.result_cache.stats()}
+
+	async def _fetch_json(self, name: str, params: Optional[Dict[str, Any]] = None):
+		key = (self.target, name, tuple(sorted((params or {}).items())))
+		found, result = self.metadata_cache.get(key)
+		if found:
+			return result
+
+		async with self.connection() as conn:
+			async with conn.cursor() as cur:
+				# psycopg 3 prepares the statement server side on each pooled connection
+				with phase("execute"):
+					await cur.execute(queries.get(name).text, params, prepare=True)
+				with phase("fetch"):
+					result = (await cur.fetchone())[0]  # JSON object
+
+		self.metadata_cache.set(key, result)
+		return result
+
+	async def list_database_info(self):
+		return await self._fetch_json(LIST_DATABASE_INFOS)
+
+	async def list_schemas(self):
+		return await self._fetch_json(LIST_SCHEMA)
+
+	async def list_tables_in_schema(self, schema_name: str):
+		return await self._fetch_json(TABLE_IN_SCHEMA, {'schema_name': schema_name})
+
+	async def list_columns_in_table(self, schema_name: str, table_name: str):
+		return await self._fetch_json(COLUMN_IN_TABLE, {
+			'schema_name': schema_name,
+			'table_name': table_name
+		})
+
+	async def list_extensions(self):
+		return await self._fetch_json(EXTENSIONS_IN_TABLE)
+
+	async def _apply_budget(self, cur, query, budget: QueryBudget):
+		"""SET LOCAL the budget settings and run the EXPLAIN pre-flight check, raise QueryRejected"""
+		for statement, params in budget.settings():
+			await cur.execute(statement, params)
+		if budget.explain:
+			await cur.execute(f"EXPLAIN (FORMAT JSON) {query}")
+			budget.check_plan((await cur.fetchone())[0])
+
+	async def table_estimates(self, tables: List[str]) -> Dict[str, float]:
+		"""Planner estimate of the rows of each table (pg_class.reltuples, -1 when missing), cached as metadata"""
+		if not tables:
+			return {}
+		key = (self.target, ESTIMATED_ROWS_QUERY, tuple(tables))
+		found, result = self.metadata_cache.get(key)
+		if found:
+			return result
+		async with self.connection() as conn:
+			async with conn.cursor() as cur:
+				await cur.execute(ESTIMATED_ROWS_QUERY, (list(tables),))
+				result = {name: float(rows) for name, rows in await cur.fetchall()}
+		self.metadata_cache.set(key, result)
+		return result
+
+	async def read_only_query(self, query, use_cache: Optional[bool] = None, cache_ttl: Optional[float] = None,
+			budget: Optional[QueryBudget] = None, sample: Optional[TableSample] = None):
+		"""
+			Run a read only query and return its rows.
+			With use_cache (default: QUERY_CACHE_ENABLED) the result cache is used and the response becomes
+			{"rows": [...], "from_cache": bool, "age_seconds": float}
+			With a budget, the statement timeout / work_mem are applied, the plan may be checked first
+			(a structured error dict is returned on rejection) and results longer than max_rows are truncated.
+			With a sample, the scan of the largest base table by the outer query reads a TABLESAMPLE of it and
+			the response gets the "sample" rate / seed and the "confidence" bounds, see sampling.py
+		"""
+		if sample is not None:
+			try:
+				estimates = await self.table_estimates(referenced_tables(query))
+			except Exception as e:
+				return f"❌ Connection error: {str(e)}"
+			try:
+				sampled_query, description = sample_query(query, sample, estimates)
+			except ValueError as e:
+				return f"❌ Cannot sample this query: {str(e)}"
+			result = await self.read_only_query(sampled_query, use_cache, cache_ttl, budget)
+			return sampled_response(result, description)
+
+		use_cache = self.use_result_cache if use_cache is None else use_cache
+		if use_cache:
+			entry = self.result_cache.get(self.target, query)
+			if entry is not None:
+				return cached_response(entry, from_cache=True)
+		try:
+			async with self.connection() as conn:
+				try:
+					async with conn.cursor() as cur:
+						await cur.execute("SET TRANSACTION READ ONLY")
+						if budget is None:
+							with phase("execute"):
+								await cur.execute(query)
+							with phase("fetch"):
+								result = await cur.fetchall()
+						else:
+							await self._apply_budget(cur, query, budget)
+
+					if budget is not None:
+						# a server side cursor only transfers the rows we fetch
+						if is_cursor_query(query):
+							cur = conn.cursor(name=f"mcp_query_{secrets.token_hex(8)}")
+						else:
+							cur = conn.cursor()
+						async with cur:
+							with phase("execute"):
+								await cur.execute(query)
+							with phase("fetch"):
+								if budget.max_rows:
+									result = await cur.fetchmany(budget.max_rows + 1)
+								else:
+									result = await cur.fetchall()
+							if budget.max_rows and len(result) > budget.max_rows:
+								record_rows(result)
+								return truncated_response(result, budget)
+
+					record_rows(result)
+					if use_cache:
+						return cached_response(self.result_cache.set(self.target, query, result, cache_ttl), from_cache=False)
+					return result
+				except QueryRejected as e:
+					await conn.rollback()
+					return e.details
+				except psycopg.errors.QueryCanceled as e:
+					await conn.rollback()
+					return timeout_error(budget, e) if budget is not None else f"❌ Query canceled: {str(e)}"
+				except Exception as e:
+					await conn.rollback()
+					return f"❌ Error running query: {str(e)}"
+		except Exception as e:
+			return f"❌ Connection error: {str(e)}"
+
+	async def read_only_query_encoded(self, query, output_format: str = "columnar_json", batch_size: int = 5000,
+			budget: Optional[QueryBudget] = None):
+		"""
+			Run a read only query and encode its result column by column while fetching batches,
+			see result_encoding.ColumnarEncoder for the formats. Stops at budget.max_rows when given.
+		"""
+		max_rows = budget.max_rows if budget is not None else None
+		try:
+			async with self.connection() as conn:
+				try:
+					async with conn.cursor() as cur:
+						await cur.execute("SET TRANSACTION READ ONLY")
+						if budget is not None:
+							await self._apply_budget(cur, query, budget)
+
+					if is_cursor_query(query):
+						cur = conn.cursor(name=f"mcp_encode_{secrets.token_hex(8)}")
+					else:
+						cur = conn.cursor()
+					async with cur:
+						with phase("execute"):
+							await cur.execute(query)
+						encoder, fetched, truncated, first_batch = None, 0, False, None
+						fetch_time, encode_time = 0.0, 0.0
+						while True:
+							size = batch_size if not max_rows else min(batch_size, max_rows + 1 - fetched)
+							start = time.perf_counter()
+							rows = await cur.fetchmany(size)
+							fetch_time += time.perf_counter() - start
+							if encoder is None:
+								encoder = ColumnarEncoder(cur.description, output_format)
+							if max_rows and fetched + len(rows) > max_rows:
+								rows, truncated = rows[:max_rows - fetched], True
+							if first_batch is None:
+								first_batch = rows
+							start = time.perf_counter()
+							encoder.add_batch(rows)
+							encode_time += time.perf_counter() - start
+							fetched += len(rows)
+							if truncated or len(rows) < size:
+								break
+					record_phase("fetch", fetch_time)
+					record_rows(first_batch, count=fetched)
+					# encoding the last batches and base64 are CPU bound, keep them off the event loop
+					start = time.perf_counter()
+					response = await asyncio.to_thread(encoded_response, encoder, truncated, max_rows)
+					record_phase("serialize", encode_time + time.perf_counter() - start)
+					return response
+				except QueryRejected as e:
+					await conn.rollback()
+					return e.details
+				except psycopg.errors.QueryCanceled as e:
+					await conn.rollback()
+					return timeout_error(budget, e) if budget is not None else f"❌ Query canceled: {str(e)}"
+				except Exception as e:
+					await conn.rollback()
+					return f"❌ Error running query: {str(e)}"
+		except Exception as e:
+			return f"❌ Connection error: {str(e)}"
+
+	async def _begin_batch(self, conn, budget: Optional[QueryBudget]):
+		async with conn.cursor() as cur:
+			await cur.execute(BATCH_TRANSACTION)
+			for statement, params in (budget.settings() if budget is not None else []):
+				await cur.execute(statement, params)
+
+	async def _explain_batch(self, conn, queries: List[str], budget: QueryBudget) -> Dict[int, Dict[str, Any]]:
+		"""EXPLAIN pre-flight check of every query, returns the errors of the rejected ones by index"""
+		rejected = {}
+		for i, query in enumerate(queries):
+			try:
+				# savepoint: an invalid query must not abort the batch transaction
+				async with conn.transaction():
+					async with conn.cursor() as cur:
+						await cur.execute(f"EXPLAIN (FORMAT JSON) {query}")
+						budget.check_plan((await cur.fetchone())[0])
+			except QueryRejected as e:
+				rejected[i] = e.details
+			except psycopg.Error as e:
+				rejected[i] = query_error(e)
+		return rejected
+
+	async def _pipelined_batch(self, conn, queries: List[str], indexes: List[int],
+			budget: Optional[QueryBudget]) -> Dict[int, Dict[str, Any]]:
+		"""
+			Send every query before reading the first result (one round trip). A clock_timestamp() between two
+			queries gives the server time of each of them. Raise on the first failing query, the transaction is then aborted.
+			With a row budget, SELECTs are DECLAREd as cursors and only max_rows + 1 rows are FETCHed from the server.
+		"""
+		cursors, clocks, limit = [], [], fetch_limit(budget)
+		with phase("execute"):
+			async with conn.pipeline():
+				for i in indexes:
+					clocks.append(await conn.execute("SELECT clock_timestamp()"))
+					if limit and is_cursor_query(queries[i]):
+						await conn.execute(f"DECLARE mcp_batch_{i} NO SCROLL CURSOR FOR {queries[i].strip().rstrip(';')}")
+						cursors.append(await conn.execute(f"FETCH FORWARD {limit} FROM mcp_batch_{i}"))
+					else:
+						cursors.append(await conn.execute(queries[i]))
+				clocks.append(await conn.execute("SELECT clock_timestamp()"))
+		with phase("fetch"):
+			times = [(await clock.fetchone())[0] for clock in clocks]
+			results = {}
+			for k, (i, cur) in enumerate(zip(indexes, cursors)):
+				if not cur.description:
+					rows = []
+				else:
+					rows = await cur.fetchmany(limit) if limit else await cur.fetchall()
+				record_rows(rows)
+				results[i] = query_result(rows, round((times[k + 1] - times[k]).total_seconds() * 1000, 3), budget)
+		return results
+
+	async def _sequential_batch(self, conn, queries: List[str], indexes: List[int],
+			budget: Optional[QueryBudget]) -> Dict[int, Dict[str, Any]]:
+		"""
+			One query after the other, each in a savepoint so that a failing query does not abort the others.
+			With a row budget, SELECTs run through a server side cursor so only max_rows + 1 rows are transferred
+		"""
+		results, limit = {}, fetch_limit(budget)
+		for i in indexes:
+			start = time.perf_counter()
+			try:
+				async with conn.transaction():
+					if limit and is_cursor_query(queries[i]):
+						cur = conn.cursor(name=f"mcp_batch_{secrets.token_hex(8)}")
+					else:
+						cur = conn.cursor()
+					async with cur:
+						with phase("execute"):
+							await cur.execute(queries[i])
+						with phase("fetch"):
+							if not cur.description:
+								rows = []
+							else:
+								rows = await cur.fetchmany(limit) if limit else await cur.fetchall()
+				record_rows(rows)
+				results[i] = query_result(rows, elapsed_ms(start), budget)
+			except psycopg.errors.QueryCanceled as e:
+				results[i] = timeout_error(budget, e) if budget is not None else query_error(e, elapsed_ms(start))
+			except psycopg.Error as e:
+				results[i] = query_error(e, elapsed_ms(start))
+		return results
+
+	async def _parallel_query(self, query: str, budget: Optional[QueryBudget]) -> Dict[str, Any]:
+		start = time.perf_counter()
+		result = await self.read_only_query(query, use_cache=False, budget=budget)
+		if isinstance(result, str):
+			return {"error": "query_failed", "reason": result, "elapsed_ms": elapsed_ms(start)}
+		if isinstance(result, dict):
+			# truncated rows or structured budget error
+			return {**result, "elapsed_ms": elapsed_ms(start)}
+		return query_result(result, elapsed_ms(start), budget)
+
+	async def read_only_queries(self, queries: List[str], budget: Optional[QueryBudget] = None, parallel: bool = False):
+		"""
+			Run several small read only queries in one call, see query_batch.batch_response for the result.
+			By default they run on a single pooled connection in one REPEATABLE READ READ ONLY transaction,
+			so every query sees the same snapshot, and are pipelined when libpq supports it. When a pipelined
+			query fails the batch is replayed query by query to report the error of each one.
+			With parallel, each query runs on its own pooled connection: faster for independent slow queries,
+			but they do not share a snapshot. The budget statement timeout applies to each query.
+		"""
+		try:
+			queries = parse_queries(queries)
+		except ValueError as e:
+			return f"❌ {str(e)}"
+		start = time.perf_counter()
+		if parallel:
+			results = await asyncio.gather(*(self._parallel_query(query, budget) for query in queries))
+			return batch_response(dict(enumerate(results)), "parallel", start)
+
+		try:
+			async with self.connection() as conn:
+				try:
+					await self._begin_batch(conn, budget)
+					results = {}
+					if budget is not None and budget.explain:
+						results.update(await self._explain_batch(conn, queries, budget))
+					indexes = [i for i in range(len(queries)) if i not in results]
+					mode = "sequential"
+					if psycopg.Pipeline.is_supported() and len(indexes) > 1:
+						try:
+							results.update(await self._pipelined_batch(conn, queries, indexes, budget))
+							mode = "pipeline"
+						except psycopg.Error:
+							await conn.rollback()
+							await self._begin_batch(conn, budget)
+					if mode == "sequential":
+						results.update(await self._sequential_batch(conn, queries, indexes, budget))
+					await conn.rollback()
+					return batch_response(results, mode, start)
+				except Exception as e:
+					await conn.rollback()
+					return f"❌ Error running queries: {str(e)}"
+		except Exception as e:
+			return f"❌ Connection error: {str(e)}"
+
+	async def _open_stream(self, query: str, budget: Optional[QueryBudget] = None) -> AsyncResultStream:
+		conn = await self.pool.getconn()
+		try:
+			await conn.execute("SET TRANSACTION READ ONLY")
+			if budget is not None:
+				async with conn.cursor() as cur:
+					await self._apply_budget(cur, query, budget)
+			cur = conn.cursor(name=f"mcp_stream_{secrets.token_hex(8)}")
+			await cur.execute(query)
+		except Exception:
+			await conn.rollback()
+			await self.pool.putconn(conn)
+			raise
+		stream = AsyncResultStream(self.pool, conn, cur, query)
+		await self.streams.add(stream)
+		return stream
+
+	async def read_only_query_page(self, query: Optional[str] = None, continuation_token: Optional[str] = None,
+			max_rows: Optional[int] = None, max_bytes: Optional[int] = None, budget: Optional[QueryBudget] = None):
+		"""
+			Run a read only query through a server side cursor and return its first page,
+			or the next page of a previous call when `continuation_token` is given.
+			The connection stays checked out until the last page is read, the stream is closed or it expires.
+			The budget statement timeout applies to each page fetch, its max_rows is not used (pages have their own cap).
+		"""
+		page_budget = PageBudget(max_rows, max_bytes)
+		await self.streams.expire()
+		if continuation_token:
+			stream = self.streams.get(continuation_token)
+			if stream is None:
+				return "❌ Unknown or expired continuation token, run the query again"
+		else:
+			try:
+				stream = await self._open_stream(query, budget)
+			except QueryRejected as e:
+				return e.details
+			except psycopg.errors.QueryCanceled as e:
+				return timeout_error(budget, e) if budget is not None else f"❌ Query canceled: {str(e)}"
+			except Exception as e:
+				return f"❌ Error running query: {str(e)}"
+
+		try:
+			async with stream.lock:
+				with phase("fetch"):
+					page = await stream.next_page(page_budget, self.stream_batch_size)
+		except psycopg.errors.QueryCanceled as e:
+			await self.streams.discard(stream.token)
+			return timeout_error(budget, e) if budget is not None else f"❌ Query canceled: {str(e)}"
+		except Exception as e:
+			await self.streams.discard(stream.token)
+			return f"❌ Error fetching results: {str(e)}"
+
+		record_rows(page["rows"])
+		if page["continuation_token"] is None:
+			await self.streams.discard(stream.token)
+		return page
+
+	async def close_stream(self, continuation_token: str) -> str:
+		"""Release the connection of a stream that will not be read until the end"""
+		if await self.streams.discard(continuation_token):
+			return "✅ Query stream closed"
+		return "❌ Unknown or expired continuation token"
+
+	async def create_table_from_query(self, table_name: str, source_query: str, drop_if_exists: bool = True,
+			budget: Optional[QueryBudget] = None, session_id: Optional[str] = None) -> str:
+		"""
+			Create permanent table from any SELECT query, within the statement timeout / cost budget when given.
+			With a session_id the table goes to the session scratch schema instead, see _create_scratch_table
+		"""
+		if session_id is not None:
+			return await self._create_scratch_table(table_name, source_query, session_id, drop_if_exists, budget)
+		try:
+			async with self.connection() as conn:
+				try:
+					async with conn.cursor() as cur:
+						if budget is not None:
+							await self._apply_budget(cur, source_query, budget)
+
+						# Optional: Drop existing table first
+						if drop_if_exists and not is_protected_table(table_name):
+							await cur.execute(f"DROP TABLE IF EXISTS {table_name}")
+
+						await cur.execute(f"CREATE TABLE {table_name} AS {source_query}")
+						await conn.commit()
+						self.metadata_cache.invalidate(self.target)
+						self.result_cache.invalidate_table(self.target, table_name)
+
+						# Verify creation and get row count
+						await cur.execute(f"SELECT COUNT(*) FROM {table_name}")
+						count = (await cur.fetchone())[0]
+
+						print(f"✅ Table '{table_name}' created successfully with {count} rows")
+						return f"✅ Table '{table_name}' created successfully with {count} rows"
+
+				except QueryRejected as e:
+					await conn.rollback()
+					return e.details
+				except Exception as e:
+					await conn.rollback()
+					return f"❌ Error creating table: {str(e)}"
+		except Exception as e:
+			return f"❌ Connection error: {str(e)}"
+
+	async def _create_scratch_table(self, table_name: str, source_query: str, session_id: str,
+			drop_if_exists: bool = True, budget: Optional[QueryBudget] = None) -> str:
+		"""
+			Create the table in the scratch schema of the session: UNLOGGED unless SCRATCH_UNLOGGED=false,
+			dropped by the reaper after SCRATCH_TABLE_TTL or when the session ends, and rolled back
+			when the tables of the session would exceed SCRATCH_MAX_BYTES
+		"""
+		schema = self.scratch_sessions.touch(session_id)
+		table_schema, table = split_table_name(table_name)
+		if table_schema not in (None, schema):
+			return f"❌ Tables are created in your scratch schema {schema}, give an unqualified table name"
+		try:
+			table = validate_identifier(table)
+		except ValueError as e:
+			return f"❌ {str(e)}"
+		qualified = f"{schema}.{table}"
+		policy = self.scratch_policy
+		try:
+			async with self.connection() as conn:
+				try:
+					async with conn.cursor() as cur:
+						if budget is not None:
+							await self._apply_budget(cur, source_query, budget)
+						for ddl in SCRATCH_CATALOG_DDL:
+							await cur.execute(ddl)
+						await cur.execute(f"CREATE SCHEMA IF NOT EXISTS {schema}")
+						# the session row keeps the reaper of another server process away from the new schema
+						await cur.execute(TOUCH_SESSION_QUERY, (schema, time.time()))
+						if drop_if_exists:
+							await cur.execute(f"DROP TABLE IF EXISTS {qualified}")
+
+						storage = "UNLOGGED " if policy.unlogged else ""
+						with phase("execute"):
+							await cur.execute(f"CREATE {storage}TABLE {qualified} AS {source_query}")
+						count = row_count(cur)
+						# the planner estimates (and the row count of a sampled ANOVA) need statistics
+						await cur.execute(f"ANALYZE {qualified}")
+						await cur.execute(SCHEMA_BYTES_QUERY, (schema,))
+						used = (await cur.fetchone())[0]
+						if policy.max_bytes and used > policy.max_bytes:
+							await conn.rollback()
+							return quota_error(schema, used, policy.max_bytes)
+						await cur.execute("SELECT pg_total_relation_size(%s::regclass)", (qualified,))
+						size = (await cur.fetchone())[0]
+						await cur.execute(
+							f"""
+							INSERT INTO {SCRATCH_TABLES_CATALOG} (schema_name, table_name, row_count, bytes, unlogged, expires_at)
+							VALUES (%s, %s, %s, %s, %s, now() + make_interval(secs => %s))
+							ON CONFLICT (schema_name, table_name) DO UPDATE SET
+								row_count = EXCLUDED.row_count, bytes = EXCLUDED.bytes, unlogged = EXCLUDED.unlogged,
+								created_at = now(), expires_at = EXCLUDED.expires_at
+							""",
+							(schema, table, count, size, policy.unlogged, policy.table_ttl)
+						)
+					await conn.commit()
+				except QueryRejected as e:
+					await conn.rollback()
+					return e.details
+				except Exception as e:
+					await conn.rollback()
+					return f"❌ Error creating table: {str(e)}"
+		except Exception as e:
+			return f"❌ Connection error: {str(e)}"
+
+		self.metadata_cache.invalidate(self.target)
+		self.result_cache.invalidate_table(self.target, qualified)
+		return (
+			f"✅ Table '{qualified}' created successfully with {count} rows, "
+			f"use this qualified name to query it, it is dropped after {policy.table_ttl / 3600:g}h or at the end of your session"
+		)
+
+	async def drop_table(self, table_name: str, cascade: bool = False, session_id: Optional[str] = None) -> str:
+		"""
+			Drop a table. With a session_id, an unqualified name is looked up in the session scratch schema first,
+			and the tables of the other sessions scratch schemas cannot be dropped
+		"""
+		if session_id is not None:
+			schema = self.scratch_sessions.touch(session_id)
+			table_schema, table = split_table_name(table_name)
+			if is_scratch_schema(table_schema) and table_schema != schema:
+				return f"❌ Table '{table_name}' belongs to another session and cannot be dropped"
+		try:
+			async with self.connection() as conn:
+				try:
+					async with conn.cursor() as cur:
+						cascade_clause = " CASCADE" if cascade else ""
+						if session_id is not None and table_schema is None:
+							await cur.execute("SELECT to_regclass(%s) IS NOT NULL", (f"{schema}.{table}",))
+							if (await cur.fetchone())[0]:
+								table_name = f"{schema}.{table}"
+						if not is_protected_table(table_name):
+							await cur.execute(f"DROP TABLE IF EXISTS {table_name}{cascade_clause}")
+							# forget the recorded source query of a managed table, or the expiry of a scratch table
+							table_schema, table = split_table_name(table_name)
+							catalog = None
+							if is_scratch_schema(table_schema):
+								catalog, key, params = SCRATCH_TABLES_CATALOG, "schema_name = %s AND table_name = %s", (table_schema, table)
+							elif table_schema in (None, "public"):
+								catalog, key, params = CATALOG_TABLE, "table_name = %s", (table,)
+							if catalog is not None:
+								await cur.execute("SELECT to_regclass(%s) IS NOT NULL", (catalog,))
+								if (await cur.fetchone())[0]:
+									await cur.execute(f"DELETE FROM {catalog} WHERE {key}", params)
+							await conn.commit()
+							self.metadata_cache.invalidate(self.target)
+							self.result_cache.invalidate_table(self.target, table_name)
+							return f"✅ Table '{table_name}' dropped successfully"
+						else:
+							return f"❌ Table '{table_name}' is a system table and cannot be dropped"
+				except Exception as e:
+					await conn.rollback()
+					return f"❌ Error dropping table: {str(e)}"
+		except Exception as e:
+			return f"❌ Connection error: {str(e)}"
+
+	async def list_scratch_tables(self, session_id: str) -> Dict[str, Any]:
+		"""Tables of the session scratch schema with their size and expiry, and the quota use of the session"""
+		schema = self.scratch_sessions.touch(session_id)
+		async with self.connection() as conn:
+			async with conn.cursor() as cur:
+				tables = []
+				await cur.execute("SELECT to_regclass(%s) IS NOT NULL", (SCRATCH_TABLES_CATALOG,))
+				if (await cur.fetchone())[0]:
+					await cur.execute(
+						f"SELECT {', '.join(SCRATCH_TABLE_COLUMNS)} FROM {SCRATCH_TABLES_CATALOG} WHERE schema_name = %s ORDER BY created_at",
+						(schema,)
+					)
+					tables = [scratch_table_entry(row) for row in await cur.fetchall()]
+				await cur.execute(SCHEMA_BYTES_QUERY, (schema,))
+				used = (await cur.fetchone())[0]
+		return {
+			"schema": schema,
+			"tables": tables,
+			"bytes_used": used,
+			"max_bytes": self.scratch_policy.max_bytes,
+			"table_ttl": self.scratch_policy.table_ttl,
+			"session_ttl": self.scratch_policy.session_ttl
+		}
+
+	async def _drop_scratch(self, cur, schema: str, table: Optional[str] = None):
+		"""Drop a scratch table, or the whole schema of a session, with their catalog rows"""
+		if table is None:
+			await cur.execute(f"DROP SCHEMA IF EXISTS {schema} CASCADE")
+			await cur.execute(f"DELETE FROM {SCRATCH_TABLES_CATALOG} WHERE schema_name = %s", (schema,))
+			await cur.execute(f"DELETE FROM {SCRATCH_SESSIONS_CATALOG} WHERE schema_name = %s", (schema,))
+			self.scratch_sessions.forget(schema)
+		else:
+			await cur.execute(f"DROP TABLE IF EXISTS {schema}.{table}")
+			await cur.execute(f"DELETE FROM {SCRATCH_TABLES_CATALOG} WHERE schema_name = %s AND table_name = %s", (schema, table))
+
+	async def end_scratch_session(self, session_id: str) -> str:
+		"""Drop the scratch schema of a session and every table in it"""
+		schema = schema_for(session_id)
+		try:
+			async with self.connection() as conn:
+				async with conn.cursor() as cur:
+					for ddl in SCRATCH_CATALOG_DDL:
+						await cur.execute(ddl)
+					await self._drop_scratch(cur, schema)
+				await conn.commit()
+		except Exception as e:
+			return f"❌ Error dropping scratch schema: {str(e)}"
+		self.metadata_cache.invalidate(self.target)
+		self.result_cache.invalidate(self.target)
+		return f"✅ Scratch schema '{schema}' dropped"
+
+	async def reap_scratch(self) -> Dict[str, int]:
+		"""
+			Write the session activity seen by this process, then drop the expired scratch tables
+			and the schemas of the sessions idle for more than SCRATCH_SESSION_TTL. One transaction per drop
+			so a table in use (locked) only delays its own drop.
+		"""
+		reaped = {"tables": 0, "sessions": 0}
+		async with self.connection() as conn:
+			async with conn.cursor() as cur:
+				for ddl in SCRATCH_CATALOG_DDL:
+					await cur.execute(ddl)
+				pending = self.scratch_sessions.pending()
+				for schema, seen in pending:
+					await cur.execute(TOUCH_SESSION_QUERY, (schema, seen))
+				await conn.commit()
+				self.scratch_sessions.flushed(pending)
+
+				await cur.execute(EXPIRED_TABLES_QUERY)
+				expired = [(schema, table) for schema, table in await cur.fetchall()]
+				await cur.execute(ENDED_SESSIONS_QUERY, (SCRATCH_SCHEMA_PREFIX, self.scratch_policy.session_ttl))
+				ended = [row[0] for row in await cur.fetchall()]
+				await conn.commit()
+
+				for schema, table in [(schema, table) for schema, table in expired if schema not in ended] + [(schema, None) for schema in ended]:
+					try:
+						await cur.execute("SELECT set_config('lock_timeout', '5s', true)")
+						await self._drop_scratch(cur, schema, table)
+						await conn.commit()
+						reaped["sessions" if table is None else "tables"] += 1
+					except psycopg.Error as e:
+						await conn.rollback()
+						print(f"❌ Scratch reaper could not drop {schema}{'.' + table if table else ''}: {str(e)}")
+		if reaped["tables"] or reaped["sessions"]:
+			self.metadata_cache.invalidate(self.target)
+			self.result_cache.invalidate(self.target)
+		return reaped
+
+	async def _reap_scratch_periodically(self):
+		"""Background task of the interface, started by open() when SCRATCH_REAP_INTERVAL is not 0"""
+		while True:
+			await asyncio.sleep(self.scratch_policy.reap_interval)
+			try:
+				await self.reap_scratch()
+			except asyncio.CancelledError:
+				raise
+			except Exception as e:
+				print(f"❌ Scratch reaper failed, retrying in {self.scratch_policy.reap_interval:g}s: {str(e)}")
+
+	async def _source_changes(self, cur, tables: List[str]) -> Dict[str, list]:
+		"""(filenode, inserted, updated, deleted) counters of the tables, from pg_stat_user_tables"""
+		await cur.execute(TABLE_CHANGES_QUERY, (tables,))
+		return {name: list(counters) for name, *counters in await cur.fetchall()}
+
+	async def _build_materialization(self, cur, table_name: str, source_query: str, index_columns: List[str],
+			unlogged: bool) -> Dict[str, Any]:
+		"""(Re)create a managed table and its catalog entry, in the transaction of `cur`"""
+		template, reason = incremental_source(source_query)
+		changes = None
+		if template is not None:
+			# read early, close to the snapshot of the transaction: a write committed later is missing from both
+			# the counters and the rows, and is found by the next refresh
+			await cur.execute(f"EXPLAIN (VERBOSE, FORMAT JSON) {source_query}")
+			tables = sorted(set(plan_relations((await cur.fetchone())[0])) | {SOURCE_RELATION})
+			changes = await self._source_changes(cur, tables)
+
+		await cur.execute(f"DROP TABLE IF EXISTS {table_name}")
+		storage = "UNLOGGED " if unlogged else ""
+		with phase("execute"):
+			await cur.execute(f"CREATE {storage}TABLE {table_name} AS {source_query}")
+		rows = row_count(cur)
+		for column in index_columns:
+			await cur.execute(f"CREATE INDEX ON {table_name} ({column})")
+		await cur.execute(f"ANALYZE {table_name}")
+
+		watermark = None
+		if template is not None:
+			await cur.execute(WATERMARK_QUERY)
+			watermark = (await cur.fetchone())[0]
+		await cur.execute(
+			f"""
+			INSERT INTO {CATALOG_TABLE} (table_name, source_query, index_columns, unlogged, incremental,
+				watermark, source_changes, row_count, last_refresh)
+			VALUES (%s, %s, %s, %s, %s, %s, %s, %s, 'full')
+			ON CONFLICT (table_name) DO UPDATE SET
+				source_query = EXCLUDED.source_query, index_columns = EXCLUDED.index_columns,
+				unlogged = EXCLUDED.unlogged, incremental = EXCLUDED.incremental,
+				watermark = EXCLUDED.watermark, source_changes = EXCLUDED.source_changes,
+				row_count = EXCLUDED.row_count, refreshed_at = now(),
+				refresh_count = {CATALOG_TABLE}.refresh_count + 1, last_refresh = 'full'
+			""",
+			(
+				table_name, source_query, index_columns, unlogged, template is not None, watermark,
+				Jsonb(changes) if changes is not None else None, rows
+			)
+		)
+		return {"rows": rows, "rows_added": rows, "watermark": watermark, "incremental": template is not None, "incremental_reason": reason}
+
+	async def _refresh_incrementally(self, cur, entry: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+		"""
+			Append the rows produced by the source rows newer than the watermark.
+			The pg_stat_user_tables counters recorded at the last refresh tell what changed without scanning the
+			sources: None when the table must be rebuilt because a joined table changed, source rows were updated,
+			deleted or added at or before the watermark, or the unlogged table was emptied by a crash recovery.
+		"""
+		table_name, watermark, recorded = entry["table_name"], entry["watermark"], entry["source_changes"]
+		if watermark is None or not recorded:
+			return None
+		changes = await self._source_changes(cur, sorted(recorded))
+		inserted = appended_rows(recorded, changes)
+		if inserted is None:
+			return None
+		if entry["row_count"]:
+			await cur.execute(f"SELECT EXISTS (SELECT 1 FROM {table_name})")
+			if not (await cur.fetchone())[0]:
+				return None
+		if inserted == 0:
+			return {"rows": entry["row_count"], "rows_added": 0, "watermark": watermark, "incremental": True, "up_to_date": True}
+		await cur.execute(NEW_ROWS_QUERY, (watermark,))
+		if (await cur.fetchone())[0] != inserted:
+			# some of the inserted rows are not newer than the watermark (or were rolled back)
+			return None
+
+		await cur.execute(WATERMARK_QUERY)
+		new_watermark = (await cur.fetchone())[0]
+		template, _ = incremental_source(entry["source_query"])
+		with phase("execute"):
+			await cur.execute(f"INSERT INTO {table_name} {template.format(watermark=watermark_literal(watermark))}")
+		added = row_count(cur)
+		await cur.execute(
+			f"""
+			UPDATE {CATALOG_TABLE} SET watermark = %s, source_changes = %s, row_count = row_count + %s,
+				refreshed_at = now(), refresh_count = refresh_count + 1, last_refresh = 'incremental'
+			WHERE table_name = %s
+			""",
+			(new_watermark, Jsonb(changes), added, table_name)
+		)
+		return {"rows": entry["row_count"] + added, "rows_added": added, "watermark": new_watermark, "incremental": True}
+
+	async def materialize_table(self, table_name: str, source_query: Optional[str] = None, index_columns=None,
+			unlogged: bool = True, budget: Optional[QueryBudget] = None, force_rebuild: bool = False):
+		"""
+			Managed version of create_table_from_query. The source query is recorded in mcp_materializations,
+			the table is UNLOGGED (no WAL, emptied after a crash) and indexed on `index_columns`,
+			its row count comes from the command status. Called again with the same query (or without a query),
+			the table is refreshed instead of rebuilt: when the query reads `transactions` row by row, only the
+			rows produced by transactions newer than the recorded transaction_date watermark are appended,
+			and it is rebuilt when any other table read by the query changed.
+			Everything runs in one REPEATABLE READ transaction so the watermark matches the rows read.
+		"""
+		start = time.perf_counter()
+		try:
+			table_name = validate_identifier(table_name)
+			index_columns = parse_index_columns(index_columns)
+		except ValueError as e:
+			return f"❌ {str(e)}"
+		if is_protected_table(table_name):
+			return f"❌ Table '{table_name}' is a system table and cannot be overwritten"
+		source_query = source_query.strip().rstrip(";") if source_query and source_query.strip() else None
+
+		try:
+			async with self.connection() as conn:
+				try:
+					async with conn.cursor() as cur:
+						await cur.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ")
+						await cur.execute(CATALOG_DDL)
+						await cur.execute(
+							f"SELECT {', '.join(CATALOG_COLUMNS)} FROM {CATALOG_TABLE} WHERE table_name = %s FOR UPDATE",
+							(table_name,)
+						)
+						row = await cur.fetchone()
+						entry = dict(zip(CATALOG_COLUMNS, row)) if row is not None else None
+						if source_query is None:
+							if entry is None:
+								await conn.rollback()
+								return f"❌ '{table_name}' is not a managed table, give the source query to create it"
+							source_query, unlogged = entry["source_query"], entry["unlogged"]
+							index_columns = index_columns or list(entry["index_columns"])
+						if budget is not None:
+							await self._apply_budget(cur, source_query, budget)
+
+						await cur.execute("SELECT to_regclass(%s) IS NOT NULL", (table_name,))
+						exists = (await cur.fetchone())[0]
+						reusable = (
+							not force_rebuild and exists and entry is not None and entry["incremental"]
+							and entry["source_query"] == source_query and list(entry["index_columns"]) == index_columns
+							and entry["unlogged"] == unlogged
+						)
+						result = await self._refresh_incrementally(cur, entry) if reusable else None
+						if result is None:
+							action = "rebuilt" if entry is not None else "created"
+							result = await self._build_materialization(cur, table_name, source_query, index_columns, unlogged)
+						else:
+							action = "up_to_date" if result.pop("up_to_date", False) else "incremental"
+					await conn.commit()
+				except QueryRejected as e:
+					await conn.rollback()
+					return e.details
+				except Exception as e:
+					await conn.rollback()
+					return f"❌ Error materializing table: {str(e)}"
+		except Exception as e:
+			return f"❌ Connection error: {str(e)}"
+
+		if action != "up_to_date":
+			self.metadata_cache.invalidate(self.target)
+			self.result_cache.invalidate_table(self.target, table_name)
+		watermark = result.get("watermark")
+		return {
+			"table_name": table_name,
+			"action": action,
+			**result,
+			"watermark": watermark.isoformat() if watermark is not None else None,
+			"index_columns": index_columns,
+			"unlogged": unlogged,
+			"elapsed_ms": elapsed_ms(start)
+		}
+
+	async def list_materializations(self):
+		"""Catalog entries of the managed tables, an empty list when none was created yet"""
+		async with self.connection() as conn:
+			async with conn.cursor() as cur:
+				await cur.execute("SELECT to_regclass(%s) IS NOT NULL", (CATALOG_TABLE,))
+				if not (await cur.fetchone())[0]:
+					return []
+				await cur.execute(f"SELECT {', '.join(CATALOG_COLUMNS)} FROM {CATALOG_TABLE} ORDER BY table_name")
+				return [catalog_entry(row) for row in await cur.fetchall()]
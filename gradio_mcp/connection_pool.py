@@ -0,0 +1,222 @@
+import time
+import threading
+from contextlib import contextmanager
+from typing import Dict, Any, Callable, Optional
+import psycopg2
+from psycopg2 import extensions
+
+
+class PoolTimeout(ConnectionError):
+	"""Raised when no connection could be checked out before the timeout"""
+
+
+class PooledConnection(extensions.connection):
+	"""psycopg2 connection that remembers the statements prepared on its session"""
+
+	def __init__(self, *args, **kwargs):
+		super().__init__(*args, **kwargs)
+		self.prepared_statements = set()
+
+
+class ConnectionPool:
+	"""
+		Thread safe psycopg2 connection pool.
+
+		- keeps between `min_size` and `max_size` open connections
+		- connections idle for more than `check_after` seconds are pinged with `SELECT 1` on checkout
+		- connections older than `max_lifetime` seconds are closed and replaced when returned
+		- `configure(conn)` is called once on every new connection (type adapters...)
+		- `stats()` returns the counters needed to size the pool (in use, idle, wait time...)
+	"""
+
+	def __init__(self, db_config: Dict[str, Any], min_size: int = 1, max_size: int = 10,
+				max_lifetime: float = 1800.0, check_after: float = 5.0, timeout: float = 30.0,
+				configure: Optional[Callable[[Any], Any]] = None):
+		if min_size < 0 or max_size < 1 or min_size > max_size:
+			raise ValueError(f"Invalid pool size: min_size={min_size}, max_size={max_size}")
+
+		self.db_config = db_config
+		self.min_size = min_size
+		self.max_size = max_size
+		self.max_lifetime = max_lifetime
+		self.check_after = check_after
+		self.timeout = timeout
+		self.configure = configure
+
+		self._lock = threading.Condition()
+		self._idle = []  # [(conn, last_used)]
+		self._created_at = {}  # id(conn) -> creation time
+		self._in_use = set()
+		self._closed = False
+
+		self._counters = {
+			"checkouts": 0,
+			"waits": 0,
+			"wait_time_total": 0.0,
+			"wait_time_max": 0.0,
+			"timeouts": 0,
+			"connections_created": 0,
+			"connections_closed": 0,
+			"expired": 0,
+			"failed_health_checks": 0,
+		}
+
+		for _ in range(min_size):
+			self._idle.append((self._connect(), time.monotonic()))
+
+	def _connect(self):
+		try:
+			conn = psycopg2.connect(connection_factory=PooledConnection, **self.db_config)
+		except psycopg2.Error as e:
+			raise ConnectionError(f"Failed to connect to database: {str(e)}")
+		if self.configure is not None:
+			try:
+				self.configure(conn)
+			except Exception:
+				conn.close()
+				raise
+		with self._lock:
+			self._created_at[id(conn)] = time.monotonic()
+			self._counters["connections_created"] += 1
+		return conn
+
+	def _discard(self, conn):
+		with self._lock:
+			self._created_at.pop(id(conn), None)
+			self._counters["connections_closed"] += 1
+		try:
+			conn.close()
+		except Exception:
+			pass
+
+	def _expired(self, conn) -> bool:
+		created = self._created_at.get(id(conn), 0)
+		return self.max_lifetime > 0 and time.monotonic() - created > self.max_lifetime
+
+	def _healthy(self, conn, last_used: float) -> bool:
+		if conn.closed:
+			return False
+		if time.monotonic() - last_used < self.check_after:
+			return True
+		try:
+			with conn.cursor() as cur:
+				cur.execute("SELECT 1")
+			conn.rollback()
+			return True
+		except psycopg2.Error:
+			return False
+
+	def getconn(self):
+		"""Check out a connection, waiting up to `timeout` seconds if the pool is exhausted"""
+		start = time.monotonic()
+		waited = False
+		while True:
+			with self._lock:
+				while True:
+					if self._closed:
+						raise ConnectionError("Connection pool is closed")
+					if self._idle or len(self._in_use) < self.max_size:
+						break
+					remaining = self.timeout - (time.monotonic() - start)
+					if remaining <= 0:
+						self._counters["timeouts"] += 1
+						raise PoolTimeout(f"No database connection available after {self.timeout}s (max_size={self.max_size})")
+					waited = True
+					self._lock.wait(remaining)
+
+				candidate = self._idle.pop() if self._idle else None
+				# reserve the slot so that concurrent callers see it as used
+				slot = object()
+				self._in_use.add(slot)
+
+			# health checks and new connections happen outside the lock
+			try:
+				if candidate is None:
+					conn = self._connect()
+				else:
+					conn, last_used = candidate
+					if self._expired(conn):
+						with self._lock:
+							self._counters["expired"] += 1
+						self._discard(conn)
+						conn = None
+					elif not self._healthy(conn, last_used):
+						with self._lock:
+							self._counters["failed_health_checks"] += 1
+						self._discard(conn)
+						conn = None
+			except Exception:
+				with self._lock:
+					self._in_use.discard(slot)
+					self._lock.notify()
+				raise
+
+			with self._lock:
+				self._in_use.discard(slot)
+				if conn is None:
+					continue
+				wait_time = time.monotonic() - start
+				self._in_use.add(conn)
+				self._counters["checkouts"] += 1
+				if waited:
+					self._counters["waits"] += 1
+				self._counters["wait_time_total"] += wait_time
+				self._counters["wait_time_max"] = max(self._counters["wait_time_max"], wait_time)
+				return conn
+
+	def putconn(self, conn, discard: bool = False):
+		"""Return a connection to the pool, rolling back any open transaction"""
+		with self._lock:
+			self._in_use.discard(conn)
+
+			if not discard and not conn.closed:
+				try:
+					if conn.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+						conn.rollback()
+				except psycopg2.Error:
+					discard = True
+
+			if discard or conn.closed or self._closed:
+				self._discard(conn)
+			elif self._expired(conn):
+				self._counters["expired"] += 1
+				self._discard(conn)
+			else:
+				self._idle.append((conn, time.monotonic()))
+			self._lock.notify()
+
+	@contextmanager
+	def connection(self):
+		"""`with pool.connection() as conn:` checks a connection out and always returns it"""
+		conn = self.getconn()
+		broken = False
+		try:
+			yield conn
+		except (psycopg2.OperationalError, psycopg2.InterfaceError):
+			broken = True
+			raise
+		finally:
+			self.putconn(conn, discard=broken)
+
+	def close(self):
+		"""Close idle connections now, in-use ones are closed when they are returned"""
+		with self._lock:
+			self._closed = True
+			while self._idle:
+				conn, _ = self._idle.pop()
+				self._discard(conn)
+			self._lock.notify_all()
+
+	def stats(self) -> Dict[str, Any]:
+		with self._lock:
+			checkouts = self._counters["checkouts"]
+			return {
+				"min_size": self.min_size,
+				"max_size": self.max_size,
+				"in_use": len(self._in_use),
+				"idle": len(self._idle),
+				"size": len(self._in_use) + len(self._idle),
+				**self._counters,
+				"wait_time_avg": self._counters["wait_time_total"] / checkouts if checkouts else 0.0,
+				"closed": self._closed,
+			}
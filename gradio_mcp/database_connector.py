@@ -1,118 +1,146 @@
 import os
-from typing import Dict, Any, Optional
+import time
+import secrets
+from typing import Dict, Any, Callable, List, Optional, Tuple
 from dotenv import load_dotenv
 import psycopg2
+import numpy as np
 from pathlib import Path
+from contextlib import contextmanager
+from connection_pool import ConnectionPool
+from metadata_cache import MetadataCache
+from query_registry import queries
+from result_cache import ResultCache, cached_response
+from result_encoding import ColumnarEncoder, encoded_response
+from query_guard import QueryBudget, QueryRejected, is_cursor_query, is_protected_table, timeout_error, truncated_response
+from vector_types import register_vector, stack_vectors
+from metrics import phase, record_phase, record_rows, record_bytes
+from query_batch import BATCH_TRANSACTION, parse_queries, fetch_limit, elapsed_ms, query_result, query_error, batch_response
 
 # Load environment variables
 load_dotenv()
 
-LIST_SCHEMA="./sql_files/list_schema.sql"
-LIST_DATABASE_INFOS="./sql_files/list_database_infos.sql"
-TABLE_IN_SCHEMA="./sql_files/list_tables_in_schema.sql"
-COLUMN_IN_TABLE="./sql_files/list_columns_in_table.sql"
-EXTENSIONS_IN_TABLE = "./sql_files/list_extentions.sql"
+# named queries of query_registry (file stems of sql_files/)
+LIST_SCHEMA = "list_schema"
+LIST_DATABASE_INFOS = "list_database_infos"
+TABLE_IN_SCHEMA = "list_tables_in_schema"
+COLUMN_IN_TABLE = "list_columns_in_table"
+EXTENSIONS_IN_TABLE = "list_extentions"
 
-class DatabaseInterface:
-	def __init__(self, db_config: Optional[Dict[str, Any]] = None):
-		
-		if db_config:
-			self.db_config = db_config
-		else:
-			# Fallback to environment variables
-			self.db_config = {
-				'host': os.getenv('DB_HOST'),
-				'port': int(os.getenv('DB_PORT', 5432)),
-				'database': os.getenv('DB_NAME'),
-				'user': os.getenv('DB_USER'),
-				'password': os.getenv('DB_PASSWORD')
-			}
-			
-		# Validate configuration
-		required_fields = ['host', 'database', 'user', 'password']
-		missing_fields = [field for field in required_fields if not self.db_config.get(field)]
-		if missing_fields:
-			raise ValueError(f"Missing required database configuration: {missing_fields}")
+def resolve_db_config(db_config: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+	"""Return the given config, or the one from environment variables, and validate it"""
+	if not db_config:
+		# Fallback to environment variables
+		db_config = {
+			'host': os.getenv('DB_HOST'),
+			'port': int(os.getenv('DB_PORT', 5432)),
+			'database': os.getenv('DB_NAME'),
+			'user': os.getenv('DB_USER'),
+			'password': os.getenv('DB_PASSWORD')
+		}
 		
-	def get_db_connection(self):
-		"""Create database connection with error handling"""
-		try:
-			return psycopg2.connect(**self.db_config)
-		except psycopg2.Error as e:
-			raise ConnectionError(f"Failed to connect to database: {str(e)}")
-	
-	def list_database_info(self):
-		sql_path = Path(LIST_DATABASE_INFOS)
-		with sql_path.open("r", encoding="utf-8") as f:
-			query = f.read()
+	# Validate configuration
+	required_fields = ['host', 'database', 'user', 'password']
+	missing_fields = [field for field in required_fields if not db_config.get(field)]
+	if missing_fields:
+		raise ValueError(f"Missing required database configuration: {missing_fields}")
+	return db_config
 
-		conn = self.get_db_connection()
-		try:
-			with conn.cursor() as cur:
-				cur.execute(query)
-				result = cur.fetchone()[0]  # JSON object
-				return result
-		finally:
-			conn.close()
+def resolve_pool_config(pool_config: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+	"""Return the given pool settings, or the ones from environment variables"""
+	if pool_config:
+		return pool_config
+	return {
+		'min_size': int(os.getenv('DB_POOL_MIN_SIZE', 1)),
+		'max_size': int(os.getenv('DB_POOL_MAX_SIZE', 10)),
+		'max_lifetime': float(os.getenv('DB_POOL_MAX_LIFETIME', 1800)),
+		'check_after': float(os.getenv('DB_POOL_CHECK_AFTER', 5)),
+		'timeout': float(os.getenv('DB_POOL_TIMEOUT', 30))
+	}
 
-	def list_schemas(self):
-		sql_path = Path(LIST_SCHEMA)
-		with sql_path.open("r", encoding="utf-8") as f:
-			query = f.read()
+def new_metadata_cache() -> MetadataCache:
+	"""Metadata cache sized from environment variables"""
+	return MetadataCache(
+		maxsize=int(os.getenv('METADATA_CACHE_SIZE', 256)),
+		ttl=float(os.getenv('METADATA_CACHE_TTL', 300))
+	)
 
-		conn = self.get_db_connection()
-		try:
-			with conn.cursor() as cur:
-				cur.execute(query)
-				result = cur.fetchone()[0]  # JSON object
-				return result
-		finally:
-			conn.close()
-	
-	def list_tables_in_schema(self, schema_name: str):
-		sql_path = Path(TABLE_IN_SCHEMA)
-		with sql_path.open("r", encoding="utf-8") as f:
-			query = f.read()
+def new_result_cache() -> ResultCache:
+	"""Query result cache sized from environment variables"""
+	return ResultCache(
+		max_bytes=int(os.getenv('QUERY_CACHE_MAX_BYTES', 64 * 1024 * 1024)),
+		ttl=float(os.getenv('QUERY_CACHE_TTL', 60))
+	)
 
-		conn = self.get_db_connection()
-		try:
+def db_target(db_config: Dict[str, Any]) -> Tuple[Any, ...]:
+	"""Identify the database a config points to, used in cache keys"""
+	return (db_config.get('host'), int(db_config.get('port') or 5432), db_config.get('database'))
+
+class DatabaseInterface:
+	def __init__(self, db_config: Optional[Dict[str, Any]] = None, pool_config: Optional[Dict[str, Any]] = None,
+			metadata_cache: Optional[MetadataCache] = None, result_cache: Optional[ResultCache] = None):
+		self.db_config = resolve_db_config(db_config)
+		self.target = db_target(self.db_config)
+		self.metadata_cache = metadata_cache or new_metadata_cache()
+		self.result_cache = result_cache or new_result_cache()
+		self.use_result_cache = os.getenv('QUERY_CACHE_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+		# pgvector columns are decoded into float32 numpy arrays, see vector_types
+		self.pool = ConnectionPool(self.db_config, configure=register_vector, **resolve_pool_config(pool_config))
+
+	@contextmanager
+	def connection(self):
+		"""Check a connection out of the pool, it is given back (and rolled back) on exit"""
+		start = time.perf_counter()
+		with self.pool.connection() as conn:
+			# pool wait time, and connection time when the pool had to open one
+			record_phase("connect", time.perf_counter() - start)
+			yield conn
+
+	def pool_stats(self) -> Dict[str, Any]:
+		"""Pool usage counters: in use, idle, wait time..."""
+		return self.pool.stats()
+
+	def close(self):
+		"""Close every pooled connection, used when the interface is replaced"""
+		self.pool.close()
+
+	def cache_stats(self) -> Dict[str, Any]:
+		"""Hit/miss counters of the metadata and query result caches"""
+		return {"metadata": self.metadata_cache.stats(), "results": self.result_cache.stats()}
+
+	def _fetch_json(self, name: str, params: Optional[Dict[str, Any]] = None):
+		key = (self.target, name, tuple(sorted((params or {}).items())))
+		found, result = self.metadata_cache.get(key)
+		if found:
+			return result
+
+		with self.connection() as conn:
 			with conn.cursor() as cur:
-				cur.execute(query, {'schema_name': schema_name})
-				result = cur.fetchone()[0]  # JSON object
-				return result
-		finally:
-			conn.close()
+				with phase("execute"):
+					queries.execute(conn, cur, name, params)
+				with phase("fetch"):
+					result = cur.fetchone()[0]  # JSON object
+
+		self.metadata_cache.set(key, result)
+		return result
 
+	def list_database_info(self):
+		return self._fetch_json(LIST_DATABASE_INFOS)
+
+	def list_schemas(self):
+		return self._fetch_json(LIST_SCHEMA)
 	
-	def list_columns_in_table(self, schema_name: str, table_name: str):
-		sql_path = Path(COLUMN_IN_TABLE)
-		with sql_path.open("r", encoding="utf-8") as f:
-			query = f.read()
+	def list_tables_in_schema(self, schema_name: str):
+		return self._fetch_json(TABLE_IN_SCHEMA, {'schema_name': schema_name})
 
-		conn = self.get_db_connection()
-		try:
-			with conn.cursor() as cur:
-				cur.execute(query, {
-					'schema_name': schema_name,
-					'table_name': table_name
-				})
-				result = cur.fetchone()[0]  # JSON object
-				return result
-		finally:
-			conn.close()
+	def list_columns_in_table(self, schema_name: str, table_name: str):
+		return self._fetch_json(COLUMN_IN_TABLE, {
+			'schema_name': schema_name,
+			'table_name': table_name
+		})
 	
 	def list_extensions(self):
-		sql_path = Path(EXTENSIONS_IN_TABLE)
-		with sql_path.open("r", encoding="utf-8") as f:
-			query = f.read()
-		conn = self.get_db_connection()
-		try:
-			with conn.cursor() as cur:
-				cur.execute(query)
-				result = cur.fetchone()[0]  # JSON object
-				return result
-		finally:
-			conn.close()
+		return self._fetch_json(EXTENSIONS_IN_TABLE)
 
 	def execute_sql_file(self, file_path: str):
 		"""Execute SQL statements from a file"""
@@ -123,95 +151,327 @@ class DatabaseInterface:
 		try:
 			with sql_path.open("r", encoding="utf-8") as f:
 				sql_content = f.read()
-			conn = self.get_db_connection()
-			try:
-				with conn.cursor() as cur:
-					# Split SQL content by semicolon and execute each statement
-					sql_commands = [cmd.strip() for cmd in sql_content.split(';') if cmd.strip()]
-					executed_commands = []
-					for command in sql_commands:
-						if command:  # Skip empty commands
-							cur.execute(command)
-							executed_commands.append(command.split()[0:3])  # First few words for logging
+			with self.connection() as conn:
+				try:
+					with conn.cursor() as cur:
+						# Split SQL content by semicolon and execute each statement
+						sql_commands = [cmd.strip() for cmd in sql_content.split(';') if cmd.strip()]
+						executed_commands = []
+						for command in sql_commands:
+							if command:  # Skip empty commands
+								cur.execute(command)
+								executed_commands.append(command.split()[0:3])  # First few words for logging
 					
-					conn.commit()
-					return f"✅ Successfully executed {len(executed_commands)} SQL commands"
+						conn.commit()
+						self.metadata_cache.invalidate(self.target)
+						self.result_cache.invalidate(self.target)
+						return f"✅ Successfully executed {len(executed_commands)} SQL commands"
 					
-			except Exception as e:
-				conn.rollback()
-				return f"❌ Error executing SQL file: {str(e)}"
-			finally:
-				conn.close()
+				except Exception as e:
+					conn.rollback()
+					return f"❌ Error executing SQL file: {str(e)}"
 				
 		except Exception as e:
 			return f"❌ Error reading SQL file: {str(e)}"
 
-	def read_only_query(self, query):
+	def _apply_budget(self, cur, query, budget: QueryBudget):
+		"""SET LOCAL the budget settings and run the EXPLAIN pre-flight check, raise QueryRejected"""
+		for statement, params in budget.settings():
+			cur.execute(statement, params)
+		if budget.explain:
+			cur.execute(f"EXPLAIN (FORMAT JSON) {query}")
+			budget.check_plan(cur.fetchone()[0])
+
+	def read_only_query(self, query, use_cache: Optional[bool] = None, cache_ttl: Optional[float] = None,
+			budget: Optional[QueryBudget] = None):
+		"""
+			Run a read only query and return its rows.
+			With use_cache (default: QUERY_CACHE_ENABLED) the result cache is used and the response becomes
+			{"rows": [...], "from_cache": bool, "age_seconds": float}
+			With a budget, the statement timeout / work_mem are applied, the plan may be checked first
+			(a structured error dict is returned on rejection) and results longer than max_rows are truncated.
+		"""
+		use_cache = self.use_result_cache if use_cache is None else use_cache
+		if use_cache:
+			entry = self.result_cache.get(self.target, query)
+			if entry is not None:
+				return cached_response(entry, from_cache=True)
 		try:
-			conn = self.get_db_connection()
-			try:
-				with conn.cursor() as cur:
-					cur.execute("SET TRANSACTION READ ONLY")
-					cur.execute(query)
-					result = cur.fetchall()  # JSON object
+			with self.connection() as conn:
+				try:
+					with conn.cursor() as cur:
+						cur.execute("SET TRANSACTION READ ONLY")
+						if budget is None:
+							with phase("execute"):
+								cur.execute(query)
+							with phase("fetch"):
+								result = cur.fetchall()  # JSON object
+						else:
+							self._apply_budget(cur, query, budget)
+
+					if budget is not None:
+						# a server side cursor only transfers the rows we fetch
+						cursor_name = f"mcp_query_{secrets.token_hex(8)}" if is_cursor_query(query) else None
+						with conn.cursor(name=cursor_name) as cur:
+							with phase("execute"):
+								cur.execute(query)
+							with phase("fetch"):
+								if budget.max_rows:
+									result = cur.fetchmany(budget.max_rows + 1)
+								else:
+									result = cur.fetchall()
+							if budget.max_rows and len(result) > budget.max_rows:
+								record_rows(result)
+								return truncated_response(result, budget)
+
+					record_rows(result)
+					if use_cache:
+						return cached_response(self.result_cache.set(self.target, query, result, cache_ttl), from_cache=False)
 					return result
-			except Exception as e:
+				except QueryRejected as e:
 					conn.rollback()
-					return f"❌ Error creating table: {str(e)}"
-			finally:
-				conn.close()
+					return e.details
+				except psycopg2.errors.QueryCanceled as e:
+					conn.rollback()
+					return timeout_error(budget, e) if budget is not None else f"❌ Query canceled: {str(e)}"
+				except Exception as e:
+					conn.rollback()
+					return f"❌ Error running query: {str(e)}"
+		except Exception as e:
+			return f"❌ Connection error: {str(e)}"
+
+	def _encode_query(self, conn, query, output_format: str, batch_size: int, max_rows: Optional[int]):
+		"""Fetch `query` in batches into a ColumnarEncoder, return (encoder, truncated, seconds spent encoding)"""
+		cursor_name = f"mcp_encode_{secrets.token_hex(8)}" if is_cursor_query(query) else None
+		with conn.cursor(name=cursor_name) as cur:
+			with phase("execute"):
+				cur.execute(query)
+			encoder, fetched, truncated, first_batch = None, 0, False, None
+			fetch_time, encode_time = 0.0, 0.0
+			while True:
+				size = batch_size if not max_rows else min(batch_size, max_rows + 1 - fetched)
+				start = time.perf_counter()
+				rows = cur.fetchmany(size)
+				fetch_time += time.perf_counter() - start
+				if encoder is None:
+					encoder = ColumnarEncoder(cur.description, output_format)
+				if max_rows and fetched + len(rows) > max_rows:
+					rows, truncated = rows[:max_rows - fetched], True
+				if first_batch is None:
+					first_batch = rows
+				start = time.perf_counter()
+				encoder.add_batch(rows)
+				encode_time += time.perf_counter() - start
+				fetched += len(rows)
+				if truncated or len(rows) < size:
+					record_phase("fetch", fetch_time)
+					record_rows(first_batch, count=fetched)
+					return encoder, truncated, encode_time
+
+	def read_only_query_encoded(self, query, output_format: str = "columnar_json", batch_size: int = 5000,
+			budget: Optional[QueryBudget] = None):
+		"""
+			Run a read only query and encode its result column by column while fetching batches,
+			see result_encoding.ColumnarEncoder for the formats. Stops at budget.max_rows when given.
+		"""
+		max_rows = budget.max_rows if budget is not None else None
+		try:
+			with self.connection() as conn:
+				try:
+					with conn.cursor() as cur:
+						cur.execute("SET TRANSACTION READ ONLY")
+						if budget is not None:
+							self._apply_budget(cur, query, budget)
+					encoder, truncated, encode_time = self._encode_query(conn, query, output_format, batch_size, max_rows)
+					start = time.perf_counter()
+					response = encoded_response(encoder, truncated, max_rows)
+					record_phase("serialize", encode_time + time.perf_counter() - start)
+					return response
+				except QueryRejected as e:
+					conn.rollback()
+					return e.details
+				except psycopg2.errors.QueryCanceled as e:
+					conn.rollback()
+					return timeout_error(budget, e) if budget is not None else f"❌ Query canceled: {str(e)}"
+				except Exception as e:
+					conn.rollback()
+					return f"❌ Error running query: {str(e)}"
+		except Exception as e:
+			return f"❌ Connection error: {str(e)}"
+
+	def iter_query(self, query, batch_size: int = 1000):
+		"""Yield the rows of a read only query in batches of `batch_size` through a server side cursor"""
+		with self.connection() as conn:
+			with conn.cursor() as cur:
+				cur.execute("SET TRANSACTION READ ONLY")
+			with conn.cursor(name=f"mcp_iter_{secrets.token_hex(8)}") as cur:
+				cur.itersize = batch_size
+				with phase("execute"):
+					cur.execute(query)
+				while True:
+					with phase("fetch"):
+						rows = cur.fetchmany(batch_size)
+					if not rows:
+						break
+					record_rows(rows)
+					yield rows
+
+	def fetch_vectors(self, query, vector_column: int = 0, id_column: Optional[int] = None, batch_size: int = 5000,
+			on_batch: Optional[Callable[[int], Any]] = None):
+		"""
+			Run a read only query and return (ids, matrix): the `vector_column` of every row stacked into a
+			contiguous (n_rows, dimension) float32 matrix, and the values of `id_column` (None when not asked).
+			Vectors are fetched in batches and stacked per batch, the rows are never kept as a whole.
+			`on_batch(rows_fetched)` is called after every batch.
+		"""
+		ids, blocks, fetched = [], [], 0
+		fetch_time, decode_time = 0.0, 0.0
+		with self.connection() as conn:
+			with conn.cursor() as cur:
+				cur.execute("SET TRANSACTION READ ONLY")
+			cursor_name = f"mcp_vectors_{secrets.token_hex(8)}" if is_cursor_query(query) else None
+			with conn.cursor(name=cursor_name) as cur:
+				with phase("execute"):
+					cur.execute(query)
+				while True:
+					# the pgvector typecaster parses the vectors while the rows are fetched
+					start = time.perf_counter()
+					rows = cur.fetchmany(batch_size)
+					fetch_time += time.perf_counter() - start
+					if not rows:
+						break
+					start = time.perf_counter()
+					if id_column is not None:
+						ids.extend(row[id_column] for row in rows)
+					blocks.append(stack_vectors([row[vector_column] for row in rows]))
+					decode_time += time.perf_counter() - start
+					fetched += len(rows)
+					if on_batch is not None:
+						on_batch(fetched)
+					if len(rows) < batch_size:
+						break
+		start = time.perf_counter()
+		matrix = np.concatenate(blocks) if blocks else np.empty((0, 0), dtype=np.float32)
+		record_phase("fetch", fetch_time)
+		record_phase("decode", decode_time + time.perf_counter() - start)
+		record_bytes(matrix.nbytes, rows=fetched)
+		return (ids if id_column is not None else None), matrix
+
+	def read_only_queries(self, queries: List[str], budget: Optional[QueryBudget] = None):
+		"""
+			Run several read only queries in one REPEATABLE READ READ ONLY transaction on one pooled connection,
+			every query sees the same snapshot. psycopg2 has no pipeline mode: queries run one after the other,
+			each in a savepoint so that a failing query does not abort the others. See query_batch.batch_response.
+			With a row budget, SELECTs run through a server side cursor so only max_rows + 1 rows are transferred.
+		"""
+		try:
+			queries = parse_queries(queries)
+		except ValueError as e:
+			return f"❌ {str(e)}"
+		start = time.perf_counter()
+		try:
+			with self.connection() as conn:
+				try:
+					with conn.cursor() as cur:
+						cur.execute(BATCH_TRANSACTION)
+						for statement, params in (budget.settings() if budget is not None else []):
+							cur.execute(statement, params)
+						results, limit = {}, fetch_limit(budget)
+						for i, query in enumerate(queries):
+							query_start = time.perf_counter()
+							cur.execute("SAVEPOINT batch_query")
+							try:
+								if budget is not None and budget.explain:
+									cur.execute(f"EXPLAIN (FORMAT JSON) {query}")
+									budget.check_plan(cur.fetchone()[0])
+								if limit and is_cursor_query(query):
+									query_cur = conn.cursor(name=f"mcp_batch_{secrets.token_hex(8)}")
+								else:
+									query_cur = conn.cursor()
+								with query_cur:
+									with phase("execute"):
+										query_cur.execute(query)
+									with phase("fetch"):
+										if not query_cur.description:
+											rows = []
+										else:
+											rows = query_cur.fetchmany(limit) if limit else query_cur.fetchall()
+								cur.execute("RELEASE SAVEPOINT batch_query")
+								record_rows(rows)
+								results[i] = query_result(rows, elapsed_ms(query_start), budget)
+							except QueryRejected as e:
+								cur.execute("ROLLBACK TO SAVEPOINT batch_query")
+								results[i] = e.details
+							except psycopg2.errors.QueryCanceled as e:
+								cur.execute("ROLLBACK TO SAVEPOINT batch_query")
+								results[i] = timeout_error(budget, e) if budget is not None else query_error(e, elapsed_ms(query_start))
+							except psycopg2.Error as e:
+								cur.execute("ROLLBACK TO SAVEPOINT batch_query")
+								results[i] = query_error(e, elapsed_ms(query_start))
+					conn.rollback()
+					return batch_response(results, "sequential", start)
+				except Exception as e:
+					conn.rollback()
+					return f"❌ Error running queries: {str(e)}"
 		except Exception as e:
 			return f"❌ Connection error: {str(e)}"
 
-	def create_table_from_query(self, table_name: str, source_query: str, drop_if_exists: bool = True) -> str:
-		"""Create permanent table from any SELECT query"""
+	def create_table_from_query(self, table_name: str, source_query: str, drop_if_exists: bool = True,
+			budget: Optional[QueryBudget] = None) -> str:
+		"""Create permanent table from any SELECT query, within the statement timeout / cost budget when given"""
 		try:
-			conn = self.get_db_connection()
-			try:
-				with conn.cursor() as cur:
-					# Optional: Drop existing table first
-					if drop_if_exists and (table_name != "transactions" and table_name != "customers" and table_name != "articles"):
-						drop_query = f"DROP TABLE IF EXISTS {table_name}"
-						cur.execute(drop_query)
+			with self.connection() as conn:
+				try:
+					with conn.cursor() as cur:
+						if budget is not None:
+							self._apply_budget(cur, source_query, budget)
+
+						# Optional: Drop existing table first
+						if drop_if_exists and not is_protected_table(table_name):
+							drop_query = f"DROP TABLE IF EXISTS {table_name}"
+							cur.execute(drop_query)
 					
-					# Create permanent table (removed TEMP keyword)
-					create_query = f"CREATE TABLE {table_name} AS {source_query}"
-					cur.execute(create_query)
-					conn.commit()
+						# Create permanent table (removed TEMP keyword)
+						create_query = f"CREATE TABLE {table_name} AS {source_query}"
+						cur.execute(create_query)
+						conn.commit()
+						self.metadata_cache.invalidate(self.target)
+						self.result_cache.invalidate_table(self.target, table_name)
 					
-					# Verify creation and get row count
-					cur.execute(f"SELECT COUNT(*) FROM {table_name}")
-					count = cur.fetchone()[0]
+						# Verify creation and get row count
+						cur.execute(f"SELECT COUNT(*) FROM {table_name}")
+						count = cur.fetchone()[0]
 					
-					print(f"✅ Table '{table_name}' created successfully with {count} rows")
-					return f"✅ Table '{table_name}' created successfully with {count} rows"
+						print(f"✅ Table '{table_name}' created successfully with {count} rows")
+						return f"✅ Table '{table_name}' created successfully with {count} rows"
 					
-			except Exception as e:
-				conn.rollback()
-				return f"❌ Error creating table: {str(e)}"
-			finally:
-				conn.close()
+				except QueryRejected as e:
+					conn.rollback()
+					return e.details
+				except Exception as e:
+					conn.rollback()
+					return f"❌ Error creating table: {str(e)}"
 		except Exception as e:
 			return f"❌ Connection error: {str(e)}"
 	
 	def drop_table(self, table_name: str, cascade: bool = False) -> str:
 		"""Drop a table"""
 		try:
-			conn = self.get_db_connection()
-			try:
-				with conn.cursor() as cur:
-					cascade_clause = " CASCADE" if cascade else ""
-					if table_name != "transactions" and table_name != "customers" and table_name != "articles":
-						drop_query = f"DROP TABLE IF EXISTS {table_name}{cascade_clause}"
-						cur.execute(drop_query)
-						conn.commit()
-						return f"✅ Table '{table_name}' dropped successfully"
-					else:
-						return f"❌ Table '{table_name}' is a system table and cannot be dropped"
-			except Exception as e:
-				conn.rollback()
-				return f"❌ Error dropping table: {str(e)}"
-			finally:
-				conn.close()
+			with self.connection() as conn:
+				try:
+					with conn.cursor() as cur:
+						cascade_clause = " CASCADE" if cascade else ""
+						if not is_protected_table(table_name):
+							drop_query = f"DROP TABLE IF EXISTS {table_name}{cascade_clause}"
+							cur.execute(drop_query)
+							conn.commit()
+							self.metadata_cache.invalidate(self.target)
+							self.result_cache.invalidate_table(self.target, table_name)
+							return f"✅ Table '{table_name}' dropped successfully"
+						else:
+							return f"❌ Table '{table_name}' is a system table and cannot be dropped"
+				except Exception as e:
+					conn.rollback()
+					return f"❌ Error dropping table: {str(e)}"
 		except Exception as e:
 			return f"❌ Connection error: {str(e)}"
\ No newline at end of file
@@ -0,0 +1,137 @@
+import os
+import time
+from typing import Dict, Any, Optional, Tuple
+import numpy as np
+from sklearn.decomposition import PCA
+from sklearn.manifold import TSNE
+from sklearn.neighbors import NearestNeighbors
+
+PROJECTION_METHODS = ("auto", "exact", "fast")
+
+
+class ProjectionEngine:
+	"""
+		2-D projection of embeddings for embedding_clustering.
+		- exact: TSNE on the raw vectors, the historical behaviour, fine up to a few hundred rows
+		- fast: PCA down to `pca_dims`, then Barnes-Hut TSNE on `n_jobs` threads. Above `max_sample` rows,
+		  TSNE runs on a random sample and the other rows are placed at the distance weighted mean of the
+		  projections of their `neighbors` nearest sampled rows (in PCA space)
+		- auto: exact up to `exact_max_rows` rows, fast above
+		Settings default to the PROJECTION_* environment variables.
+	"""
+
+	def __init__(self, method: Optional[str] = None, pca_dims: Optional[int] = None, max_sample: Optional[int] = None,
+			exact_max_rows: Optional[int] = None, n_jobs: Optional[int] = None, neighbors: int = 10, random_state: int = 42):
+		self.method = method or os.getenv('PROJECTION_METHOD', 'auto')
+		if self.method not in PROJECTION_METHODS:
+			raise ValueError(f"Unknown projection method '{self.method}', expected one of {PROJECTION_METHODS}")
+		self.pca_dims = pca_dims or int(os.getenv('PROJECTION_PCA_DIMS', 50))
+		self.max_sample = max_sample or int(os.getenv('PROJECTION_MAX_SAMPLE', 10000))
+		self.exact_max_rows = exact_max_rows or int(os.getenv('PROJECTION_EXACT_MAX_ROWS', 500))
+		self.n_jobs = n_jobs or int(os.getenv('PROJECTION_N_JOBS', -1))
+		self.neighbors = neighbors
+		self.random_state = random_state
+
+	def params(self) -> Dict[str, Any]:
+		"""Settings that change the resulting projection"""
+		return {
+			"method": self.method,
+			"pca_dims": self.pca_dims,
+			"max_sample": self.max_sample,
+			"exact_max_rows": self.exact_max_rows,
+			"neighbors": self.neighbors,
+			"random_state": self.random_state
+		}
+
+	def _tsne(self, embeddings: np.ndarray, n_jobs: Optional[int]) -> np.ndarray:
+		# perplexity must stay below the number of points
+		perplexity = min(30.0, max(1.0, (len(embeddings) - 1) / 3))
+		return TSNE(n_components=2, perplexity=perplexity, random_state=self.random_state, n_jobs=n_jobs).fit_transform(embeddings)
+
+	def fit(self, embeddings: np.ndarray) -> "ProjectionModel":
+		"""Project the embeddings, the returned model can also place new points"""
+		n_rows, dimension = embeddings.shape
+		method = self.method
+		if method == "auto":
+			method = "exact" if n_rows <= self.exact_max_rows else "fast"
+		timings = {}
+		info = {"method": "tsne", "input_rows": n_rows, "dimension": dimension, "sample_size": n_rows, "timings": timings}
+
+		if method == "exact":
+			start = time.perf_counter()
+			projection = self._tsne(embeddings, n_jobs=None)
+			timings["tsne"] = time.perf_counter() - start
+			return ProjectionModel(projection, embeddings, None, info, self.neighbors, self.n_jobs)
+
+		pca, reduced = None, embeddings
+		if dimension > self.pca_dims and n_rows > self.pca_dims:
+			start = time.perf_counter()
+			pca = PCA(n_components=self.pca_dims, random_state=self.random_state)
+			reduced = pca.fit_transform(embeddings).astype(np.float32)
+			timings["pca"] = time.perf_counter() - start
+			info["pca_dims"] = self.pca_dims
+
+		sample = None
+		if n_rows > self.max_sample:
+			rng = np.random.default_rng(self.random_state)
+			sample = np.sort(rng.choice(n_rows, size=self.max_sample, replace=False))
+			info["sample_size"] = self.max_sample
+
+		start = time.perf_counter()
+		sample_projection = self._tsne(reduced if sample is None else reduced[sample], n_jobs=self.n_jobs)
+		timings["tsne"] = time.perf_counter() - start
+		info["method"] = ("pca+" if pca is not None else "") + "barnes_hut_tsne" + ("+knn_assignment" if sample is not None else "")
+
+		if sample is None:
+			return ProjectionModel(sample_projection, reduced, pca, info, self.neighbors, self.n_jobs)
+
+		start = time.perf_counter()
+		projection = np.empty((n_rows, 2), dtype=sample_projection.dtype)
+		projection[sample] = sample_projection
+		rest = np.setdiff1d(np.arange(n_rows), sample, assume_unique=True)
+		sampled = ProjectionModel(sample_projection, reduced[sample], None, info, self.neighbors, self.n_jobs)
+		projection[rest] = sampled.place_reduced(reduced[rest])
+		timings["assignment"] = time.perf_counter() - start
+		return ProjectionModel(projection, reduced, pca, info, self.neighbors, self.n_jobs)
+
+	def project(self, embeddings: np.ndarray) -> Tuple[np.ndarray, Dict[str, Any]]:
+		"""Returns the (n_rows, 2) projection and a report: method, sample size, timings in seconds"""
+		model = self.fit(embeddings)
+		return model.projection, model.info
+
+
+class ProjectionModel:
+	"""
+		Result of ProjectionEngine.fit: the 2-D `projection` of the rows and what is needed to place new points,
+		the fitted PCA (None when it was skipped) and the `reference` rows in the space the neighbours are searched in.
+	"""
+
+	def __init__(self, projection: np.ndarray, reference: np.ndarray, pca: Optional[PCA], info: Dict[str, Any],
+			neighbors: int = 10, n_jobs: Optional[int] = None):
+		self.projection = projection
+		self.reference = reference
+		self.pca = pca
+		self.info = info
+		self.neighbors = neighbors
+		self.n_jobs = n_jobs
+		self._knn = None
+
+	def place_reduced(self, points: np.ndarray) -> np.ndarray:
+		"""Distance weighted mean of the projections of the nearest reference rows"""
+		if self._knn is None:
+			self._knn = NearestNeighbors(n_neighbors=min(self.neighbors, len(self.reference)), n_jobs=self.n_jobs).fit(self.reference)
+		distances, indices = self._knn.kneighbors(points)
+		weights = 1.0 / np.maximum(distances, 1e-12)
+		weights /= weights.sum(axis=1, keepdims=True)
+		return np.einsum("ij,ijk->ik", weights, self.projection[indices])
+
+	def place(self, embeddings: np.ndarray) -> np.ndarray:
+		"""2-D coordinates of new embeddings, consistent with `projection`"""
+		points = self.pca.transform(embeddings).astype(np.float32) if self.pca is not None else embeddings
+		return self.place_reduced(points)
+
+	def __getstate__(self):
+		# the neighbour index is rebuilt on demand
+		state = dict(self.__dict__)
+		state["_knn"] = None
+		return state
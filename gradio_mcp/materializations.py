@@ -0,0 +1,146 @@
+import re
+from typing import Dict, Any, List, Optional, Tuple
+
+# bookkeeping of the managed tables, see AsyncDatabaseInterface.materialize_table
+CATALOG_TABLE = "mcp_materializations"
+CATALOG_DDL = f"""
+	CREATE TABLE IF NOT EXISTS {CATALOG_TABLE} (
+		table_name TEXT PRIMARY KEY,
+		source_query TEXT NOT NULL,
+		index_columns TEXT[] NOT NULL DEFAULT '{{}}',
+		unlogged BOOLEAN NOT NULL DEFAULT true,
+		incremental BOOLEAN NOT NULL DEFAULT false,
+		watermark DATE,
+		source_changes JSONB,
+		row_count BIGINT,
+		created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+		refreshed_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+		refresh_count INTEGER NOT NULL DEFAULT 0,
+		last_refresh TEXT
+	)
+"""
+CATALOG_COLUMNS = (
+	"table_name", "source_query", "index_columns", "unlogged", "incremental", "watermark", "source_changes",
+	"row_count", "created_at", "refreshed_at", "refresh_count", "last_refresh"
+)
+
+# incremental refresh: the fact table new rows are appended to, and its ordered column
+SOURCE_TABLE = "transactions"
+SOURCE_RELATION = f"public.{SOURCE_TABLE}"
+WATERMARK_COLUMN = "transaction_date"
+WATERMARK_QUERY = f"SELECT max({WATERMARK_COLUMN}) FROM {SOURCE_TABLE}"
+# only the rows newer than the watermark are counted, a range scan of the transaction_date index
+NEW_ROWS_QUERY = f"SELECT count(*) FROM {SOURCE_TABLE} WHERE {WATERMARK_COLUMN} > %s"
+# modification counters of the tables read by a source query: a rewritten table (TRUNCATE, VACUUM FULL) gets
+# a new filenode, and the counters go down when the statistics are reset, both make the managed table rebuilt
+TABLE_CHANGES_QUERY = """
+	SELECT t.name, coalesce(pg_relation_filenode(to_regclass(t.name)), 0),
+		coalesce(s.n_tup_ins, -1), coalesce(s.n_tup_upd, -1), coalesce(s.n_tup_del, -1)
+	FROM unnest(%s::text[]) AS t(name) LEFT JOIN pg_stat_user_tables s ON s.relid = to_regclass(t.name)
+"""
+
+IDENTIFIER = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+CLAUSE_KEYWORDS = (
+	"where", "join", "inner", "left", "right", "full", "cross", "natural", "on", "using", "group", "order",
+	"limit", "offset", "having", "window", "union", "except", "intersect", "fetch", "for", "tablesample"
+)
+_SOURCE_REFERENCE = re.compile(
+	rf"\b(from|join)\s+(?:public\.)?{SOURCE_TABLE}\b"
+	rf"(?:\s+(?:as\s+)?(?!(?:{'|'.join(CLAUSE_KEYWORDS)})\b)([A-Za-z_][A-Za-z0-9_]*))?",
+	re.IGNORECASE
+)
+# constructs whose result rows do not map one to one to source rows: appending new rows would be wrong
+_NOT_APPENDABLE = re.compile(
+	r"\b(group\s+by|distinct|limit|offset|having|over|union|intersect|except|"
+	r"(count|sum|avg|min|max|array_agg|string_agg|json_agg|jsonb_agg|bool_and|bool_or|stddev(?:_pop|_samp)?|var_pop|var_samp|variance|percentile_\w+)\s*\()",
+	re.IGNORECASE
+)
+
+
+def validate_identifier(name: str, kind: str = "table name") -> str:
+	name = name.strip()
+	if not IDENTIFIER.match(name):
+		raise ValueError(f"Invalid {kind} '{name}': letters, digits and underscores only")
+	return name
+
+
+def parse_index_columns(index_columns) -> List[str]:
+	"""Comma separated string or list of column names"""
+	if isinstance(index_columns, str):
+		index_columns = index_columns.split(",")
+	return [validate_identifier(column, "index column") for column in (index_columns or []) if column.strip()]
+
+
+def incremental_source(source_query: str) -> Tuple[Optional[str], Optional[str]]:
+	"""
+		The source query restricted to the source rows newer than a watermark, as a template with a `{watermark}`
+		placeholder, and None as reason. (None, reason) when the query cannot be refreshed incrementally:
+		it must read `transactions` exactly once and produce one row per source row (no aggregate, DISTINCT, LIMIT...).
+	"""
+	query = source_query.strip().rstrip(";")
+	references = _SOURCE_REFERENCE.findall(query)
+	if len(references) != 1:
+		return None, f"the query must read {SOURCE_TABLE} exactly once, it reads it {len(references)} times"
+	blocking = _NOT_APPENDABLE.search(query)
+	if blocking:
+		return None, f"'{blocking.group(1).rstrip('(').strip()}' rows cannot be appended, the table is rebuilt on refresh"
+
+	def restrict(match):
+		alias = match.group(2) or SOURCE_TABLE
+		return (
+			f"{match.group(1)} (SELECT * FROM {SOURCE_TABLE} WHERE {WATERMARK_COLUMN} > {{watermark}}) AS {alias}"
+		)
+
+	# literal braces of the query must survive str.format
+	template = _SOURCE_REFERENCE.sub(restrict, query.replace("{", "{{").replace("}", "}}"))
+	return template, None
+
+
+def plan_relations(plan) -> List[str]:
+	"""Qualified names of the relations scanned by an EXPLAIN (VERBOSE, FORMAT JSON) plan, views are expanded"""
+	relations, nodes = set(), [plan[0]["Plan"]]
+	while nodes:
+		node = nodes.pop()
+		if "Relation Name" in node:
+			relations.add(f"{node.get('Schema', 'public')}.{node['Relation Name']}")
+		nodes.extend(node.get("Plans", []))
+	return sorted(relations)
+
+
+def appended_rows(recorded: Dict[str, list], current: Dict[str, list]) -> Optional[int]:
+	"""
+		Rows inserted in the source table since the `recorded` (filenode, inserted, updated, deleted) counters.
+		None when the table must be rebuilt: a joined table changed, or source rows were updated or deleted
+	"""
+	if set(recorded) != set(current) or SOURCE_RELATION not in current:
+		return None
+	for table, counters in recorded.items():
+		if table != SOURCE_RELATION and current[table] != counters:
+			return None
+	(node, inserted, updated, deleted), (new_node, new_inserted, new_updated, new_deleted) = (
+		recorded[SOURCE_RELATION], current[SOURCE_RELATION]
+	)
+	if new_node != node or new_updated != updated or new_deleted != deleted or new_inserted < inserted:
+		return None
+	return new_inserted - inserted
+
+
+def watermark_literal(watermark) -> str:
+	"""SQL literal of a watermark date, the template is not sent with parameters so '%' in the query stays as is"""
+	return f"'{watermark.isoformat()}'::date"
+
+
+def row_count(cur) -> int:
+	"""Rows written by the last CREATE TABLE AS / INSERT, from the command status instead of a COUNT(*)"""
+	if cur.rowcount is not None and cur.rowcount >= 0:
+		return cur.rowcount
+	status = (cur.statusmessage or "").split()
+	return int(status[-1]) if status and status[-1].isdigit() else -1
+
+
+def catalog_entry(row) -> Dict[str, Any]:
+	entry = dict(zip(CATALOG_COLUMNS, row))
+	for key in ("watermark", "created_at", "refreshed_at"):
+		if entry[key] is not None:
+			entry[key] = entry[key].isoformat()
+	return entry
@@ -0,0 +1,58 @@
+import threading
+from typing import Dict, Any, Tuple, Hashable
+from cachetools import TTLCache
+
+
+class MetadataCache:
+	"""
+		TTL + LRU cache for the catalog tools (list_schemas, list_tables_in_schema...).
+		Keys are (target, function, args) where target identifies the database (host, port, database),
+		so one cache can be shared by the sync and async interfaces of the same connection.
+	"""
+
+	def __init__(self, maxsize: int = 256, ttl: float = 300.0):
+		self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+		self._lock = threading.Lock()
+		self.maxsize = maxsize
+		self.ttl = ttl
+		self.hits = 0
+		self.misses = 0
+		self.invalidations = 0
+
+	def get(self, key: Tuple[Hashable, ...]) -> Tuple[bool, Any]:
+		"""Return (found, value)"""
+		with self._lock:
+			try:
+				value = self._cache[key]
+			except KeyError:
+				self.misses += 1
+				return False, None
+			self.hits += 1
+			return True, value
+
+	def set(self, key: Tuple[Hashable, ...], value: Any):
+		with self._lock:
+			self._cache[key] = value
+
+	def invalidate(self, target: Hashable = None):
+		"""Drop every entry of `target`, or the whole cache when no target is given"""
+		with self._lock:
+			if target is None:
+				self._cache.clear()
+			else:
+				for key in [key for key in self._cache.keys() if key[0] == target]:
+					self._cache.pop(key, None)
+			self.invalidations += 1
+
+	def stats(self) -> Dict[str, Any]:
+		with self._lock:
+			lookups = self.hits + self.misses
+			return {
+				"entries": len(self._cache),
+				"maxsize": self.maxsize,
+				"ttl": self.ttl,
+				"hits": self.hits,
+				"misses": self.misses,
+				"hit_rate": self.hits / lookups if lookups else 0.0,
+				"invalidations": self.invalidations,
+			}
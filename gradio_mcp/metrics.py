@@ -0,0 +1,286 @@
+import os
+import time
+import bisect
+import asyncio
+import functools
+import threading
+import contextvars
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Any, Callable, Iterable, List, Optional, Tuple
+from result_cache import estimate_size
+
+# upper bounds in seconds of the latency histograms
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+PHASES = ("connect", "execute", "fetch", "decode", "compute", "serialize")
+TOOL_SUMMARY_COLUMNS = ("tool", "calls", "errors", "rows", "avg_seconds", "p95_seconds", "max_seconds")
+PHASE_SUMMARY_COLUMNS = ("tool", "phase", "count", "total_seconds", "avg_seconds", "max_seconds")
+
+# MCP tool the current request runs for, follows asyncio tasks and asyncio.to_thread
+current_tool = contextvars.ContextVar("current_tool", default="none")
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _escape(value: str) -> str:
+	return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Histogram:
+	"""Cumulative bucket counts, sum and max of the observed values"""
+
+	def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+		self.buckets = buckets
+		self.counts = [0] * (len(buckets) + 1)
+		self.count = 0
+		self.sum = 0.0
+		self.max = 0.0
+
+	def observe(self, value: float):
+		self.counts[bisect.bisect_left(self.buckets, value)] += 1
+		self.count += 1
+		self.sum += value
+		self.max = max(self.max, value)
+
+	def quantile(self, q: float) -> float:
+		"""Upper bound of the bucket holding the q-quantile (max for the last bucket)"""
+		if not self.count:
+			return 0.0
+		rank, seen = q * self.count, 0
+		for bound, count in zip(self.buckets, self.counts):
+			seen += count
+			if seen >= rank:
+				return min(bound, self.max)
+		return self.max
+
+
+class MetricsRegistry:
+	"""
+		In process counters and latency histograms of the MCP tools, rendered in the Prometheus text format.
+		`add_collector(fn)` registers a callable returning [(name, labels, value)] gauges read at scrape time
+		(pool and executor statistics).
+	"""
+
+	def __init__(self, prefix: str = "mcp"):
+		self.prefix = prefix
+		self._lock = threading.Lock()
+		self._counters: Dict[Tuple[str, Labels], float] = {}
+		self._histograms: Dict[Tuple[str, Labels], Histogram] = {}
+		self._collectors: List[Callable[[], Iterable[Tuple[str, Dict[str, str], float]]]] = []
+		self.started_at = time.time()
+
+	@staticmethod
+	def _labels(labels: Dict[str, Any]) -> Labels:
+		return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+	def inc(self, name: str, value: float = 1, **labels):
+		key = (name, self._labels(labels))
+		with self._lock:
+			self._counters[key] = self._counters.get(key, 0) + value
+
+	def observe(self, name: str, value: float, **labels):
+		key = (name, self._labels(labels))
+		with self._lock:
+			histogram = self._histograms.get(key)
+			if histogram is None:
+				histogram = self._histograms[key] = Histogram()
+			histogram.observe(value)
+
+	def add_collector(self, collector: Callable[[], Iterable[Tuple[str, Dict[str, str], float]]]):
+		self._collectors.append(collector)
+
+	def reset(self):
+		with self._lock:
+			self._counters.clear()
+			self._histograms.clear()
+
+	def tool_summary(self) -> List[List[Any]]:
+		"""TOOL_SUMMARY_COLUMNS rows for the Performance tab, slowest first (p95 is a bucket upper bound)"""
+		with self._lock:
+			rows = []
+			for (name, labels), h in self._histograms.items():
+				if name != "tool_duration_seconds":
+					continue
+				tool = dict(labels)["tool"]
+				rows.append([
+					tool, h.count,
+					int(self._counters.get(("tool_errors_total", labels), 0)),
+					int(self._counters.get(("rows_fetched_total", labels), 0)),
+					round(h.sum / h.count, 4), round(h.quantile(0.95), 4), round(h.max, 4)
+				])
+		return sorted(rows, key=lambda row: -row[4])
+
+	def phase_summary(self) -> List[List[Any]]:
+		"""PHASE_SUMMARY_COLUMNS rows for the Performance tab"""
+		with self._lock:
+			rows = []
+			for (name, labels), h in self._histograms.items():
+				if name != "phase_duration_seconds":
+					continue
+				labels = dict(labels)
+				rows.append([labels["tool"], labels["phase"], h.count, round(h.sum, 4), round(h.sum / h.count, 4), round(h.max, 4)])
+		return sorted(rows, key=lambda row: (row[0], PHASES.index(row[1]) if row[1] in PHASES else len(PHASES)))
+
+	@staticmethod
+	def _format_labels(labels, extra: Optional[Tuple[str, str]] = None) -> str:
+		items = list(labels) + ([extra] if extra else [])
+		if not items:
+			return ""
+		return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in items) + "}"
+
+	def render(self) -> str:
+		"""Prometheus text exposition format (version 0.0.4)"""
+		lines = []
+		with self._lock:
+			counters = sorted(self._counters.items())
+			histograms = sorted(self._histograms.items(), key=lambda item: item[0])
+			histograms = [(key, list(h.counts), h.count, h.sum, h.buckets) for key, h in histograms]
+
+		seen = set()
+		for (name, labels), value in counters:
+			metric = f"{self.prefix}_{name}"
+			if metric not in seen:
+				seen.add(metric)
+				lines.append(f"# TYPE {metric} counter")
+			lines.append(f"{metric}{self._format_labels(labels)} {value}")
+
+		for (name, labels), counts, count, total, buckets in histograms:
+			metric = f"{self.prefix}_{name}"
+			if metric not in seen:
+				seen.add(metric)
+				lines.append(f"# TYPE {metric} histogram")
+			cumulative = 0
+			for bound, bucket_count in zip(buckets, counts):
+				cumulative += bucket_count
+				lines.append(f"{metric}_bucket{self._format_labels(labels, ('le', repr(bound)))} {cumulative}")
+			lines.append(f"{metric}_bucket{self._format_labels(labels, ('le', '+Inf'))} {count}")
+			lines.append(f"{metric}_sum{self._format_labels(labels)} {total}")
+			lines.append(f"{metric}_count{self._format_labels(labels)} {count}")
+
+		gauges = [(f"{self.prefix}_uptime_seconds", (), time.time() - self.started_at)]
+		for collector in self._collectors:
+			try:
+				gauges.extend((f"{self.prefix}_{name}", self._labels(labels), value) for name, labels, value in collector())
+			except Exception as e:
+				# a scrape must not fail because a pool is being replaced
+				lines.append(f"# collector error: {type(e).__name__}: {e}")
+		for metric, labels, value in gauges:
+			if metric not in seen:
+				seen.add(metric)
+				lines.append(f"# TYPE {metric} gauge")
+			lines.append(f"{metric}{self._format_labels(labels)} {float(value)}")
+		return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+
+def record_phase(name: str, seconds: float):
+	registry.observe("phase_duration_seconds", seconds, tool=current_tool.get(), phase=name)
+
+
+@contextmanager
+def phase(name: str):
+	"""Time a phase (connect, execute, fetch, decode, compute, serialize) of the current tool"""
+	start = time.perf_counter()
+	try:
+		yield
+	finally:
+		record_phase(name, time.perf_counter() - start)
+
+
+def record_rows(rows: List[tuple], count: Optional[int] = None, sample: int = 100):
+	"""
+		Count the rows fetched by the current tool and their approximate in-memory size,
+		extrapolated from the first `sample` rows. `count` is the total when `rows` is only the first batch.
+	"""
+	count = len(rows) if count is None else count
+	head = rows[:sample]
+	if not count or not head:
+		return
+	tool = current_tool.get()
+	registry.inc("rows_fetched_total", count, tool=tool)
+	registry.inc("bytes_fetched_total", estimate_size(head) * count // len(head), tool=tool)
+
+
+def record_bytes(nbytes: int, rows: int = 0):
+	"""Count bytes (and rows) fetched by the current tool when they are known exactly"""
+	tool = current_tool.get()
+	if rows:
+		registry.inc("rows_fetched_total", rows, tool=tool)
+	registry.inc("bytes_fetched_total", nbytes, tool=tool)
+
+
+def _is_error(result) -> bool:
+	# the tools report failures as strings, or structured dicts with an "error" key
+	if isinstance(result, str):
+		return result.startswith("❌") or "fail to run" in result
+	return isinstance(result, dict) and "error" in result
+
+
+def _finish(tool: str, start: float, error: bool):
+	registry.observe("tool_duration_seconds", time.perf_counter() - start, tool=tool)
+	registry.inc("tool_calls_total", tool=tool)
+	if error:
+		registry.inc("tool_errors_total", tool=tool)
+
+
+def instrument_tool(function: Callable = None, *, name: Optional[str] = None):
+	"""
+		Decorator of the app.py tools: call count, error count and latency per tool, and the tool name
+		the phases and rows recorded below it are labelled with. Signature and docstring are kept for the MCP schema.
+	"""
+	if function is None:
+		return functools.partial(instrument_tool, name=name)
+	tool = name or function.__name__
+
+	if asyncio.iscoroutinefunction(function):
+		@functools.wraps(function)
+		async def wrapper(*args, **kwargs):
+			token, start, error = current_tool.set(tool), time.perf_counter(), True
+			try:
+				result = await function(*args, **kwargs)
+				error = _is_error(result)
+				return result
+			finally:
+				_finish(tool, start, error)
+				current_tool.reset(token)
+	else:
+		@functools.wraps(function)
+		def wrapper(*args, **kwargs):
+			token, start, error = current_tool.set(tool), time.perf_counter(), True
+			try:
+				result = function(*args, **kwargs)
+				error = _is_error(result)
+				return result
+			finally:
+				_finish(tool, start, error)
+				current_tool.reset(token)
+	return wrapper
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+	def do_GET(self):
+		if self.path.split("?")[0] != "/metrics":
+			self.send_error(404)
+			return
+		body = registry.render().encode("utf-8")
+		self.send_response(200)
+		self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+		self.send_header("Content-Length", str(len(body)))
+		self.end_headers()
+		self.wfile.write(body)
+
+	def log_message(self, format, *args):
+		# scrapes every few seconds would flood the server logs
+		pass
+
+
+def start_metrics_server(port: Optional[int] = None, host: Optional[str] = None) -> Optional[ThreadingHTTPServer]:
+	"""Serve GET /metrics on METRICS_PORT (default 9100) from a daemon thread, 0 disables it"""
+	port = int(os.getenv('METRICS_PORT', 9100)) if port is None else port
+	if not port:
+		return None
+	server = ThreadingHTTPServer((host or os.getenv('METRICS_HOST', '0.0.0.0'), port), _MetricsHandler)
+	threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+	return server
@@ -0,0 +1,166 @@
+import os
+import json
+import time
+import pickle
+import secrets
+import hashlib
+import threading
+from pathlib import Path
+from typing import Dict, Any, Callable, List, Optional
+import numpy as np
+from cachetools import LRUCache
+from embedding_projection import ProjectionModel
+
+
+def fingerprint(ids: List[Any], embeddings: np.ndarray, params: Dict[str, Any]) -> str:
+	"""
+		Hash of the fetched rows (ids and vectors) and of the projection / clustering parameters.
+		The query text is left out on purpose: two queries that return the same rows share their projection.
+	"""
+	digest = hashlib.sha256()
+	digest.update(json.dumps(params, sort_keys=True, default=str).encode("utf-8"))
+	digest.update(str(embeddings.shape).encode("ascii"))
+	digest.update("\x1f".join(map(str, ids)).encode("utf-8"))
+	digest.update(np.ascontiguousarray(embeddings, dtype=np.float32).tobytes())
+	return digest.hexdigest()[:32]
+
+
+class CachedProjection:
+	"""A fitted ProjectionModel, the HDBSCAN clusterer fitted on its projection and the labels"""
+
+	def __init__(self, model: ProjectionModel, clusterer, labels: np.ndarray):
+		self.model = model
+		self.clusterer = clusterer
+		self.labels = labels
+		self.created_at = time.time()
+		self.size = (
+			model.projection.nbytes + model.reference.nbytes + labels.nbytes
+			+ len(pickle.dumps((model.pca, clusterer), protocol=pickle.HIGHEST_PROTOCOL))
+		)
+
+
+class ProjectionCache:
+	"""
+		LRU cache of embedding projections and cluster models by fingerprint, bounded by their approximate size.
+		With a `directory` (PROJECTION_CACHE_DIR) entries are also written to disk: the projection and reference
+		matrices as .npy files, memory-mapped when read back, the PCA / HDBSCAN models as a pickle.
+		Only point the directory to a location the server owns, pickles are trusted on load.
+	"""
+
+	def __init__(self, max_bytes: int = 256 * 1024 * 1024, directory: Optional[str] = None):
+		self._cache = LRUCache(maxsize=max_bytes, getsizeof=lambda entry: entry.size)
+		self._lock = threading.Lock()
+		self.max_bytes = max_bytes
+		self.directory = Path(directory) if directory else None
+		if self.directory is not None:
+			self.directory.mkdir(parents=True, exist_ok=True)
+		self.hits = 0
+		self.disk_hits = 0
+		self.misses = 0
+		self.too_large = 0
+
+	def _paths(self, key: str) -> Dict[str, Path]:
+		return {name: self.directory / f"{key}.{name}" for name in ("projection.npy", "reference.npy", "model.pkl")}
+
+	def _load(self, key: str) -> Optional[CachedProjection]:
+		paths = self._paths(key)
+		if not all(path.exists() for path in paths.values()):
+			return None
+		try:
+			with paths["model.pkl"].open("rb") as f:
+				state = pickle.load(f)
+			model = ProjectionModel(
+				np.load(paths["projection.npy"], mmap_mode="r"),
+				np.load(paths["reference.npy"], mmap_mode="r"),
+				state["pca"], state["info"], state["neighbors"], state["n_jobs"]
+			)
+			return CachedProjection(model, state["clusterer"], state["labels"])
+		except Exception:
+			# unreadable or partially written entry, it is recomputed
+			return None
+
+	@staticmethod
+	def _replace(path: Path, write: Callable[[Any], None]):
+		"""
+			Write to a temporary file then rename it over `path`: readers never see a truncated file,
+			and the arrays already memory mapped by _load keep the previous file instead of faulting (SIGBUS)
+		"""
+		tmp_path = path.with_name(f"{path.name}.{secrets.token_hex(4)}.tmp")
+		try:
+			with tmp_path.open("wb") as f:
+				write(f)
+			os.replace(tmp_path, path)
+		except BaseException:
+			tmp_path.unlink(missing_ok=True)
+			raise
+
+	def _save(self, key: str, entry: CachedProjection):
+		paths = self._paths(key)
+		model = entry.model
+		self._replace(paths["projection.npy"], lambda f: np.save(f, np.asarray(model.projection)))
+		self._replace(paths["reference.npy"], lambda f: np.save(f, np.asarray(model.reference)))
+		# the pickle is replaced last: a new entry is only loaded once its arrays are complete
+		self._replace(paths["model.pkl"], lambda f: pickle.dump({
+			"pca": model.pca,
+			"info": model.info,
+			"neighbors": model.neighbors,
+			"n_jobs": model.n_jobs,
+			"clusterer": entry.clusterer,
+			"labels": entry.labels
+		}, f, protocol=pickle.HIGHEST_PROTOCOL))
+
+	def get(self, key: str) -> Optional[CachedProjection]:
+		with self._lock:
+			entry = self._cache.get(key)
+			if entry is not None:
+				self.hits += 1
+				return entry
+		entry = self._load(key) if self.directory is not None else None
+		with self._lock:
+			if entry is None:
+				self.misses += 1
+				return None
+			self.disk_hits += 1
+			try:
+				self._cache[key] = entry
+			except ValueError:
+				self.too_large += 1
+		return entry
+
+	def set(self, key: str, entry: CachedProjection) -> CachedProjection:
+		with self._lock:
+			try:
+				self._cache[key] = entry
+			except ValueError:
+				# larger than the whole cache
+				self.too_large += 1
+		if self.directory is not None:
+			self._save(key, entry)
+		return entry
+
+	def clear(self):
+		with self._lock:
+			self._cache.clear()
+
+	def stats(self) -> Dict[str, Any]:
+		with self._lock:
+			lookups = self.hits + self.disk_hits + self.misses
+			return {
+				"entries": len(self._cache),
+				"bytes": self._cache.currsize,
+				"max_bytes": self.max_bytes,
+				"directory": str(self.directory) if self.directory else None,
+				"hits": self.hits,
+				"disk_hits": self.disk_hits,
+				"misses": self.misses,
+				"hit_rate": (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+				"too_large": self.too_large,
+			}
+
+
+def new_projection_cache() -> ProjectionCache:
+	"""Projection cache sized from environment variables"""
+	return ProjectionCache(
+		max_bytes=int(os.getenv('PROJECTION_CACHE_MAX_BYTES', 256 * 1024 * 1024)),
+		directory=os.getenv('PROJECTION_CACHE_DIR') or None
+	)
@@ -0,0 +1,61 @@
+import os
+import json
+import time
+from typing import Dict, Any, List, Optional, Union
+from query_guard import QueryBudget
+
+# every query of a batch sees the same snapshot
+BATCH_TRANSACTION = "SET TRANSACTION ISOLATION LEVEL REPEATABLE READ, READ ONLY"
+
+
+def max_batch_queries() -> int:
+	return int(os.getenv('QUERY_BATCH_MAX_QUERIES', 20))
+
+
+def parse_queries(queries: Union[str, List[str]]) -> List[str]:
+	"""Queries given as a list or as a JSON array of strings, raise ValueError otherwise"""
+	if isinstance(queries, str):
+		try:
+			queries = json.loads(queries)
+		except json.JSONDecodeError as e:
+			raise ValueError(f"queries must be a JSON array of SQL strings: {e}")
+	if not isinstance(queries, list) or not queries or not all(isinstance(query, str) and query.strip() for query in queries):
+		raise ValueError("queries must be a non empty list of SQL strings")
+	if len(queries) > max_batch_queries():
+		raise ValueError(f"{len(queries)} queries given, at most {max_batch_queries()} run in one batch")
+	return queries
+
+
+def elapsed_ms(start: float) -> float:
+	return round((time.perf_counter() - start) * 1000, 3)
+
+
+def fetch_limit(budget: Optional[QueryBudget] = None) -> Optional[int]:
+	"""Rows to fetch per query: one more than max_rows to detect the truncation, None for every row"""
+	return budget.max_rows + 1 if budget is not None and budget.max_rows else None
+
+
+def query_result(rows: List[tuple], elapsed: float, budget: Optional[QueryBudget] = None) -> Dict[str, Any]:
+	"""Result of one query of a batch, cut at the budget max_rows"""
+	result = {"rows": rows, "row_count": len(rows), "elapsed_ms": elapsed}
+	if budget is not None and budget.max_rows and len(rows) > budget.max_rows:
+		result.update({"rows": rows[:budget.max_rows], "truncated": True, "max_rows": budget.max_rows})
+	return result
+
+
+def query_error(error: Exception, elapsed: Optional[float] = None) -> Dict[str, Any]:
+	return {"error": "query_failed", "reason": str(error).strip(), "elapsed_ms": elapsed}
+
+
+def batch_response(results: Dict[int, Dict[str, Any]], mode: str, start: float) -> Dict[str, Any]:
+	"""
+		results keyed by the index of their query. mode is "pipeline" (one round trip, elapsed_ms measured
+		by the server), "sequential" (one round trip per query) or "parallel" (one connection per query)
+	"""
+	return {
+		"mode": mode,
+		"snapshot": None if mode == "parallel" else "repeatable_read",
+		"elapsed_ms": elapsed_ms(start),
+		"errors": sum(1 for result in results.values() if "error" in result),
+		"results": dict(sorted(results.items()))
+	}
@@ -0,0 +1,160 @@
+import os
+from typing import Dict, Any, List, Optional, Tuple
+from materializations import CATALOG_TABLE
+from scratch_schemas import TABLES_CATALOG, SESSIONS_CATALOG
+
+# indexed columns of the core tables (database/00_init.sql), suggested as filters in rejections
+INDEXED_COLUMNS = {
+	"transactions": ["transaction_date", "customer_id", "article_id"],
+	"customers": ["customer_id"],
+	"articles": ["article_id"],
+}
+
+# tables the tools never drop or overwrite: the core tables and the server bookkeeping tables
+PROTECTED_TABLES = frozenset(list(INDEXED_COLUMNS) + [CATALOG_TABLE, TABLES_CATALOG, SESSIONS_CATALOG])
+
+
+def is_protected_table(table_name: str) -> bool:
+	name = table_name.strip().replace('"', '').lower()
+	if name.startswith("public."):
+		name = name[len("public."):]
+	return name in PROTECTED_TABLES
+
+
+class QueryRejected(Exception):
+	"""Raised when a query does not fit its budget, `details` is the structured error sent back to the agent"""
+
+	def __init__(self, details: Dict[str, Any]):
+		super().__init__(details.get("reason"))
+		self.details = details
+
+
+class QueryBudget:
+	"""
+		Execution budget of a tool:
+		- statement_timeout_ms / work_mem are applied with SET LOCAL on the query transaction
+		- max_rows caps the number of returned rows
+		- when explain is set, an EXPLAIN is run first and queries whose estimated cost or rows exceed
+		max_cost / max_estimated_rows are rejected before running
+	"""
+
+	def __init__(self, statement_timeout_ms: Optional[int] = 30000, work_mem: Optional[str] = None,
+				max_rows: Optional[int] = 10000, explain: bool = False,
+				max_cost: Optional[float] = 1e7, max_estimated_rows: Optional[float] = 1e6):
+		self.statement_timeout_ms = statement_timeout_ms
+		self.work_mem = work_mem
+		self.max_rows = max_rows
+		self.explain = explain
+		self.max_cost = max_cost
+		self.max_estimated_rows = max_estimated_rows
+
+	def as_dict(self) -> Dict[str, Any]:
+		return dict(vars(self))
+
+	def settings(self) -> List[Tuple[str, Any]]:
+		"""(sql, params) to run at the start of the transaction, valid for psycopg2 and psycopg 3"""
+		statements = []
+		if self.statement_timeout_ms:
+			statements.append(("SELECT set_config('statement_timeout', %s, true)", (f"{int(self.statement_timeout_ms)}ms",)))
+		if self.work_mem:
+			statements.append(("SELECT set_config('work_mem', %s, true)", (str(self.work_mem),)))
+		return statements
+
+	def check_plan(self, explain_result: Any):
+		"""Raise QueryRejected when the estimates of an `EXPLAIN (FORMAT JSON)` result exceed the budget"""
+		plan = explain_result[0]["Plan"]
+		cost, rows = plan.get("Total Cost", 0), plan.get("Plan Rows", 0)
+		reasons = []
+		if self.max_cost and cost > self.max_cost:
+			reasons.append(f"estimated cost {cost:.0f} exceeds the budget of {self.max_cost:.0f}")
+		if self.max_estimated_rows and rows > self.max_estimated_rows:
+			reasons.append(f"estimated {rows:.0f} rows exceed the budget of {self.max_estimated_rows:.0f}")
+		if reasons:
+			raise QueryRejected({
+				"error": "query_rejected",
+				"reason": ", ".join(reasons),
+				"estimated_cost": cost,
+				"estimated_rows": rows,
+				"budget": self.as_dict(),
+				"hints": plan_hints(plan)
+			})
+
+
+def is_cursor_query(query: str) -> bool:
+	"""Queries that can be DECLAREd as a server side cursor (DECLARE only accepts SELECT / VALUES)"""
+	words = query.lstrip(" \t\n(").split(None, 1)
+	return bool(words) and words[0].lower() in ("select", "with", "values", "table")
+
+
+def _env(tool: str, field: str, default: Optional[str]) -> Optional[str]:
+	return os.getenv(f"QUERY_BUDGET_{tool}_{field}", os.getenv(f"QUERY_BUDGET_{field}", default))
+
+
+def _number(value: Optional[str], cast):
+	return cast(value) if value not in (None, "", "0", "none") else None
+
+
+def budget_for(tool: str) -> QueryBudget:
+	"""
+		Budget of a tool from the environment, e.g. for tool "read_only_query":
+		QUERY_BUDGET_READ_ONLY_QUERY_MAX_ROWS overrides QUERY_BUDGET_MAX_ROWS which overrides the default.
+		Fields: STATEMENT_TIMEOUT_MS, WORK_MEM, MAX_ROWS, EXPLAIN, MAX_COST, MAX_ESTIMATED_ROWS (0 disables a limit)
+	"""
+	tool = tool.upper()
+	return QueryBudget(
+		statement_timeout_ms=_number(_env(tool, "STATEMENT_TIMEOUT_MS", "30000"), int),
+		work_mem=_env(tool, "WORK_MEM", None) or None,
+		max_rows=_number(_env(tool, "MAX_ROWS", "10000"), int),
+		explain=_env(tool, "EXPLAIN", "false").lower() in ("1", "true", "yes"),
+		max_cost=_number(_env(tool, "MAX_COST", "1e7"), float),
+		max_estimated_rows=_number(_env(tool, "MAX_ESTIMATED_ROWS", "1e6"), float)
+	)
+
+
+def _walk(plan: Dict[str, Any]):
+	yield plan
+	for child in plan.get("Plans", []):
+		yield from _walk(child)
+
+
+def plan_hints(plan: Dict[str, Any]) -> List[str]:
+	"""Actionable suggestions derived from the plan nodes"""
+	hints = []
+	for node in _walk(plan):
+		node_type = node.get("Node Type")
+		if node_type == "Nested Loop" and "Join Filter" not in node and not any(
+			"Index Cond" in child or "Filter" in child for child in node.get("Plans", [])
+		):
+			hints.append("the query looks like a cross join: add a join condition")
+		if node_type == "Seq Scan" and "Filter" not in node:
+			relation = node.get("Relation Name")
+			columns = INDEXED_COLUMNS.get(relation)
+			if columns:
+				hints.append(f"filter {relation} on an indexed column: {', '.join(columns)}")
+	if plan.get("Node Type") != "Limit":
+		hints.append("add a LIMIT or aggregate the rows (COUNT, AVG, GROUP BY...)")
+	hints.append("use run_read_only_query_stream to page through large results")
+	return list(dict.fromkeys(hints))
+
+
+def timeout_error(budget: QueryBudget, error: Exception) -> Dict[str, Any]:
+	"""Structured error for a query cancelled by statement_timeout"""
+	return {
+		"error": "statement_timeout",
+		"reason": f"the query ran for more than {budget.statement_timeout_ms}ms: {str(error).strip()}",
+		"budget": budget.as_dict(),
+		"hints": [
+			"add a LIMIT or a WHERE clause on an indexed column",
+			"pre-aggregate with create_table_from_query and query the smaller table"
+		]
+	}
+
+
+def truncated_response(rows: List[tuple], budget: QueryBudget) -> Dict[str, Any]:
+	"""Shape of read_only_query results cut at max_rows"""
+	return {
+		"rows": rows[:budget.max_rows],
+		"truncated": True,
+		"max_rows": budget.max_rows,
+		"hint": "add a LIMIT, aggregate, or use run_read_only_query_stream to read every row"
+	}
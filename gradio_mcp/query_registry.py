@@ -0,0 +1,103 @@
+import re
+import threading
+from psycopg2 import errors
+from pathlib import Path
+from typing import Dict, Any, List, Optional
+
+# resolved from this module so the server can be started from any working directory
+SQL_FILES_DIR = Path(__file__).resolve().parent / "sql_files"
+
+_PLACEHOLDER = re.compile(r"%\((\w+)\)s|%%")
+
+
+class NamedQuery:
+	"""
+		A `.sql` file of the registry.
+		`text` keeps the pyformat placeholders (`%(schema_name)s`) used by psycopg,
+		`positional_text` uses `$1, $2...` so it can be sent to PREPARE.
+	"""
+
+	def __init__(self, name: str, text: str):
+		self.name = name
+		self.text = text
+		self.statement_name = f"mcp_{name}"
+		self.param_names: List[str] = []
+
+		def to_positional(match):
+			if match.group(0) == "%%":
+				return "%"
+			param = match.group(1)
+			if param not in self.param_names:
+				self.param_names.append(param)
+			return f"${self.param_names.index(param) + 1}"
+
+		self.positional_text = _PLACEHOLDER.sub(to_positional, text).strip().rstrip(";")
+
+	def positional_params(self, params: Optional[Dict[str, Any]]) -> List[Any]:
+		params = params or {}
+		missing = [name for name in self.param_names if name not in params]
+		if missing:
+			raise ValueError(f"Missing parameters for query '{self.name}': {missing}")
+		return [params[name] for name in self.param_names]
+
+
+class QueryRegistry:
+	"""
+		Loads every `sql_files/*.sql` once and serves them by name (the file stem).
+		Files added to the directory later are picked up the first time their name is requested.
+	"""
+
+	def __init__(self, directory: Path = SQL_FILES_DIR):
+		self.directory = directory
+		self._queries: Dict[str, NamedQuery] = {}
+		self._lock = threading.Lock()
+		self.load()
+
+	def load(self):
+		"""(Re)scan the directory, already loaded queries are kept as they are"""
+		with self._lock:
+			for sql_path in sorted(self.directory.glob("*.sql")):
+				if sql_path.stem not in self._queries:
+					with sql_path.open("r", encoding="utf-8") as f:
+						self._queries[sql_path.stem] = NamedQuery(sql_path.stem, f.read())
+
+	def get(self, name: str) -> NamedQuery:
+		query = self._queries.get(name)
+		if query is None:
+			self.load()
+			query = self._queries.get(name)
+		if query is None:
+			raise KeyError(f"Unknown query '{name}', available queries: {self.names()}")
+		return query
+
+	def names(self) -> List[str]:
+		return sorted(self._queries)
+
+	def execute(self, conn, cur, name: str, params: Optional[Dict[str, Any]] = None):
+		"""
+			Execute a named query on a psycopg2 cursor as a server side prepared statement.
+			The statement is prepared the first time it is used on a pooled connection.
+		"""
+		query = self.get(name)
+		prepared = getattr(conn, "prepared_statements", None)
+		if prepared is None:
+			# not a pooled connection, no place to remember the statement
+			cur.execute(query.text, params)
+			return
+
+		values = query.positional_params(params)
+		placeholders = f" ({', '.join(['%s'] * len(values))})" if values else ""
+
+		if query.statement_name not in prepared:
+			cur.execute(f"PREPARE {query.statement_name} AS {query.positional_text}")
+			prepared.add(query.statement_name)
+		try:
+			cur.execute(f"EXECUTE {query.statement_name}{placeholders}", values)
+		except errors.InvalidSqlStatementName:
+			# the session lost the statement (DISCARD ALL, server side reset...), prepare it again
+			conn.rollback()
+			cur.execute(f"PREPARE {query.statement_name} AS {query.positional_text}")
+			cur.execute(f"EXECUTE {query.statement_name}{placeholders}", values)
+
+
+queries = QueryRegistry()
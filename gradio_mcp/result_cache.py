@@ -0,0 +1,153 @@
+import re
+import sys
+import time
+import threading
+from typing import Dict, Any, Tuple, Hashable, Optional, List, FrozenSet
+from cachetools import TLRUCache
+
+# string literals and quoted identifiers are kept verbatim, comments are dropped
+_SQL_TOKENS = re.compile(
+	r"(?P<literal>'(?:[^']|'')*')"
+	r"|(?P<quoted>\"(?:[^\"]|\"\")*\")"
+	r"|(?P<comment>--[^\n]*|/\*.*?\*/)"
+	r"|(?P<space>\s+)"
+	r"|(?P<other>[^'\"\s/-]+|[/-])",
+	re.DOTALL
+)
+_WORD = re.compile(r"[a-z_][a-z0-9_$]*")
+
+
+def normalize_sql(query: str) -> str:
+	"""Lower case, single spaced SQL without comments nor trailing semicolon, literals are untouched"""
+	parts = []
+	for match in _SQL_TOKENS.finditer(query):
+		kind = match.lastgroup
+		if kind in ("comment", "space"):
+			if parts and parts[-1] != " ":
+				parts.append(" ")
+		elif kind == "other":
+			parts.append(match.group(0).lower())
+		else:
+			parts.append(match.group(0))
+	return "".join(parts).strip().rstrip(";").strip()
+
+
+def referenced_names(normalized_query: str) -> FrozenSet[str]:
+	"""
+		Every identifier of the query outside literals. It is a superset of the tables it reads,
+		which is what invalidation needs: a stale entry is worse than an extra cache miss.
+	"""
+	names = set()
+	for match in _SQL_TOKENS.finditer(normalized_query):
+		if match.lastgroup == "other":
+			names.update(_WORD.findall(match.group(0)))
+		elif match.lastgroup == "quoted":
+			names.add(match.group(0)[1:-1].replace('""', '"'))
+	return frozenset(names)
+
+
+def estimate_size(rows: List[tuple]) -> int:
+	"""Approximate memory used by a result, in bytes"""
+	size = sys.getsizeof(rows)
+	for row in rows:
+		size += sys.getsizeof(row)
+		for value in row:
+			size += sys.getsizeof(value)
+	return size
+
+
+class CachedResult:
+	def __init__(self, rows: List[tuple], ttl: float, names: FrozenSet[str]):
+		self.rows = rows
+		self.ttl = ttl
+		self.names = names
+		self.created_at = time.time()
+		self.size = estimate_size(rows)
+
+
+class ResultCache:
+	"""
+		Opt-in cache of read_only_query results keyed by (target, normalized SQL).
+		Bounded by the approximate size of the cached rows (LRU eviction) with a TTL per entry.
+	"""
+
+	def __init__(self, max_bytes: int = 64 * 1024 * 1024, ttl: float = 60.0):
+		self._cache = TLRUCache(
+			maxsize=max_bytes,
+			ttu=lambda key, value, now: now + value.ttl,
+			getsizeof=lambda value: value.size
+		)
+		self._lock = threading.Lock()
+		self.max_bytes = max_bytes
+		self.ttl = ttl
+		self.hits = 0
+		self.misses = 0
+		self.invalidations = 0
+		self.too_large = 0
+
+	@staticmethod
+	def key(target: Hashable, query: str) -> Tuple[Hashable, str]:
+		return (target, normalize_sql(query))
+
+	def get(self, target: Hashable, query: str) -> Optional[CachedResult]:
+		key = self.key(target, query)
+		with self._lock:
+			entry = self._cache.get(key)
+			if entry is None:
+				self.misses += 1
+			else:
+				self.hits += 1
+			return entry
+
+	def set(self, target: Hashable, query: str, rows: List[tuple], ttl: Optional[float] = None) -> CachedResult:
+		key = self.key(target, query)
+		entry = CachedResult(rows, ttl or self.ttl, referenced_names(key[1]))
+		with self._lock:
+			try:
+				self._cache[key] = entry
+			except ValueError:
+				# larger than the whole cache
+				self.too_large += 1
+		return entry
+
+	def invalidate_table(self, target: Hashable, table_name: str):
+		"""Drop the entries of `target` whose query mentions `table_name`"""
+		name = table_name.strip().strip('"').split(".")[-1].lower()
+		with self._lock:
+			for key in [key for key, entry in self._cache.items() if key[0] == target and name in entry.names]:
+				self._cache.pop(key, None)
+			self.invalidations += 1
+
+	def invalidate(self, target: Hashable = None):
+		"""Drop every entry of `target`, or the whole cache when no target is given"""
+		with self._lock:
+			if target is None:
+				self._cache.clear()
+			else:
+				for key in [key for key in self._cache.keys() if key[0] == target]:
+					self._cache.pop(key, None)
+			self.invalidations += 1
+
+	def stats(self) -> Dict[str, Any]:
+		with self._lock:
+			lookups = self.hits + self.misses
+			return {
+				"entries": len(self._cache),
+				"bytes": self._cache.currsize,
+				"max_bytes": self.max_bytes,
+				"ttl": self.ttl,
+				"hits": self.hits,
+				"misses": self.misses,
+				"hit_rate": self.hits / lookups if lookups else 0.0,
+				"invalidations": self.invalidations,
+				"too_large": self.too_large,
+			}
+
+
+def cached_response(entry: CachedResult, from_cache: bool) -> Dict[str, Any]:
+	"""Shape of read_only_query results when the cache is used"""
+	return {
+		"rows": entry.rows,
+		"from_cache": from_cache,
+		"age_seconds": round(time.time() - entry.created_at, 3)
+	}
@@ -0,0 +1,145 @@
+import json
+import base64
+import datetime
+from decimal import Decimal
+from typing import Dict, Any, List, Optional
+
+OUTPUT_FORMATS = ("columnar_json", "arrow", "parquet")
+
+# postgres type oids -> (json type name, arrow type factory)
+_BOOL, _INT2, _INT4, _INT8 = 16, 21, 23, 20
+_FLOAT4, _FLOAT8, _NUMERIC = 700, 701, 1700
+_DATE, _TIMESTAMP, _TIMESTAMPTZ = 1082, 1114, 1184
+_JSON, _JSONB = 114, 3802
+
+
+def _column_type(column) -> str:
+	"""Type name of a cursor description column, shared by the JSON and Arrow encoders"""
+	type_code = column.type_code
+	if type_code == _BOOL:
+		return "bool"
+	if type_code in (_INT2, _INT4, _INT8):
+		return "int64"
+	if type_code in (_FLOAT4, _FLOAT8):
+		return "float64"
+	if type_code == _NUMERIC:
+		return "decimal" if column.precision and column.precision <= 38 else "float64"
+	if type_code == _DATE:
+		return "date"
+	if type_code in (_TIMESTAMP, _TIMESTAMPTZ):
+		return "timestamp"
+	if type_code in (_JSON, _JSONB):
+		return "json"
+	return "string"
+
+
+def _json_value(value: Any, column_type: str) -> Any:
+	if value is None:
+		return None
+	if column_type == "decimal" or isinstance(value, Decimal):
+		return float(value)
+	if column_type in ("date", "timestamp") or isinstance(value, (datetime.date, datetime.datetime)):
+		return value.isoformat()
+	if column_type == "json":
+		return value
+	if column_type == "string" and not isinstance(value, str):
+		return str(value)
+	return value
+
+
+class ColumnarEncoder:
+	"""
+		Builds a column oriented result from cursor batches without keeping the rows as tuples:
+		- columnar_json: {"columns": [{"name", "type"}], "data": [[values of column 0], ...]}
+		- arrow: Arrow IPC stream, pandas can read it with pyarrow.ipc.open_stream(buffer).read_pandas()
+		- parquet: single parquet file
+		Arrow and parquet need pyarrow and are returned as bytes.
+	"""
+
+	def __init__(self, description, output_format: str = "columnar_json"):
+		if output_format not in OUTPUT_FORMATS:
+			raise ValueError(f"Unknown output format '{output_format}', expected one of {OUTPUT_FORMATS}")
+		self.output_format = output_format
+		self.names = [column.name for column in description]
+		self.types = [_column_type(column) for column in description]
+		self.rows = 0
+
+		if output_format == "columnar_json":
+			self._data: List[List[Any]] = [[] for _ in self.names]
+		else:
+			import pyarrow as pa
+			self._pa = pa
+			self.schema = pa.schema([
+				pa.field(name, self._arrow_type(column, column_type))
+				for name, column, column_type in zip(self.names, description, self.types)
+			])
+			self._sink = pa.BufferOutputStream()
+			if output_format == "arrow":
+				self._writer = pa.ipc.new_stream(self._sink, self.schema)
+			else:
+				import pyarrow.parquet as pq
+				self._writer = pq.ParquetWriter(self._sink, self.schema)
+
+	def _arrow_type(self, column, column_type: str):
+		pa = self._pa
+		if column_type == "decimal":
+			return pa.decimal128(column.precision, column.scale or 0)
+		return {
+			"bool": pa.bool_(),
+			"int64": pa.int64(),
+			"float64": pa.float64(),
+			"date": pa.date32(),
+			"timestamp": pa.timestamp("us", tz="UTC" if column.type_code == _TIMESTAMPTZ else None),
+		}.get(column_type, pa.string())
+
+	def add_batch(self, rows: List[tuple]):
+		if not rows:
+			return
+		self.rows += len(rows)
+		columns = list(zip(*rows))
+		if self.output_format == "columnar_json":
+			for i, values in enumerate(columns):
+				column_type = self.types[i]
+				self._data[i].extend(_json_value(value, column_type) for value in values)
+			return
+
+		arrays = []
+		for i, values in enumerate(columns):
+			field = self.schema.field(i)
+			if self.types[i] in ("string", "json"):
+				values = [None if v is None else (v if isinstance(v, str) else json.dumps(v, default=str)) for v in values]
+			elif self.types[i] == "float64":
+				# NUMERIC without precision (avg, sum...) arrives as Decimal, pyarrow refuses it for float64
+				values = [None if v is None else float(v) for v in values]
+			arrays.append(self._pa.array(values, type=field.type))
+		self._writer.write_batch(self._pa.RecordBatch.from_arrays(arrays, schema=self.schema))
+
+	def finish(self) -> Any:
+		"""The columnar_json dict, or the arrow / parquet bytes"""
+		if self.output_format == "columnar_json":
+			return {
+				"columns": [{"name": n, "type": t} for n, t in zip(self.names, self.types)],
+				"row_count": self.rows,
+				"data": self._data
+			}
+		self._writer.close()
+		return self._sink.getvalue().to_pybytes()
+
+
+def encoded_response(encoder: ColumnarEncoder, truncated: bool = False, max_rows: Optional[int] = None) -> Dict[str, Any]:
+	"""MCP friendly shape: binary formats are base64 encoded"""
+	payload = encoder.finish()
+	if encoder.output_format == "columnar_json":
+		response = payload
+	else:
+		response = {
+			"format": encoder.output_format,
+			"encoding": "base64",
+			"row_count": encoder.rows,
+			"columns": [{"name": n, "type": t} for n, t in zip(encoder.names, encoder.types)],
+			"data": base64.b64encode(payload).decode("ascii")
+		}
+	if truncated:
+		response["truncated"] = True
+		response["max_rows"] = max_rows
+	return response
@@ -0,0 +1,126 @@
+import os
+import time
+import secrets
+import asyncio
+from typing import Dict, Any, List, Optional
+
+
+class PageBudget:
+	"""Hard limits of a single page: number of rows and approximate rendered size in bytes"""
+
+	def __init__(self, max_rows: Optional[int] = None, max_bytes: Optional[int] = None):
+		self.max_rows = max_rows or int(os.getenv('QUERY_PAGE_MAX_ROWS', 500))
+		self.max_bytes = max_bytes or int(os.getenv('QUERY_PAGE_MAX_BYTES', 256 * 1024))
+
+	def fill(self, page: List[tuple], page_bytes: int, rows: List[tuple]):
+		"""
+			Move rows into `page` while the budget allows it.
+			Returns (page_bytes, leftover rows, reason) where reason is "rows", "bytes" or None.
+			A page always gets at least one row so a single huge row cannot block the stream.
+		"""
+		for i, row in enumerate(rows):
+			if len(page) >= self.max_rows:
+				return page_bytes, rows[i:], "rows"
+			# the tools render results with str(), measure the same thing
+			row_bytes = len(str(row).encode("utf-8"))
+			if page and page_bytes + row_bytes > self.max_bytes:
+				return page_bytes, rows[i:], "bytes"
+			page.append(row)
+			page_bytes += row_bytes
+		return page_bytes, [], None
+
+
+class AsyncResultStream:
+	"""
+		A query kept open on a pooled connection through a server side (named) cursor.
+		Rows are read with fetchmany so memory is bounded by the batch size, not by the result size.
+	"""
+
+	def __init__(self, pool, conn, cursor, query: str):
+		self.token = secrets.token_urlsafe(16)
+		self.pool = pool
+		self.conn = conn
+		self.cursor = cursor
+		self.query = query
+		self.columns = [col.name for col in cursor.description] if cursor.description else []
+		self.pending: List[tuple] = []
+		self.page = 0
+		self.rows_sent = 0
+		self.exhausted = False
+		self.last_used = time.monotonic()
+		self.lock = asyncio.Lock()
+
+	async def next_page(self, budget: PageBudget, batch_size: int) -> Dict[str, Any]:
+		self.last_used = time.monotonic()
+		rows, page_bytes, truncated_by = [], 0, None
+
+		page_bytes, self.pending, truncated_by = budget.fill(rows, page_bytes, self.pending)
+		while truncated_by is None and not self.exhausted:
+			size = min(batch_size, budget.max_rows - len(rows)) or 1
+			batch = await self.cursor.fetchmany(size)
+			if len(batch) < size:
+				self.exhausted = True
+			page_bytes, self.pending, truncated_by = budget.fill(rows, page_bytes, batch)
+
+		self.page += 1
+		self.rows_sent += len(rows)
+		has_more = bool(self.pending) or not self.exhausted
+		return {
+			"columns": self.columns,
+			"rows": rows,
+			"page": self.page,
+			"rows_sent": self.rows_sent,
+			"page_bytes": page_bytes,
+			"truncated_by": truncated_by,
+			"continuation_token": self.token if has_more else None
+		}
+
+	async def close(self):
+		try:
+			await self.cursor.close()
+			await self.conn.rollback()
+		except Exception:
+			pass
+		await self.pool.putconn(self.conn)
+
+
+class AsyncResultStreams:
+	"""
+		Open result streams by continuation token.
+		Each stream holds a pooled connection, so their number is capped and idle ones expire.
+	"""
+
+	def __init__(self, max_open: Optional[int] = None, idle_timeout: Optional[float] = None):
+		self.max_open = max_open or int(os.getenv('QUERY_STREAM_MAX_OPEN', 4))
+		self.idle_timeout = idle_timeout or float(os.getenv('QUERY_STREAM_TTL', 300))
+		self._streams: Dict[str, AsyncResultStream] = {}
+
+	def get(self, token: str) -> Optional[AsyncResultStream]:
+		return self._streams.get(token)
+
+	async def add(self, stream: AsyncResultStream):
+		await self.expire()
+		while len(self._streams) >= self.max_open:
+			# make room by closing the least recently used stream
+			oldest = min(self._streams.values(), key=lambda s: s.last_used)
+			await self.discard(oldest.token)
+		self._streams[stream.token] = stream
+
+	async def discard(self, token: str) -> bool:
+		stream = self._streams.pop(token, None)
+		if stream is None:
+			return False
+		await stream.close()
+		return True
+
+	async def expire(self):
+		now = time.monotonic()
+		for token in [t for t, s in self._streams.items() if now - s.last_used > self.idle_timeout]:
+			await self.discard(token)
+
+	async def close_all(self):
+		for token in list(self._streams):
+			await self.discard(token)
+
+	def __len__(self):
+		return len(self._streams)
@@ -0,0 +1,263 @@
+import os
+import re
+import math
+import secrets
+from typing import Dict, Any, List, Optional, Union
+from materializations import CLAUSE_KEYWORDS
+
+SAMPLE_METHODS = ("system", "bernoulli")
+# two sided 95% normal quantile of the confidence bounds
+Z_95 = 1.959964
+
+# planner estimate of the rows of each table, a catalog lookup instead of a COUNT(*). A table that was never analyzed
+# has no reltuples: its rows are estimated from its size and column widths, as the planner does, -1 when it does not exist
+ESTIMATED_ROWS_QUERY = """
+	SELECT t.name, CASE
+		WHEN c.oid IS NULL THEN -1
+		WHEN c.reltuples >= 0 AND c.relpages > 0 THEN c.reltuples
+		ELSE pg_relation_size(c.oid) / current_setting('block_size')::float8
+			* (current_setting('block_size')::float8 - 24) / (28 + (
+				SELECT coalesce(sum(CASE WHEN a.attlen > 0 THEN a.attlen ELSE 32 END), 0)
+				FROM pg_attribute a WHERE a.attrelid = c.oid AND a.attnum > 0 AND NOT a.attisdropped
+			))
+	END
+	FROM unnest(%s::text[]) AS t(name) LEFT JOIN pg_class c ON c.oid = to_regclass(t.name)
+"""
+
+_TABLESAMPLE_AFTER = re.compile(r"\s+tablesample\b", re.IGNORECASE)
+# string literals (E'' ones with backslash escapes), quoted identifiers, dollar quoted bodies and comments
+_NOT_CODE = re.compile(
+	r"\b[Ee]'(?:[^'\\]|\\.|'')*'|'(?:[^']|'')*'|\"(?:[^\"]|\"\")*\""
+	r"|\$([A-Za-z_][A-Za-z0-9_]*)?\$.*?\$\1\$|--[^\n]*|/\*.*?\*/",
+	re.DOTALL
+)
+
+
+def sampled_tables() -> List[str]:
+	"""Base tables large enough for sampling to pay off, SAMPLE_TABLES (comma separated) overrides them"""
+	return [t.strip().lower() for t in os.getenv('SAMPLE_TABLES', 'transactions,customers').split(",") if t.strip()]
+
+
+def _table_reference(table: str):
+	# `FROM table [AS] alias [(column aliases)]` / `JOIN ...`, the alias must not be the next clause keyword
+	return re.compile(
+		rf"\b(from|join)\s+((?:public\.)?{re.escape(table)})\b"
+		rf"(?:\s+(?:as\s+)?(?!(?:{'|'.join(CLAUSE_KEYWORDS)})\b)([A-Za-z_][A-Za-z0-9_]*)(\s*\([^()]*\))?)?",
+		re.IGNORECASE
+	)
+
+
+def _code(query: str) -> str:
+	"""The query with its literals, quoted identifiers and comments blanked out, the positions are kept"""
+	return _NOT_CODE.sub(lambda match: " " * len(match.group(0)), query)
+
+
+def _outer_references(table: str, code: str) -> List[re.Match]:
+	"""Scans of `table` by the outer query, not by a subquery or a CTE (inside parentheses)"""
+	return [
+		match for match in _table_reference(table).finditer(code)
+		if code.count("(", 0, match.start()) == code.count(")", 0, match.start())
+	]
+
+
+class TableSample:
+	"""
+		Requested sample of the fact table of a query: `rate` (fraction of the rows, 0 < rate <= 1) or
+		`target_rows` (rows to read from the sampled table, converted to a rate with the planner estimate),
+		TABLESAMPLE `method` (SYSTEM picks whole pages: fastest, BERNOULLI picks rows: more accurate)
+		and REPEATABLE `seed`, random when not given and returned so the same sample can be read again.
+	"""
+
+	def __init__(self, rate: Optional[float] = None, target_rows: Optional[int] = None, method: Optional[str] = None,
+			seed: Optional[int] = None):
+		self.rate = rate
+		self.target_rows = target_rows
+		self.method = (method or os.getenv('SAMPLE_METHOD', 'system')).strip().lower()
+		self.seed = secrets.randbelow(2 ** 31) if seed is None else seed
+		if self.method not in SAMPLE_METHODS:
+			raise ValueError(f"Unknown sample method '{method}', use one of {list(SAMPLE_METHODS)}")
+		if (rate is None) == (target_rows is None):
+			raise ValueError("give either a sample rate or a target row count")
+		if rate is not None and not 0 < rate <= 1:
+			raise ValueError(f"sample rate {rate} must be in ]0, 1]")
+		if target_rows is not None and target_rows < 1:
+			raise ValueError(f"target row count {target_rows} must be positive")
+
+	@classmethod
+	def parse(cls, sample: Union[str, float, int, None], method: Optional[str] = None,
+			seed: Union[str, int, None] = None) -> Optional["TableSample"]:
+		"""
+			None when no sample is requested (empty, 0 or 100%).
+			"0.01", "1%" or 0.01 are rates, "50000" or 50000 a target row count. Raise ValueError otherwise
+		"""
+		seed = None if seed is None or str(seed).strip() in ("", "-1") else int(str(seed).strip())
+		if isinstance(sample, str):
+			sample = sample.strip().lower().replace("rows", "").strip()
+			if not sample:
+				return None
+			try:
+				sample = float(sample[:-1]) / 100 if sample.endswith("%") else float(sample)
+			except ValueError:
+				raise ValueError(f"Invalid sample '{sample}': give a rate (0.01, 1%) or a row count (50000)")
+		if not sample or sample == 1:
+			return None
+		if sample < 1:
+			return cls(rate=float(sample), method=method, seed=seed)
+		return cls(target_rows=int(sample), method=method, seed=seed)
+
+	def rate_for(self, estimated_rows: float) -> float:
+		"""Sampling rate of a table, 1 (the table is read entirely) when it is small or was never analyzed"""
+		if self.rate is not None:
+			return self.rate
+		if estimated_rows <= 0:
+			return 1.0
+		return min(1.0, self.target_rows / estimated_rows)
+
+	def clause(self, rate: float) -> str:
+		return f"TABLESAMPLE {self.method.upper()} ({rate * 100:.6g}) REPEATABLE ({self.seed})"
+
+	def describe(self, table: Optional[str], estimated_rows: Dict[str, float]) -> Dict[str, Any]:
+		"""
+			Method, seed and rate / estimated rows of the sampled `table`, the "sample" part of the sampled results.
+			The other tables of `estimated_rows` are read entirely, "exact" when `table` is not sampled either
+		"""
+		tables, warnings = {}, []
+		if table is not None:
+			rows = estimated_rows[table]
+			rate = self.rate_for(rows)
+			tables[table] = {
+				"rate": round(rate, 8),
+				"estimated_rows": int(rows) if rows >= 0 else None,
+				"estimated_sampled_rows": int(rows * rate) if rows >= 0 else None,
+				"scale_factor": round(1 / rate, 4)
+			}
+			if rate >= 1:
+				warnings.append(
+					f"{table} has about {max(int(rows), 0)} rows, no more than the requested sample: it was read entirely"
+				)
+		return {
+			"method": self.method,
+			"seed": self.seed,
+			"tables": tables,
+			"unsampled_tables": [name for name in estimated_rows if name != table],
+			"exact": all(info["rate"] >= 1 for info in tables.values()),
+			"warnings": warnings
+		}
+
+
+def referenced_tables(query: str, tables: Optional[List[str]] = None) -> List[str]:
+	"""The large base tables (sampled_tables) scanned by the outer query"""
+	code = _code(query)
+	return [table for table in (tables or sampled_tables()) if _outer_references(table, code)]
+
+
+def fact_table(estimated_rows: Dict[str, float]) -> Optional[str]:
+	"""
+		The largest of the referenced tables, the only one sampled: sampling both sides of a join would keep
+		rate² of the joined rows, and the rows matched by the other tables must not change
+	"""
+	return max(estimated_rows, key=estimated_rows.get) if estimated_rows else None
+
+
+def rewrite_query(query: str, sample: TableSample, table: str, estimated_rows: float) -> str:
+	"""
+		Add the TABLESAMPLE clause to the scan of `table` by the outer query, after its alias and column aliases.
+		Raise ValueError when the query cannot be rewritten safely
+	"""
+	query = query.strip().rstrip(";")
+	rate = sample.rate_for(estimated_rows)
+	if rate >= 1:
+		return query
+	code = _code(query)
+	references = _outer_references(table, code)
+	if len(references) != 1:
+		raise ValueError(f"the query scans {table} {len(references)} times, sample a query reading it once")
+	match = references[0]
+	if _TABLESAMPLE_AFTER.match(code, match.end()):
+		raise ValueError(f"the query already samples {table}, remove its TABLESAMPLE clause or the sample")
+	alias = match.group(3) or table
+	column_aliases = query[match.start(4):match.end(4)] if match.group(4) else ""
+	return (
+		f"{query[:match.start()]}{match.group(1)} {match.group(2)} AS {alias}{column_aliases} {sample.clause(rate)}"
+		f"{query[match.end():]}"
+	)
+
+
+def sample_query(query: str, sample: TableSample, estimated_rows: Dict[str, float]):
+	"""
+		(sampled query, sample description) of a read query, `estimated_rows` are the estimates of its referenced_tables.
+		Only the fact table is sampled, joined tables and subqueries are read entirely. Raise ValueError like rewrite_query
+	"""
+	table = fact_table(estimated_rows)
+	description = sample.describe(table, estimated_rows)
+	if table is None:
+		code = _code(query)
+		nested = [name for name in sampled_tables() if _table_reference(name).search(code)]
+		if nested:
+			description["warnings"].append(
+				f"the large tables ({', '.join(nested)}) are only read by subqueries, which are not sampled: the result is exact"
+			)
+		return query.strip().rstrip(";"), description
+	return rewrite_query(query, sample, table, estimated_rows[table]), description
+
+
+def mean_margin(n: float, var: float, rate: float, z: float = Z_95) -> float:
+	"""Half width of the confidence interval of a mean over n sampled rows, with the finite population correction"""
+	if n <= 0:
+		return math.inf
+	return z * math.sqrt(var / n * (1 - rate))
+
+
+def count_relative_error(sampled_rows: float, rate: float, z: float = Z_95) -> Optional[float]:
+	"""Relative half width of the confidence interval of a count (or sum) scaled up from `sampled_rows`"""
+	if sampled_rows <= 0:
+		return None
+	return z * math.sqrt((1 - rate) / sampled_rows)
+
+
+def _method_note(method: str) -> str:
+	if method == "system":
+		return (
+			"SYSTEM samples whole pages: rows stored together are picked together, so the bounds are optimistic "
+			"when the measured values are clustered on disk, use sample_method='bernoulli' to check a conclusion"
+		)
+	return "BERNOULLI samples rows independently, the bounds assume a simple random sample"
+
+
+def query_confidence(description: Dict[str, Any], z: float = Z_95) -> Dict[str, Any]:
+	"""Bounds of the sampled run_read_only_query results, which may hold any expression"""
+	return {
+		"level": 0.95,
+		"table_count_relative_error": {
+			table: round(count_relative_error(info["estimated_sampled_rows"] or 0, info["rate"], z) or 0, 6)
+			for table, info in description["tables"].items()
+		},
+		"hint": (
+			"Only the table of 'tables' is sampled, the joined tables and the subqueries are read entirely: "
+			"COUNT and SUM of the result must be multiplied by its scale_factor. For a group of n sampled rows, "
+			"the 95% relative error of its count or sum is 1.96 * sqrt((1 - rate) / n), and the margin of its mean "
+			"is 1.96 * stddev / sqrt(n) * sqrt(1 - rate): select count(*) and stddev() with your aggregates to get them. "
+			"Averages and ratios need no scaling. Run the exact query before drawing a final conclusion."
+		),
+		"note": _method_note(description["method"])
+	}
+
+
+def group_confidence(groups, n, mean, var, rate: float, method: str, z: float = Z_95) -> Dict[str, Any]:
+	"""Bounds of the group means of a sampled ANOVA / Tukey test: {group: [lower, upper]}"""
+	bounds = {}
+	for group, count, group_mean, group_var in zip(groups, n, mean, var):
+		margin = mean_margin(count, group_var, rate, z)
+		bounds[str(group)] = [round(float(group_mean - margin), 4), round(float(group_mean + margin), 4)]
+	return {"level": 0.95, "group_means": bounds, "note": _method_note(method)}
+
+
+def sampled_response(result, description: Dict[str, Any]):
+	"""Attach the sample description and confidence bounds to a read_only_query result, errors are returned as is"""
+	if isinstance(result, str) or (isinstance(result, dict) and "error" in result):
+		return result
+	response = dict(result) if isinstance(result, dict) else {"rows": result}
+	response["sample"] = description
+	if not description["exact"]:
+		response["confidence"] = query_confidence(description)
+	return response
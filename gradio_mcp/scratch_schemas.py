@@ -0,0 +1,134 @@
+import os
+import time
+import hashlib
+from typing import Dict, Any, List, Optional, Tuple
+
+# the tables an MCP session creates live in its own schema, mcp_scratch_<hash of the session id>
+SCHEMA_PREFIX = "mcp_scratch_"
+
+# postgres does not record when a table was created: creation time and expiry of every scratch table
+TABLES_CATALOG = "mcp_scratch_tables"
+# last activity of every session, shared by the server processes using the same database
+SESSIONS_CATALOG = "mcp_scratch_sessions"
+CATALOG_DDL = (
+	f"""
+	CREATE TABLE IF NOT EXISTS {TABLES_CATALOG} (
+		schema_name TEXT NOT NULL,
+		table_name TEXT NOT NULL,
+		row_count BIGINT,
+		bytes BIGINT NOT NULL DEFAULT 0,
+		unlogged BOOLEAN NOT NULL DEFAULT true,
+		created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+		expires_at TIMESTAMPTZ NOT NULL,
+		PRIMARY KEY (schema_name, table_name)
+	)
+	""",
+	f"""
+	CREATE TABLE IF NOT EXISTS {SESSIONS_CATALOG} (
+		schema_name TEXT PRIMARY KEY,
+		last_seen TIMESTAMPTZ NOT NULL DEFAULT now()
+	)
+	""",
+)
+TABLE_COLUMNS = ("table_name", "row_count", "bytes", "unlogged", "created_at", "expires_at")
+
+SCHEMA_BYTES_QUERY = """
+	SELECT coalesce(sum(pg_total_relation_size(c.oid)), 0)
+	FROM pg_class c JOIN pg_namespace n ON n.oid = c.relnamespace
+	WHERE n.nspname = %s AND c.relkind IN ('r', 'm', 'p')
+"""
+TOUCH_SESSION_QUERY = f"""
+	INSERT INTO {SESSIONS_CATALOG} (schema_name, last_seen) VALUES (%s, to_timestamp(%s))
+	ON CONFLICT (schema_name) DO UPDATE SET last_seen = greatest({SESSIONS_CATALOG}.last_seen, EXCLUDED.last_seen)
+"""
+EXPIRED_TABLES_QUERY = f"SELECT schema_name, table_name FROM {TABLES_CATALOG} WHERE expires_at < now()"
+# sessions idle for too long, and schemas left without a session row (server crash before its first reap)
+ENDED_SESSIONS_QUERY = f"""
+	SELECT n.nspname
+	FROM pg_namespace n LEFT JOIN {SESSIONS_CATALOG} s ON s.schema_name = n.nspname
+	WHERE starts_with(n.nspname, %s)
+	AND coalesce(s.last_seen, 'epoch') < now() - make_interval(secs => %s)
+"""
+
+
+class ScratchPolicy:
+	"""
+		Limits of the session scratch schemas, defaults from the SCRATCH_* environment variables:
+		- table_ttl: seconds a scratch table is kept after its creation
+		- session_ttl: seconds without activity after which a session is over and its schema dropped
+		- max_bytes: total size of the tables of one session schema (0 disables the quota)
+		- unlogged: scratch tables are UNLOGGED, no WAL is written but they are emptied after a crash
+		- reap_interval: seconds between two runs of the reaper (0 disables it)
+	"""
+
+	def __init__(self, table_ttl: Optional[float] = None, session_ttl: Optional[float] = None,
+			max_bytes: Optional[int] = None, unlogged: Optional[bool] = None, reap_interval: Optional[float] = None):
+		self.table_ttl = float(os.getenv('SCRATCH_TABLE_TTL', 24 * 3600)) if table_ttl is None else table_ttl
+		self.session_ttl = float(os.getenv('SCRATCH_SESSION_TTL', 2 * 3600)) if session_ttl is None else session_ttl
+		self.max_bytes = int(os.getenv('SCRATCH_MAX_BYTES', 1024 ** 3)) if max_bytes is None else max_bytes
+		self.unlogged = os.getenv('SCRATCH_UNLOGGED', 'true').lower() in ('1', 'true', 'yes') if unlogged is None else unlogged
+		self.reap_interval = float(os.getenv('SCRATCH_REAP_INTERVAL', 300)) if reap_interval is None else reap_interval
+
+	def as_dict(self) -> Dict[str, Any]:
+		return dict(vars(self))
+
+
+def schema_for(session_id: str) -> str:
+	"""Scratch schema of a session, session ids are not valid identifiers so they are hashed"""
+	return SCHEMA_PREFIX + hashlib.sha256(session_id.encode("utf-8")).hexdigest()[:16]
+
+
+def split_table_name(table_name: str) -> Tuple[Optional[str], str]:
+	"""("schema", "table") of a possibly qualified table name, lower cased as postgres folds unquoted names"""
+	name = table_name.strip().replace('"', '').lower()
+	schema, _, table = name.rpartition(".")
+	return schema or None, table
+
+
+def is_scratch_schema(schema_name: Optional[str]) -> bool:
+	return bool(schema_name) and schema_name.startswith(SCHEMA_PREFIX)
+
+
+def quota_error(schema_name: str, used: int, max_bytes: int) -> str:
+	return (
+		f"❌ Scratch quota exceeded: the tables of {schema_name} would use {used / 1024 ** 2:.1f} MB "
+		f"out of {max_bytes / 1024 ** 2:.1f} MB, drop tables you no longer need or select fewer columns / rows"
+	)
+
+
+class ScratchSessions:
+	"""
+		Last activity of the sessions this process served. It is kept in memory so the tools pay nothing,
+		and written to mcp_scratch_sessions by the reaper before it looks for ended sessions.
+	"""
+
+	def __init__(self):
+		self._last_seen: Dict[str, float] = {}
+
+	def touch(self, session_id: str) -> str:
+		schema = schema_for(session_id)
+		self._last_seen[schema] = time.time()
+		return schema
+
+	def forget(self, schema_name: str):
+		self._last_seen.pop(schema_name, None)
+
+	def pending(self) -> List[Tuple[str, float]]:
+		"""(schema, last seen) to write to the sessions catalog"""
+		return list(self._last_seen.items())
+
+	def flushed(self, entries: List[Tuple[str, float]]):
+		"""Forget the entries written to the catalog, unless the session was seen again meanwhile"""
+		for schema, seen in entries:
+			if self._last_seen.get(schema) == seen:
+				del self._last_seen[schema]
+
+	def __len__(self):
+		return len(self._last_seen)
+
+
+def table_entry(row) -> Dict[str, Any]:
+	entry = dict(zip(TABLE_COLUMNS, row))
+	for key in ("created_at", "expires_at"):
+		entry[key] = entry[key].isoformat()
+	return entry
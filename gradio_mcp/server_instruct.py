@@ -17,11 +17,25 @@ server_instruct = """
 			### `get_list_of_column_in_table(schema_name: str, table_name: str)` **Purpose**: Get detailed column information for a specific table
 
 			## 🔍 Query & Data Manipulation Functions
-			### `run_read_only_query(query: str)` **Purpose**: Execute read-only SQL queries safely
+			### `run_read_only_query(query: str, use_cache: bool = False, sample: str = "", sample_method: str = "system", sample_seed: str = "")` **Purpose**: Execute read-only SQL queries safely, set `use_cache` when re-running the same exploratory query, set `sample` ("1%" or "50000" rows) to get an approximate answer on a TABLESAMPLE of the largest table it scans (transactions or customers, joined tables and subqueries are read entirely) with its scale factor and confidence bounds
+		### `run_read_only_queries(queries: str, parallel: bool = False)` **Purpose**: Run a JSON array of small exploratory queries (counts, distincts, samples) in one call and one consistent snapshot, results keyed by query index with their timing
+		### `run_read_only_query_stream(query: str, continuation_token: str = "")` **Purpose**: Read large results page by page, pass back the returned `continuation_token` to get the next page
+		### `run_read_only_query_encoded(query: str, output_format: str = "columnar_json")` **Purpose**: Column oriented results (`columnar_json`, or base64 `arrow` / `parquet`), more compact for wide or large extracts
+		### `close_query_stream(continuation_token: str)` **Purpose**: Release a paginated query you stop reading before the last page
+		### `materialize_table(table_name: str, source_query: str = "", index_columns: str = "", force_rebuild: bool = False)` **Purpose**: Build an indexed analysis table whose source query is recorded, call it again (with an empty source_query) to refresh it: row by row queries on transactions only append the new transactions
+		### `list_materialized_tables()` **Purpose**: Managed tables with their source query, row count and last refresh, reuse them before building a new one
+		### `create_table_from_query(table_name: str, source_query: str)` **Purpose**: Create an intermediary table in your own scratch schema, query it with the schema qualified name it returns; scratch tables are dropped after a TTL or when your session ends and share a size quota
+		### `list_scratch_tables()` / `end_scratch_session()` **Purpose**: See your scratch tables, their size, expiry and the quota left / drop all of them once the analysis is over
 
 			## 📈 Statistical Analysis Functions
 			### `do_annova(table_name: str, min_sample_size: int = 0)` **Purpose**: Perform ANOVA (Analysis of Variance) statistical test- **Use Case**: Testing if there are significant differences between group means
 			### `do_tukey_test(table_name: str, min_sample_size: int = 0)` **Purpose**: Perform Tukey's HSD post-hoc analysis after ANOVA **Use Case**: Identifying which specific groups differ significantly **Prerequisite**: Should be used after significant ANOVA results
+			Both accept `sample`, `sample_method` and `sample_seed` to run on a TABLESAMPLE of the table, the result then carries the sample rate, seed and 95% bounds of the group means
+			### `start_analysis(tool: str, args: str)` **Purpose**: Run `annova`, `tukey_test`, `tsne_embedding`, `embedding_assign` or `vector_centroid` in the background, `args` is a JSON object of the tool arguments **Use Case**: large tables, or several analyses at once: poll `get_job_status(job_id)`, then `get_job_result(job_id)`; `cancel_job(job_id)` stops it
+			### `do_vector_centroid(query: str, grouped: bool = False, method: str = "auto")` **Purpose**: Centroid of the embeddings returned by `query`, computed inside Postgres **Use Case**: with `grouped=True` and a `group | embedding` query, one centroid per group (e.g. per product_type_name) in a single call
+
+			## 📈 Monitoring
+			### `get_performance_stats()` **Purpose**: Latency per tool (calls, errors, rows, avg / p95 / max seconds) and per phase (connect, execute, fetch, decode, compute, serialize) **Use Case**: find which of your queries are slow before re-running them on larger tables
 
 			## 🔄 Recommended Workflows
 			### 1. Discovery Workflow
@@ -41,6 +55,8 @@ server_instruct = """
 			1. **Start with Discovery**: Always begin by exploring schemas and tables before analysis
 			2. **Use Read-Only Queries**: Prefer `run_read_only_query()` for exploration to maintain data safety
 			3. **Statistical Validation**: Use `do_annova()` before `do_tukey_test()` for proper statistical workflow
-			5. **Clean Up**: Use `drop_table()` to remove temporary analysis tables when done
+			5. **Clean Up**: Use `drop_table()` or `end_scratch_session()` to remove temporary analysis tables when done, they expire anyway
 			6. **Error Handling**: All functions return status indicators - check for errors before proceeding
-			7. **Data Safety**: Core tables (transactions, customers, articles) are protected from modification"""
\ No newline at end of file
+			7. **Data Safety**: Core tables (transactions, customers, articles) are protected from modification
+			8. **Execution Budgets**: Queries run with a statement timeout and a row cap, a `query_rejected` or `statement_timeout` error comes with `hints` (add a LIMIT, filter on transaction_date...) to rewrite the query
+			9. **Sample First**: Iterate on large tables with `sample="1%"`, keep the returned seed to compare variants on the same rows, and run the exact query (no sample) before stating a conclusion"""
\ No newline at end of file
@@ -1,20 +1,148 @@
 from database_connector import DatabaseInterface
-import ast
+from vector_types import stack_vectors
 import pandas as pd
-from scipy.stats import f_oneway
+from scipy.stats import f_oneway, f as f_distribution, studentized_range
 from collections import defaultdict
 from statsmodels.stats.multicomp import pairwise_tukeyhsd
-from sklearn.manifold import TSNE
+import psycopg2
+from embedding_projection import ProjectionEngine
+from projection_cache import CachedProjection, fingerprint, new_projection_cache
 import hdbscan
 import numpy as np
+import time
+import asyncio
+from analysis_executor import AnalysisExecutor
+from metrics import phase, record_phase, record_rows
+from sampling import TableSample, ESTIMATED_ROWS_QUERY, group_confidence
+
+# projections and HDBSCAN models of embedding_clustering, reused by the calls on the same rows
+projection_cache = new_projection_cache()
+MIN_CLUSTER_SIZE = 10
+
+# the first two columns of the table are renamed (g, m) so any "groups | measurement" table works
+GROUP_STATISTICS_QUERY = """
+	SELECT t.g, count(t.m), avg(t.m::float8), coalesce(var_samp(t.m::float8), 0)
+	FROM {table_name} AS t(g, m) {tablesample}
+	GROUP BY t.g
+	HAVING count(t.m) > %s
+	ORDER BY t.g;
+"""
+
+
+def group_statistics(db_connection: DatabaseInterface, table_name, min_sample_size=0):
+	'''
+		per group sufficient statistics computed by Postgres in a single GROUP BY, only one row per group is transferred.
+		groups with min_sample_size measurements or less are excluded by the HAVING clause.
+		returns (groups, n, mean, var) with numpy arrays for n, mean and the sample variance
+	'''
+	return sampled_group_statistics(db_connection, table_name, min_sample_size)[:4]
+
+
+def sampled_group_statistics(db_connection: DatabaseInterface, table_name, min_sample_size=0, sample: TableSample = None):
+	'''
+		group_statistics on a TABLESAMPLE of the table when `sample` is given (min_sample_size then applies to the sampled rows).
+		returns (groups, n, mean, var, description) where description is the rate / seed of the sample, None without sample
+	'''
+	tablesample, description = "", None
+	with db_connection.connection() as conn:
+		with conn.cursor() as cur:
+			cur.execute("SET TRANSACTION READ ONLY")
+			if sample is not None:
+				cur.execute(ESTIMATED_ROWS_QUERY, ([table_name],))
+				estimates = {name: float(rows) for name, rows in cur.fetchall()}
+				rate = sample.rate_for(estimates[table_name])
+				tablesample = sample.clause(rate) if rate < 1 else ""
+				description = sample.describe(table_name, estimates)
+			with phase("execute"):
+				cur.execute(GROUP_STATISTICS_QUERY.format(table_name=table_name, tablesample=tablesample), (int(min_sample_size),))
+			with phase("fetch"):
+				result = cur.fetchall()
+	record_rows(result)
+	groups = [row[0] for row in result]
+	n = np.array([row[1] for row in result], dtype=np.float64)
+	mean = np.array([row[2] for row in result], dtype=np.float64)
+	var = np.array([row[3] for row in result], dtype=np.float64)
+	return groups, n, mean, var, description
+
+
+def _sample_summary(description, table_name, groups, n, mean, var):
+	"""The "sample" and "confidence" entries of a sampled ANOVA / Tukey test"""
+	rate = description["tables"][table_name]["rate"]
+	return {
+		"sample": {**description, "sampled_rows": int(n.sum())},
+		"confidence": group_confidence(groups, n, mean, var, rate, description["method"])
+	}
+
+
+def anova_from_statistics(n, mean, var):
+	'''one way ANOVA F-statistic and p-value from per group (n, mean, var)'''
+	k, total = len(n), n.sum()
+	if k < 2:
+		raise ValueError("at least two groups are needed")
+	grand_mean = (n * mean).sum() / total
+	ss_between = (n * (mean - grand_mean) ** 2).sum()
+	ss_within = ((n - 1) * var).sum()
+	df_between, df_within = k - 1, total - k
+	f_stat = (ss_between / df_between) / (ss_within / df_within)
+	p_value = f_distribution.sf(f_stat, df_between, df_within)
+	return f_stat, p_value
+
+
+def studentized_range_pvalues(q, k, df, grid_size=64):
+	'''
+		p-values of the studentized range statistics `q` for k groups and df degrees of freedom.
+		studentized_range.sf (what pairwise_tukeyhsd uses) integrates numerically for every value, so with many pairs
+		it is evaluated on a grid of q values and interpolated in log space
+	'''
+	if len(q) <= grid_size:
+		return np.atleast_1d(studentized_range.sf(q, k, df))
+	grid = np.linspace(q.min(), q.max(), grid_size)
+	log_p = np.log(np.maximum(studentized_range.sf(grid, k, df), np.finfo(np.float64).tiny))
+	return np.exp(np.interp(q, grid, log_p))
 
 
-def anova(db_connection: DatabaseInterface, table_name, min_sample_size=0):
+def tukey_from_statistics(groups, n, mean, var, alpha=0.05):
+	'''
+		Tukey-Kramer HSD from per group (n, mean, var), same computations as pairwise_tukeyhsd without the rows:
+		the pooled variance is the within group sum of squares over N - k.
+		returns the rows of the pairwise_tukeyhsd summary that reject the null hypothesis
+	'''
+	# pairwise_tukeyhsd orders the groups with np.unique
+	order = np.argsort(np.array(groups, dtype=object), kind="stable")
+	groups = np.array(groups, dtype=object)[order]
+	n, mean, var = n[order], mean[order], var[order]
+	k, df = len(n), n.sum() - len(n)
+	if k < 2:
+		raise ValueError("at least two groups are needed")
+
+	pooled_var = ((n - 1) * var).sum() / df
+	idx1, idx2 = np.triu_indices(k, 1)
+	meandiffs = mean[idx2] - mean[idx1]
+	std_pairs = np.sqrt(pooled_var * (1.0 / n[idx1] + 1.0 / n[idx2]) / 2.0)
+	st_range = np.abs(meandiffs) / std_pairs
+
+	q_crit = studentized_range.ppf(1 - alpha, k, df)
+	reject = np.nonzero(st_range > q_crit)[0]
+	crit_int = std_pairs[reject] * q_crit
+	return pd.DataFrame({
+		"group1": groups[idx1[reject]],
+		"group2": groups[idx2[reject]],
+		"meandiff": np.round(meandiffs[reject], 4),
+		"p-adj": np.round(studentized_range_pvalues(st_range[reject], k, df), 4),
+		"lower": np.round(meandiffs[reject] - crit_int, 4),
+		"upper": np.round(meandiffs[reject] + crit_int, 4),
+		"reject": True
+	}, index=reject)
+
+
+def anova(db_connection: DatabaseInterface, table_name, min_sample_size=0, method="sql"):
 	'''
 		this function runs the annova on the dataset and render the associated F_score and p_value
 		Args:
 			table_name (str): the name of the table on which you want to run the ANOVA
 			min_sample_size (int): default = 0, is used to exclude categories that does not have enough measurement.
+			method (str): "sql" (default) computes the group count / mean / variance in Postgres,
+				"rows" fetches every row and runs scipy f_oneway, kept to validate the sql path.
 		the selected table MUST have the following signature:
 
 		groups | measurement
@@ -38,23 +166,29 @@ def anova(db_connection: DatabaseInterface, table_name, min_sample_size=0):
 		}
 	'''
 	try: 
-		query = f"SELECT * FROM {table_name};"
-
-		result = db_connection.read_only_query(query)
-		categories = defaultdict(list)
-
-		for product_type, age in result:
-			if age is not None:
-				if not isinstance(age, int):
-					age = int(age)
-				categories[product_type].append(age)
-
-		categories_filtered = {
-			k: v for k, v in categories.items() if len(v) > min_sample_size
-		}
+		if method == "sql":
+			_, n, mean, var = group_statistics(db_connection, table_name, min_sample_size)
+			with phase("compute"):
+				f_stat, p_value = anova_from_statistics(n, mean, var)
+		else:
+			query = f"SELECT * FROM {table_name};"
+
+			result = db_connection.read_only_query(query)
+			categories = defaultdict(list)
+
+			for product_type, age in result:
+				if age is not None:
+					if not isinstance(age, int):
+						age = int(age)
+					categories[product_type].append(age)
+
+			categories_filtered = {
+				k: v for k, v in categories.items() if len(v) > min_sample_size
+			}
 
-		categories_filtered = list(categories_filtered.values())
-		f_stat, p_value = f_oneway(*categories_filtered)
+			categories_filtered = list(categories_filtered.values())
+			with phase("compute"):
+				f_stat, p_value = f_oneway(*categories_filtered)
 	except Exception as e:
 		return f"Annova function fail to run: {e}"
 	return {
@@ -62,7 +196,7 @@ def anova(db_connection: DatabaseInterface, table_name, min_sample_size=0):
 		"p-value": round(p_value, 3)
 	}
 
-def tukey_test(db_connection: DatabaseInterface, table_name, min_sample_size=0):
+def tukey_test(db_connection: DatabaseInterface, table_name, min_sample_size=0, method="sql"):
 	'''
 		this function runs a Tukey's HSD (Honestly Significant Difference) test — a post-hoc analysis following ANOVA. 
 		It tells you which specific pairs of groups differ significantly in their means
@@ -84,12 +218,20 @@ def tukey_test(db_connection: DatabaseInterface, table_name, min_sample_size=0):
 		min_sample_size is used to exclude categories that does not have enough measurement.
 		default = 0: all categories are selected
 
+		method "sql" (default) computes the group count / mean / variance in Postgres and the pairs with numpy,
+		method "rows" fetches every row and runs statsmodels pairwise_tukeyhsd, kept to validate the sql path.
+
 		the return result is the raw dataframe that correspond to the pair wize categorie that reject the hypothesis of non statistically difference between two group
 		the signature of the dataframe is the following:
 		group1 | group2 | meandiff p-adj | lower | upper | reject (only true)
 	
 	'''
 	try:
+		if method == "sql":
+			groups, n, mean, var = group_statistics(db_connection, table_name, min_sample_size)
+			with phase("compute"):
+				return tukey_from_statistics(groups, n, mean, var, alpha=0.05)
+
 		query = f"SELECT * FROM {table_name};"
 
 		result = db_connection.read_only_query(query)
@@ -112,21 +254,82 @@ def tukey_test(db_connection: DatabaseInterface, table_name, min_sample_size=0):
 		])
 
 		# Tukey HSD
-		tukey = pairwise_tukeyhsd(endog=flat_df['age'],
-								groups=flat_df['product_type_name'],
-								alpha=0.05)
-		tukey_df = pd.DataFrame(data=tukey.summary().data[1:], columns=tukey.summary().data[0])
+		with phase("compute"):
+			tukey = pairwise_tukeyhsd(endog=flat_df['age'],
+									groups=flat_df['product_type_name'],
+									alpha=0.05)
+			summary = tukey.summary().data
+		tukey_df = pd.DataFrame(data=summary[1:], columns=summary[0])
 
 		significant_results = tukey_df[tukey_df['reject'] == True]
 	except Exception as e:
 		return f"Tukey test function fail to run: {e}"
 	return significant_results
 
-def embedding_clustering(db_connection: DatabaseInterface, query):
+def tukey_job(n, mean, var, groups, alpha=0.05):
+	"""tukey_from_statistics with keyword arrays, the AnalysisExecutor job of tukey_test_async"""
+	return tukey_from_statistics(groups, n, mean, var, alpha=alpha)
+
+def _report(progress, phase, rows=None):
+	"""Forward the progress of an analysis (phase, rows fetched) to the optional `progress` callback"""
+	if progress is not None:
+		progress(phase, rows)
+
+async def anova_async(db_connection: DatabaseInterface, table_name, min_sample_size=0, progress=None,
+		sample: TableSample = None):
+	"""
+		anova (sql method) for the async tools: the GROUP BY runs in a thread,
+		F and p-value only need the per group statistics so they are computed inline.
+		With a sample, the result also carries the sample rate / seed and the bounds of the group means
+	"""
+	try:
+		_report(progress, "fetch")
+		groups, n, mean, var, description = await asyncio.to_thread(
+			sampled_group_statistics, db_connection, table_name, min_sample_size, sample
+		)
+		_report(progress, "compute", len(n))
+		with phase("compute"):
+			f_stat, p_value = anova_from_statistics(n, mean, var)
+	except Exception as e:
+		return f"Annova function fail to run: {e}"
+	result = {
+		"F-statistic": round(f_stat, 3),
+		"p-value": round(p_value, 3)
+	}
+	if description is not None:
+		result.update(_sample_summary(description, table_name, groups, n, mean, var))
+	return result
+
+async def tukey_test_async(db_connection: DatabaseInterface, table_name, executor: AnalysisExecutor, min_sample_size=0,
+		progress=None, sample: TableSample = None):
+	"""
+		tukey_test (sql method) for the async tools, the pairwise comparisons run in a worker of `executor`.
+		With a sample the result is {"pairs": [rows of the dataframe], "sample": ..., "confidence": ...}
+	"""
+	try:
+		_report(progress, "fetch")
+		groups, n, mean, var, description = await asyncio.to_thread(
+			sampled_group_statistics, db_connection, table_name, min_sample_size, sample
+		)
+		_report(progress, "compute", len(n))
+		# includes the time queued in the executor
+		with phase("compute"):
+			pairs = await executor.run_async(tukey_job, arrays={"n": n, "mean": mean, "var": var}, groups=groups, alpha=0.05)
+	except Exception as e:
+		return f"Tukey test function fail to run: {e}"
+	if description is None:
+		return pairs
+	return {"pairs": pairs.to_dict(orient="records"), **_sample_summary(description, table_name, groups, n, mean, var)}
+
+def embedding_clustering(db_connection: DatabaseInterface, query, projection_method=None, use_cache=True):
 	"""
 		this tool allow to run a TSNE dimensionality reduction algorythme and a clustering (HDBSCAN) on top of that.
 
 		the input query, is a sql query that MUST return a table with at least the item id and the corresponding embeddding.
+		projection_method is "exact" (TSNE on the raw vectors), "fast" (PCA + multi-threaded Barnes-Hut TSNE,
+		on a sample with nearest neighbour assignment for large inputs) or "auto" (default, see ProjectionEngine)
+		with use_cache, the projection and the HDBSCAN model are reused when the query returns the same rows,
+		its "fingerprint" can be given to embedding_assign to place new points
 
 		exemple:
 		result = db_connection.read_only_query(query)
@@ -140,39 +343,219 @@ def embedding_clustering(db_connection: DatabaseInterface, query):
 				"ids": ids,
 				"x_axis": tsne_projection_x_list,
 				"y_axis": tsne_projection_y_list,
-				"labels": labels
+				"labels": labels,
+				"projection": {"method", "input_rows", "sample_size", "timings", "fingerprint", "from_cache"...}
 			}
 	"""
 	try:
-		result = db_connection.read_only_query(query)
-		tsne = TSNE(n_components=2, random_state=42)
-
-		ids = [item[0] for item in result]
-		article_embeddings = [ast.literal_eval(item[1]) for item in result]
-		tsne_proj = tsne.fit_transform(np.array(article_embeddings))
-
+		engine = ProjectionEngine(method=projection_method)
+		start = time.perf_counter()
+		# vector columns arrive as float32 arrays (vector_types), other columns are parsed as a fallback
+		ids, article_embeddings = db_connection.fetch_vectors(query, vector_column=1, id_column=0)
+		fetch_time = time.perf_counter() - start
+
+		key = fingerprint(ids, article_embeddings, {**engine.params(), "min_cluster_size": MIN_CLUSTER_SIZE})
+		entry = projection_cache.get(key) if use_cache else None
+		from_cache = entry is not None
+		if entry is None:
+			with phase("compute"):
+				entry = projection_cache.set(key, clustering_job(article_embeddings, engine.method))
+	except Exception as e:
+		return f"Embedding clustering function fail to run: {e}"
+	return _clustering_response(ids, key, entry, fetch_time, from_cache)
 
-		clusterer = hdbscan.HDBSCAN(min_cluster_size=10)
-		labels = clusterer.fit_predict(tsne_proj)
+async def embedding_clustering_async(db_connection: DatabaseInterface, query, executor: AnalysisExecutor,
+		projection_method=None, use_cache=True, progress=None):
+	"""
+		embedding_clustering for the async tools: the rows are fetched in a thread of this process,
+		TSNE and HDBSCAN run in a worker of `executor` which gets the embeddings through shared memory
+	"""
+	try:
+		engine = ProjectionEngine(method=projection_method)
+		start = time.perf_counter()
+		_report(progress, "fetch", 0)
+		ids, article_embeddings = await asyncio.to_thread(
+			db_connection.fetch_vectors, query, 1, 0,
+			on_batch=lambda rows: _report(progress, "fetch", rows)
+		)
+		fetch_time = time.perf_counter() - start
+
+		_report(progress, "compute", len(ids))
+		params = {**engine.params(), "min_cluster_size": MIN_CLUSTER_SIZE}
+		key = await asyncio.to_thread(fingerprint, ids, article_embeddings, params)
+		entry = projection_cache.get(key) if use_cache else None
+		from_cache = entry is not None
+		if entry is None:
+			with phase("compute"):
+				result = await executor.run_async(clustering_job, arrays={"embeddings": article_embeddings}, projection_method=engine.method)
+			entry = projection_cache.set(key, result)
 	except Exception as e:
 		return f"Embedding clustering function fail to run: {e}"
+	return _clustering_response(ids, key, entry, fetch_time, from_cache)
+
+def clustering_job(embeddings, projection_method=None, min_cluster_size=MIN_CLUSTER_SIZE):
+	"""Projection + HDBSCAN of embedding_clustering, run inline or in an AnalysisExecutor worker"""
+	engine = ProjectionEngine(method=projection_method)
+	model = engine.fit(embeddings)
+	if np.may_share_memory(model.reference, embeddings):
+		# the input may be a shared memory view that is released after the job
+		model.reference = np.array(model.reference)
+
+	start = time.perf_counter()
+	clusterer = hdbscan.HDBSCAN(min_cluster_size=min_cluster_size, core_dist_n_jobs=engine.n_jobs, prediction_data=True)
+	labels = clusterer.fit_predict(model.projection)
+	model.info["timings"]["clustering"] = time.perf_counter() - start
+	return CachedProjection(model, clusterer, labels)
+
+def _clustering_response(ids, key, entry: CachedProjection, fetch_time, from_cache):
+	tsne_proj = np.asarray(entry.model.projection)
+	projection = {**entry.model.info, "timings": {**entry.model.info["timings"], "fetch": fetch_time}}
+	projection.update({"fingerprint": key, "from_cache": from_cache})
 	return {
 		"ids": ids,
 		"x_axis": tsne_proj[:, 0],
 		"y_axis": tsne_proj[:, 1],
-		"labels": labels
+		"labels": entry.labels,
+		"projection": projection
 	}
 
-def vector_centroid(db_connection: DatabaseInterface, query):
+def embedding_assign(db_connection: DatabaseInterface, fingerprint_key, query):
+	"""
+		place new points in a projection computed by embedding_clustering and predict their cluster
+		with hdbscan.approximate_predict, without running TSNE / HDBSCAN again.
+
+		fingerprint_key is the "fingerprint" returned in the "projection" entry of embedding_clustering,
+		the query returns id | embedding for the new points.
+
+		the return is a dictionnary that has the following format:
+
+			return {
+				"ids": ids,
+				"x_axis": projected x of the new points,
+				"y_axis": projected y of the new points,
+				"labels": predicted cluster (-1: noise),
+				"probabilities": strength of the cluster membership
+			}
+	"""
 	try:
-		result = db_connection.read_only_query(query)
-		embeddings = np.array([ast.literal_eval(item[0]) for item in result])
-		if embeddings.ndim != 2:
-			raise ValueError("Input must be a 2D array of shape (n_vectors, vector_dimension)")
+		entry = projection_cache.get(fingerprint_key)
+		if entry is None:
+			raise KeyError(f"no cached projection for fingerprint '{fingerprint_key}', run the embedding clustering first")
+		ids, embeddings = db_connection.fetch_vectors(query, vector_column=1, id_column=0)
+		with phase("compute"):
+			points = entry.model.place(embeddings)
+			labels, probabilities = hdbscan.approximate_predict(entry.clusterer, points)
 	except Exception as e:
-		return f"Vector centroid function fail to run: {e}"
-	return np.mean(embeddings, axis=0)
+		return f"Embedding assignment function fail to run: {e}"
+	return {
+		"ids": ids,
+		"x_axis": points[:, 0],
+		"y_axis": points[:, 1],
+		"labels": labels,
+		"probabilities": probabilities
+	}
+
+# the centroid is computed by pgvector's avg(vector), the first columns of the input query are renamed
+CENTROID_QUERY = "SELECT avg(q.v), count(q.v) FROM ({query}) AS q(v);"
+GROUPED_CENTROID_QUERY = "SELECT q.g, avg(q.v), count(q.v) FROM ({query}) AS q(g, v) GROUP BY q.g ORDER BY q.g;"
 
 
+def _strip_query(query):
+	return query.strip().rstrip(";")
 
 
+def sql_centroids(db_connection: DatabaseInterface, query, grouped=False):
+	'''
+		centroids aggregated by Postgres, only one vector per group is transferred.
+		returns [(group, count, centroid)], group is None when grouped is False
+	'''
+	sql = GROUPED_CENTROID_QUERY if grouped else CENTROID_QUERY
+	with db_connection.connection() as conn:
+		with conn.cursor() as cur:
+			cur.execute("SET TRANSACTION READ ONLY")
+			with phase("execute"):
+				cur.execute(sql.format(query=_strip_query(query)))
+			with phase("fetch"):
+				result = cur.fetchall()
+	record_rows(result)
+	if not grouped:
+		result = [(None, *row) for row in result]
+	with phase("decode"):
+		return [
+			(group, count, stack_vectors([centroid])[0].astype(np.float64))
+			for group, centroid, count in result if count
+		]
+
+
+def streaming_centroids(db_connection: DatabaseInterface, query, grouped=False, batch_size=5000):
+	'''
+		client side mean for queries that cannot be wrapped in avg(vector) (float[] columns, non pgvector databases...):
+		rows are read in batches from a server side cursor and only a float64 running sum per group is kept.
+		returns [(group, count, centroid)] like sql_centroids
+	'''
+	sums, counts, compute_time = {}, {}, 0.0
+	for rows in db_connection.iter_query(_strip_query(query), batch_size):
+		start = time.perf_counter()
+		_accumulate_centroids(rows, grouped, sums, counts)
+		compute_time += time.perf_counter() - start
+	record_phase("compute", compute_time)
+	return [(group, counts[group], sums[group] / counts[group]) for group in sums]
+
+
+def _accumulate_centroids(rows, grouped, sums, counts):
+	"""Add a batch of rows to the running float64 sums and counts of streaming_centroids"""
+	rows = [row for row in rows if row[1 if grouped else 0] is not None]
+	if not rows:
+		return
+	if not grouped:
+		vectors = stack_vectors([row[0] for row in rows])
+		sums[None] = sums.get(None, 0) + vectors.sum(axis=0, dtype=np.float64)
+		counts[None] = counts.get(None, 0) + len(vectors)
+		return
+	vectors = stack_vectors([row[1] for row in rows])
+	index = {}
+	positions = np.array([index.setdefault(row[0], len(index)) for row in rows])
+	batch_sums = np.zeros((len(index), vectors.shape[1]), dtype=np.float64)
+	np.add.at(batch_sums, positions, vectors)
+	batch_counts = np.bincount(positions, minlength=len(index))
+	for group, i in index.items():
+		sums[group] = sums.get(group, 0) + batch_sums[i]
+		counts[group] = counts.get(group, 0) + int(batch_counts[i])
+
+
+def vector_centroid(db_connection: DatabaseInterface, query, grouped=False, method="auto"):
+	'''
+		centroid of the embeddings returned by query.
+		- grouped=False: the query returns 1 column, the embeddings, the centroid vector is returned
+		- grouped=True: the query returns 2 columns, group | embedding, one centroid per group is returned:
+			{"method": ..., "groups": [{"group": ..., "count": ..., "centroid": [...]}]}
+		method "sql" aggregates in Postgres with avg(vector), "client" streams the rows and averages them here,
+		"auto" (default) tries sql first and falls back to client when the column is not a pgvector vector
+	'''
+	try:
+		if method == "client":
+			centroids = streaming_centroids(db_connection, query, grouped)
+		else:
+			try:
+				centroids = sql_centroids(db_connection, query, grouped)
+			except psycopg2.errors.UndefinedFunction:
+				# avg() does not exist for this column type
+				if method == "sql":
+					raise
+				method = "client"
+				centroids = streaming_centroids(db_connection, query, grouped)
+			else:
+				method = "sql"
+		if not centroids:
+			raise ValueError("Input must be a 2D array of shape (n_vectors, vector_dimension)")
+	except Exception as e:
+		return f"Vector centroid function fail to run: {e}"
+	if not grouped:
+		return centroids[0][2]
+	return {
+		"method": method,
+		"groups": [
+			{"group": group, "count": count, "centroid": centroid.tolist()}
+			for group, count, centroid in centroids
+		]
+	}
@@ -0,0 +1,47 @@
+from typing import Any, List, Optional
+import numpy as np
+from psycopg2 import extensions
+
+
+def parse_vector(value: Optional[str], cursor=None) -> Optional[np.ndarray]:
+	"""Text form of a pgvector value ('[0.1,0.2,...]') to a float32 array, without the Python parser"""
+	if value is None:
+		return None
+	return np.fromstring(value[1:-1], sep=",", dtype=np.float32)
+
+
+def register_vector(conn) -> bool:
+	"""
+		Make psycopg2 return pgvector `vector` columns as float32 numpy arrays on this connection.
+		Returns False (and changes nothing) when the extension is not installed in the database.
+	"""
+	with conn.cursor() as cur:
+		cur.execute("SELECT to_regtype('vector')::oid")
+		oid = cur.fetchone()[0]
+	conn.rollback()
+	if oid is None:
+		return False
+	vector_type = extensions.new_type((oid,), "VECTOR", parse_vector)
+	extensions.register_type(vector_type, conn)
+	return True
+
+
+def to_vector(value: Any) -> np.ndarray:
+	"""
+		Fallback for columns that are not pgvector vectors: float[] arrays (lists),
+		json arrays or the '[...]' / '{...}' text of a vector
+	"""
+	if isinstance(value, np.ndarray):
+		return value
+	if isinstance(value, str):
+		return np.fromstring(value.strip()[1:-1], sep=",", dtype=np.float32)
+	return np.asarray(value, dtype=np.float32)
+
+
+def stack_vectors(values: List[Any]) -> np.ndarray:
+	"""(n_vectors, dimension) contiguous float32 matrix from a column of vectors"""
+	if not values:
+		return np.empty((0, 0), dtype=np.float32)
+	if not isinstance(values[0], np.ndarray):
+		values = [to_vector(value) for value in values]
+	return np.ascontiguousarray(np.vstack(values), dtype=np.float32)